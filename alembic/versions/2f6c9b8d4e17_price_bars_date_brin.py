@@ -0,0 +1,26 @@
+"""Price bars date BRIN index
+
+Revision ID: 2f6c9b8d4e17
+Revises: d71a5e8f2c03
+Create Date: 2026-10-19 12:48:09.270553
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2f6c9b8d4e17'
+down_revision: Union[str, None] = 'd71a5e8f2c03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_price_bars_date_brin', 'price_bars', ['date'], postgresql_using='brin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_price_bars_date_brin', table_name='price_bars')
@@ -0,0 +1,45 @@
+"""Contract key unique index
+
+Revision ID: 3b9e5d7f1a26
+Revises: f8d3b6a2e4c9
+Create Date: 2026-10-19 19:02:47.615380
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b9e5d7f1a26'
+down_revision: Union[str, None] = 'f8d3b6a2e4c9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Duplicates may hold bars and options, so they are reported instead of deleted
+    duplicates = op.get_bind().execute(sa.text(
+        "SELECT contract_type, symbol, exchange, currency, array_agg(id ORDER BY id) "
+        "FROM contracts WHERE contract_type NOT IN ('Option', 'DatedFuture') "
+        "GROUP BY contract_type, symbol, exchange, currency HAVING count(*) > 1"
+    )).all()
+    if duplicates:
+        raise RuntimeError(
+            'contracts has duplicates, merge or delete them before upgrading: '
+            + '; '.join(f'{row[:4]} ids {row[4]}' for row in duplicates)
+        )
+
+    op.create_index(
+        'ix_contracts_contract_key',
+        'contracts',
+        ['contract_type', 'symbol', 'exchange', 'currency'],
+        unique=True,
+        postgresql_where=sa.text("contract_type NOT IN ('Option', 'DatedFuture')"),
+        postgresql_nulls_not_distinct=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contracts_contract_key', table_name='contracts')
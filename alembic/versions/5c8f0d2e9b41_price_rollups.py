@@ -0,0 +1,68 @@
+"""Price rollups
+
+Revision ID: 5c8f0d2e9b41
+Revises: b3e1c52f7a10
+Create Date: 2026-10-19 10:02:47.115803
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c8f0d2e9b41'
+down_revision: Union[str, None] = 'b3e1c52f7a10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('price_rollups',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('contract_id', sa.Integer(), nullable=False),
+    sa.Column('data_type', sa.String(), nullable=False),
+    sa.Column('bar_size', sa.Integer(), nullable=False),
+    sa.Column('period', sa.String(), nullable=False),
+    sa.Column('period_start', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('first_bar_date', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('last_bar_date', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('open', sa.Float(), nullable=False),
+    sa.Column('high', sa.Float(), nullable=False),
+    sa.Column('low', sa.Float(), nullable=False),
+    sa.Column('close', sa.Float(), nullable=False),
+    sa.Column('volume', sa.BigInteger(), nullable=False),
+    sa.Column('price_volume', sa.Float(), nullable=False),
+    sa.Column('bar_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['contract_id'], ['contracts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('contract_id', 'data_type', 'bar_size', 'period', 'period_start', name='uq_price_rollups_series_period')
+    )
+
+    # Backfill the rollups from the bars already collected
+    for period in ('hour', 'day'):
+        op.execute(f"""
+            INSERT INTO price_rollups (
+                contract_id, data_type, bar_size, period, period_start,
+                first_bar_date, last_bar_date, open, high, low, close,
+                volume, price_volume, bar_count
+            )
+            SELECT
+                contract_id, data_type, bar_size, '{period}',
+                date_trunc('{period}', date AT TIME ZONE 'America/New_York')
+                    AT TIME ZONE 'America/New_York',
+                min(date), max(date),
+                (array_agg(open ORDER BY date))[1],
+                max(high), min(low),
+                (array_agg(close ORDER BY date DESC))[1],
+                sum(greatest(volume, 0)),
+                sum((high + low + close) / 3 * greatest(volume, 0)),
+                count(*)
+            FROM price_bars
+            GROUP BY 1, 2, 3, 5
+        """)
+
+
+def downgrade() -> None:
+    op.drop_table('price_rollups')
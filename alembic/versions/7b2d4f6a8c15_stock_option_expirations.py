@@ -0,0 +1,34 @@
+"""Stock option expirations
+
+Revision ID: 7b2d4f6a8c15
+Revises: e5a8c3d1f9b2
+Create Date: 2026-10-19 14:21:05.832914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b2d4f6a8c15'
+down_revision: Union[str, None] = 'e5a8c3d1f9b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('contracts', sa.Column('option_weeklies', sa.Integer(), nullable=True))
+    op.add_column('contracts', sa.Column('option_monthlies', sa.Integer(), nullable=True))
+
+    # Existing stocks keep collecting the nearest expiration only
+    op.execute("""
+        UPDATE contracts SET option_weeklies = 1, option_monthlies = 0
+        WHERE contract_type = 'Stock'
+    """)
+
+
+def downgrade() -> None:
+    op.drop_column('contracts', 'option_monthlies')
+    op.drop_column('contracts', 'option_weeklies')
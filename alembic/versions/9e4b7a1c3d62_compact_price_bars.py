@@ -0,0 +1,80 @@
+"""Compact price_bars layout
+
+Revision ID: 9e4b7a1c3d62
+Revises: 5c8f0d2e9b41
+Create Date: 2026-10-19 11:24:38.902114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e4b7a1c3d62'
+down_revision: Union[str, None] = '5c8f0d2e9b41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Must match models.models.PRICE_DATA_TYPE_CODES
+DATA_TYPE_CODES = {'TRADES': 1, 'BID': 2, 'ASK': 3, 'MIDPOINT': 4}
+
+
+def upgrade() -> None:
+    # The CASE below would silently turn any other name into NULL, refuse to convert instead
+    unmapped = op.get_bind().execute(
+        sa.text(
+            'SELECT DISTINCT data_type FROM price_bars '
+            'WHERE data_type IS NOT NULL AND data_type NOT IN :names'
+        ).bindparams(sa.bindparam('names', expanding=True)),
+        {'names': list(DATA_TYPE_CODES)},
+    ).scalars().all()
+    if unmapped:
+        raise RuntimeError(
+            f"price_bars has data types without a code: {', '.join(unmapped)}. "
+            'Add them to DATA_TYPE_CODES and PRICE_DATA_TYPE_CODES, or delete their bars.'
+        )
+
+    op.create_table('ingest_batches',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+    # Drop the audit columns first so the type changes below rewrite rows without them
+    op.drop_column('price_bars', 'created_at')
+    op.drop_column('price_bars', 'updated_at')
+    op.add_column('price_bars', sa.Column('ingest_batch_id', sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        'price_bars_ingest_batch_id_fkey', 'price_bars', 'ingest_batches',
+        ['ingest_batch_id'], ['id'],
+    )
+
+    data_type_case = ' '.join(
+        f"WHEN '{name}' THEN {code}" for name, code in DATA_TYPE_CODES.items()
+    )
+    op.alter_column(
+        'price_bars', 'data_type',
+        type_=sa.SmallInteger(),
+        postgresql_using=f'CASE data_type {data_type_case} END',
+    )
+    op.alter_column('price_bars', 'bar_size', type_=sa.SmallInteger())
+
+
+def downgrade() -> None:
+    data_type_case = ' '.join(
+        f"WHEN {code} THEN '{name}'" for name, code in DATA_TYPE_CODES.items()
+    )
+    op.alter_column('price_bars', 'bar_size', type_=sa.Integer())
+    op.alter_column(
+        'price_bars', 'data_type',
+        type_=sa.String(),
+        postgresql_using=f'CASE data_type {data_type_case} END',
+    )
+
+    op.drop_constraint('price_bars_ingest_batch_id_fkey', 'price_bars', type_='foreignkey')
+    op.drop_column('price_bars', 'ingest_batch_id')
+    op.add_column('price_bars', sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=False))
+    op.add_column('price_bars', sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=False))
+    op.drop_table('ingest_batches')
@@ -0,0 +1,32 @@
+"""Option key unique index
+
+Revision ID: b3e1c52f7a10
+Revises: 4a7d9a72e094
+Create Date: 2026-10-19 09:12:04.381227
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e1c52f7a10'
+down_revision: Union[str, None] = '4a7d9a72e094'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_contracts_option_key',
+        'contracts',
+        ['underlying_id', 'lastTradeDateOrContractMonth', 'strike', 'right'],
+        unique=True,
+        postgresql_where=sa.text("contract_type = 'Option'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contracts_option_key', table_name='contracts')
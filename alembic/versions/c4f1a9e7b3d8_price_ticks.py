@@ -0,0 +1,41 @@
+"""Price ticks
+
+Revision ID: c4f1a9e7b3d8
+Revises: 7b2d4f6a8c15
+Create Date: 2026-10-19 14:58:42.106377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4f1a9e7b3d8'
+down_revision: Union[str, None] = '7b2d4f6a8c15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('price_ticks',
+    sa.Column('contract_id', sa.Integer(), nullable=False),
+    sa.Column('data_type', sa.SmallInteger(), nullable=False),
+    sa.Column('time_us', sa.BigInteger(), nullable=False),
+    sa.Column('seq', sa.SmallInteger(), nullable=False),
+    sa.Column('price', sa.REAL(), nullable=True),
+    sa.Column('size', sa.REAL(), nullable=True),
+    sa.Column('bid_price', sa.REAL(), nullable=True),
+    sa.Column('ask_price', sa.REAL(), nullable=True),
+    sa.Column('bid_size', sa.REAL(), nullable=True),
+    sa.Column('ask_size', sa.REAL(), nullable=True),
+    sa.ForeignKeyConstraint(['contract_id'], ['contracts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('contract_id', 'data_type', 'time_us', 'seq')
+    )
+    op.add_column('contracts', sa.Column('collect_ticks', sa.Boolean(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('contracts', 'collect_ticks')
+    op.drop_table('price_ticks')
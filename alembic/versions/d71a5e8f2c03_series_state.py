@@ -0,0 +1,43 @@
+"""Series state
+
+Revision ID: d71a5e8f2c03
+Revises: 9e4b7a1c3d62
+Create Date: 2026-10-19 12:10:51.664380
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd71a5e8f2c03'
+down_revision: Union[str, None] = '9e4b7a1c3d62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('series_state',
+    sa.Column('contract_id', sa.Integer(), nullable=False),
+    sa.Column('data_type', sa.SmallInteger(), nullable=False),
+    sa.Column('bar_size', sa.SmallInteger(), nullable=False),
+    sa.Column('last_bar_date', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('bar_count', sa.BigInteger(), nullable=False),
+    sa.Column('last_fetch_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['contract_id'], ['contracts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('contract_id', 'data_type', 'bar_size')
+    )
+
+    # Seed the watermarks from the bars already collected
+    op.execute("""
+        INSERT INTO series_state (contract_id, data_type, bar_size, last_bar_date, bar_count)
+        SELECT contract_id, data_type, bar_size, max(date), count(*)
+        FROM price_bars
+        GROUP BY contract_id, data_type, bar_size
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('series_state')
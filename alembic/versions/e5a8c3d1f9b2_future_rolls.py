@@ -0,0 +1,35 @@
+"""Future rolls
+
+Revision ID: e5a8c3d1f9b2
+Revises: 2f6c9b8d4e17
+Create Date: 2026-10-19 13:52:37.418206
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a8c3d1f9b2'
+down_revision: Union[str, None] = '2f6c9b8d4e17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('future_rolls',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('future_id', sa.Integer(), nullable=False),
+    sa.Column('contract_id', sa.Integer(), nullable=False),
+    sa.Column('roll_date', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['contract_id'], ['contracts.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['future_id'], ['contracts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('future_id', 'contract_id', name='uq_future_rolls_future_contract')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('future_rolls')
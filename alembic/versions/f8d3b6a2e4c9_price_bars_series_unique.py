@@ -0,0 +1,38 @@
+"""Price bars series unique constraint
+
+Revision ID: f8d3b6a2e4c9
+Revises: c4f1a9e7b3d8
+Create Date: 2026-10-19 17:21:09.554310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f8d3b6a2e4c9'
+down_revision: Union[str, None] = 'c4f1a9e7b3d8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keep the first copy of any bar stored more than once before enforcing uniqueness
+    op.execute(
+        'DELETE FROM price_bars AS duplicate USING price_bars AS original '
+        'WHERE duplicate.contract_id = original.contract_id '
+        'AND duplicate.data_type = original.data_type '
+        'AND duplicate.bar_size = original.bar_size '
+        'AND duplicate.date = original.date '
+        'AND duplicate.id > original.id'
+    )
+    op.create_unique_constraint(
+        'uq_price_bars_series_date', 'price_bars',
+        ['contract_id', 'data_type', 'bar_size', 'date'],
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_price_bars_series_date', 'price_bars', type_='unique')
@@ -0,0 +1,77 @@
+from fastapi import APIRouter, Depends, Query
+from models import schemas
+from models.database import get_db
+from sqlalchemy.orm import Session
+from services import contracts_service, prices_service
+from typing import List, Optional
+
+# Create an API router for analytics computed server-side from stored bars
+router = APIRouter()
+
+
+# Get technical indicators for a contract, computed in one vectorized pass over its bars
+@router.get(
+    "/{contract_type}/{symbol}/indicators",
+    response_model=List[schemas.IndicatorBar],
+)
+def get_indicators(
+    contract_type: str,
+    symbol: str,
+    indicators: str = Query(
+        ...,
+        description="Comma-separated indicators e.g., returns, sma, ema, atr, vwap, rsi",
+    ),
+    data_type: str = Query("TRADES", description="Data type e.g., ASK, BID, TRADES"),
+    bar_size: int = Query(..., description="Bar size in minutes"),
+    window: int = Query(14, description="Window of the rolling indicators"),
+    limit: int = Query(500, description="Number of most recent bars to compute over"),
+    include_bars: bool = Query(False, description="Return the OHLCV bars as well"),
+    expiration_date: Optional[str] = Query(None, description="Option expiration date"),
+    strike: Optional[float] = Query(None, description="Option strike price"),
+    right: Optional[str] = Query(None, description="Option right e.g., C, P"),
+    db: Session = Depends(get_db),
+):
+    # Resolve the contract from the route it is exposed under (stocks, futures, options...)
+    contract = contracts_service.get_contract_by_route(
+        db, contract_type, symbol, expiration_date, strike, right
+    )
+
+    # Imported on first use, so that the API starts without NumPy and pandas
+    from services import indicators_service
+
+    return indicators_service.get_indicators(
+        db,
+        contract.id,
+        data_type,
+        bar_size,
+        indicators_service.parse_indicators(indicators),
+        window,
+        limit,
+        include_bars,
+    )
+
+
+# Get mid-price and spread bars for a contract, aligning its BID and ASK series on date
+@router.get(
+    "/{contract_type}/{symbol}/spread",
+    response_model=List[schemas.SpreadBar],
+)
+def get_spread(
+    contract_type: str,
+    symbol: str,
+    bar_size: int = Query(..., description="Bar size in minutes"),
+    order: str = Query("desc", description="Order of the bars"),
+    limit: int = Query(500, description="Number of bars to return"),
+    expiration_date: Optional[str] = Query(None, description="Option expiration date"),
+    strike: Optional[float] = Query(None, description="Option strike price"),
+    right: Optional[str] = Query(None, description="Option right e.g., C, P"),
+    db: Session = Depends(get_db),
+):
+    # Resolve the contract from the route it is exposed under (stocks, futures, options...)
+    contract = contracts_service.get_contract_by_route(
+        db, contract_type, symbol, expiration_date, strike, right
+    )
+
+    return prices_service.get_spread_bars_from_db(
+        db, contract.id, bar_size, order, limit
+    )
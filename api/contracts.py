@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Request
+from models import schemas
+from services import dispatch_service, onboarding_service
+
+# Create an API router for operations spanning several contract types
+router = APIRouter()
+
+
+# Import contracts in bulk from a JSON list or a CSV file, resolved asynchronously as one job
+@router.post("/import", response_model=schemas.ContractImportJob, status_code=202)
+async def import_contracts(request: Request):
+    body = await request.body()
+    job = onboarding_service.create_job(body, request.headers.get("content-type", ""))
+
+    # Jobs without any valid row are finished at once
+    if job["status"] == "pending":
+        dispatch_service.send_task(
+            "tasks.onboarding_tasks.import_contracts", (job["job_id"],)
+        )
+
+    return onboarding_service.get_job(job["job_id"])
+
+
+# Get the status of an import job, with the outcome of each row
+@router.get("/import/{job_id}", response_model=schemas.ContractImportJob)
+def get_import_job(job_id: str):
+    return onboarding_service.get_job(job_id)
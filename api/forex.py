@@ -1,10 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi.responses import Response
 from models import schemas, models
 from models.database import get_db
 from sqlalchemy.orm import Session
-from services import prices_service, contracts_service
-from typing import List
+from services import (
+    prices_service,
+    contracts_service,
+    downsampling_service,
+    rollups_service,
+    serialization_service,
+    versions_service,
+)
+from typing import List, Optional
 
 # Create an API router for handling Forex-related requests
 router = APIRouter()
@@ -12,7 +19,15 @@ router = APIRouter()
 
 # Get a list of Forex contracts from the database
 @router.get("/", response_model=List[schemas.Contract])
-def get_forex(db: Session = Depends(get_db)):
+def get_forex(request: Request, response: Response, db: Session = Depends(get_db)):
+    # Answer conditional requests without querying the contracts
+    not_modified, headers = versions_service.check_not_modified(
+        request, versions_service.contracts_key("Forex")
+    )
+    if not_modified:
+        return versions_service.not_modified_response(headers)
+    response.headers.update(headers)
+
     # Retrieve any contracts classified as "Forex" from the database
     return contracts_service.get_any_contracts(db, "Forex")
 
@@ -30,11 +45,13 @@ def create_forex(forex: schemas.Contract, db: Session = Depends(get_db)):
         contract_type="Forex",
         exchange=forex.exchange,
         currency=forex.currency,
+        collect_ticks=forex.collect_ticks,
     )
 
     # Add the new contract to the database and save the changes
     db.add(db_contract)
     db.commit()
+    versions_service.bump_version(versions_service.contracts_key("Forex"))
     db.refresh(db_contract)  # Refresh the instance with the updated data from the DB
 
     # Return the newly created contract
@@ -54,6 +71,7 @@ def delete_forex(forex_id: int, db: Session = Depends(get_db)):
     # Delete the contract and save the changes to the database
     db.delete(forex)
     db.commit()
+    versions_service.bump_version(versions_service.contracts_key("Forex"))
 
     # Return a 204 (No Content) response to indicate successful deletion
     return Response(status_code=204)
@@ -63,6 +81,7 @@ def delete_forex(forex_id: int, db: Session = Depends(get_db)):
 @router.get("/{symbol}/bars", response_model=List[schemas.PriceBar])
 def get_forex_prices_by_symbol(
     symbol: str,
+    request: Request,
     data_type: str = Query(..., description="Data type e.g., ASK, BID, TRADES"),
     bar_size: int = Query(..., description="Bar size in mn"),
     order: str = Query(
@@ -71,6 +90,10 @@ def get_forex_prices_by_symbol(
     limit: int = Query(
         500, description="Number of bars to return"
     ),  # Limit the number of bars to return
+    tz: str = Query("America/New_York", description="Time zone of the returned dates"),
+    max_points: Optional[int] = Query(
+        None, ge=3, description="Downsample to at most this many bars (LTTB)"
+    ),
     db: Session = Depends(get_db),
 ):
     # Retrieve the Forex contract by its symbol
@@ -80,10 +103,47 @@ def get_forex_prices_by_symbol(
     if forex is None:
         raise HTTPException(status_code=404, detail="Forex not found")
 
+    # Answer conditional requests without touching the bar table
+    not_modified, headers = versions_service.check_not_modified(
+        request, versions_service.series_key(forex.id)
+    )
+    if not_modified:
+        return versions_service.not_modified_response(headers)
+
     # Get price bars (historical data) from the database based on the Forex contract ID and query parameters
     bars = prices_service.get_price_bars_from_db(
-        db, forex.id, data_type, bar_size, order, limit
+        db, forex.id, data_type, bar_size, order, limit, raw=True
     )
 
-    # Return the list of price bars
-    return bars
+    # Charts only render a few thousand points, keep the bars that preserve the series' shape
+    if max_points:
+        bars = downsampling_service.downsample_bars(bars, max_points)
+
+    # Return the list of price bars, serialized without per-row validation
+    response = serialization_service.price_bars_response(bars, tz)
+    response.headers.update(headers)
+    return response
+
+
+# Retrieve hourly or daily rollups (OHLCV, VWAP) for a specific Forex symbol
+@router.get("/{symbol}/rollups", response_model=List[schemas.PriceRollup])
+def get_forex_rollups_by_symbol(
+    symbol: str,
+    period: str = Query(..., description="Rollup period e.g., hour, day"),
+    data_type: str = Query(..., description="Data type e.g., ASK, BID, TRADES"),
+    bar_size: int = Query(5, description="Size of the source bars in minutes"),
+    order: str = Query("desc", description="Order of the rollups"),
+    limit: int = Query(500, description="Number of rollups to return"),
+    db: Session = Depends(get_db),
+):
+    # Retrieve the Forex contract by its symbol
+    forex = contracts_service.get_contract_by_symbol(db, symbol, "Forex")
+
+    # If the contract is not found, raise a 404 error
+    if forex is None:
+        raise HTTPException(status_code=404, detail="Forex not found")
+
+    # Retrieve the pre-aggregated rollups instead of the raw bars
+    return rollups_service.get_rollups_from_db(
+        db, forex.id, data_type, bar_size, period, order, limit
+    )
@@ -1,10 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi.responses import Response
 from models import schemas, models
 from models.database import get_db
 from sqlalchemy.orm import Session
-from services import contracts_service, prices_service
-from typing import List
+from services import (
+    contracts_service,
+    downsampling_service,
+    futures_service,
+    prices_service,
+    rollups_service,
+    serialization_service,
+    versions_service,
+)
+from typing import List, Optional
 
 # Create an API router for handling Futures-related requests
 router = APIRouter()
@@ -12,7 +20,15 @@ router = APIRouter()
 
 # Get a list of all Future contracts from the database
 @router.get("/", response_model=List[schemas.Contract])
-def get_futures(db: Session = Depends(get_db)):
+def get_futures(request: Request, response: Response, db: Session = Depends(get_db)):
+    # Answer conditional requests without querying the contracts
+    not_modified, headers = versions_service.check_not_modified(
+        request, versions_service.contracts_key("Future")
+    )
+    if not_modified:
+        return versions_service.not_modified_response(headers)
+    response.headers.update(headers)
+
     # Retrieve any contracts classified as "Future" from the database
     futures = contracts_service.get_any_contracts(db, "Future")
 
@@ -32,11 +48,13 @@ def create_future(future: schemas.Contract, db: Session = Depends(get_db)):
         contract_type="Future",
         exchange=future.exchange,
         currency=future.currency,
+        collect_ticks=future.collect_ticks,
     )
 
     # Add the new contract to the database and commit the transaction
     db.add(db_contract)
     db.commit()
+    versions_service.bump_version(versions_service.contracts_key("Future"))
     db.refresh(db_contract)  # Refresh the instance with the updated data from the DB
 
     # Return the newly created contract
@@ -56,6 +74,7 @@ def delete_future(future_id: int, db: Session = Depends(get_db)):
     # Delete the contract and commit the transaction to the database
     db.delete(future)
     db.commit()
+    versions_service.bump_version(versions_service.contracts_key("Future"))
 
     # Return a 204 (No Content) response to indicate successful deletion
     return Response(status_code=204)
@@ -65,6 +84,7 @@ def delete_future(future_id: int, db: Session = Depends(get_db)):
 @router.get("/{symbol}/bars", response_model=List[schemas.PriceBar])
 def get_future_prices_by_symbol(
     symbol: str,
+    request: Request,
     data_type: str = Query(..., description="Data type e.g., ASK, BID, TRADES"),
     bar_size: int = Query(..., description="Bar size in minutes"),
     order: str = Query(
@@ -73,6 +93,10 @@ def get_future_prices_by_symbol(
     limit: int = Query(
         500, description="Number of bars to return"
     ),  # Limit the number of bars to return
+    tz: str = Query("America/New_York", description="Time zone of the returned dates"),
+    max_points: Optional[int] = Query(
+        None, ge=3, description="Downsample to at most this many bars (LTTB)"
+    ),
     db: Session = Depends(get_db),
 ):
     # Retrieve the Future contract by its symbol
@@ -82,10 +106,85 @@ def get_future_prices_by_symbol(
     if future is None:
         raise HTTPException(status_code=404, detail="Future not found")
 
+    # Answer conditional requests without touching the bar table
+    not_modified, headers = versions_service.check_not_modified(
+        request, versions_service.series_key(future.id)
+    )
+    if not_modified:
+        return versions_service.not_modified_response(headers)
+
     # Retrieve price bars (historical data) from the database for the Future contract
     bars = prices_service.get_price_bars_from_db(
-        db, future.id, data_type, bar_size, order, limit
+        db, future.id, data_type, bar_size, order, limit, raw=True
+    )
+
+    # Charts only render a few thousand points, keep the bars that preserve the series' shape
+    if max_points:
+        bars = downsampling_service.downsample_bars(bars, max_points)
+
+    # Return the list of price bars, serialized without per-row validation
+    response = serialization_service.price_bars_response(bars, tz)
+    response.headers.update(headers)
+    return response
+
+
+# Retrieve hourly or daily rollups (OHLCV, VWAP) for a specific Future symbol
+@router.get("/{symbol}/rollups", response_model=List[schemas.PriceRollup])
+def get_future_rollups_by_symbol(
+    symbol: str,
+    period: str = Query(..., description="Rollup period e.g., hour, day"),
+    data_type: str = Query(..., description="Data type e.g., ASK, BID, TRADES"),
+    bar_size: int = Query(5, description="Size of the source bars in minutes"),
+    order: str = Query("desc", description="Order of the rollups"),
+    limit: int = Query(500, description="Number of rollups to return"),
+    db: Session = Depends(get_db),
+):
+    # Retrieve the Future contract by its symbol
+    future = contracts_service.get_contract_by_symbol(db, symbol, "Future")
+
+    # If the contract is not found, raise a 404 error
+    if future is None:
+        raise HTTPException(status_code=404, detail="Future not found")
+
+    # Retrieve the pre-aggregated rollups instead of the raw bars
+    return rollups_service.get_rollups_from_db(
+        db, future.id, data_type, bar_size, period, order, limit
+    )
+
+
+# Retrieve the continuous series of a Future, stitched from its dated contracts
+@router.get("/{symbol}/continuous", response_model=List[schemas.ContinuousBar])
+def get_future_continuous_bars(
+    symbol: str,
+    data_type: str = Query(..., description="Data type e.g., ASK, BID, TRADES"),
+    bar_size: int = Query(5, description="Bar size in minutes"),
+    adjustment: str = Query(
+        "back", description="Roll adjustment e.g., none, back, ratio"
+    ),
+    order: str = Query("desc", description="Order of the bars"),
+    limit: int = Query(500, description="Number of bars to return"),
+    db: Session = Depends(get_db),
+):
+    # Retrieve the Future contract by its symbol
+    future = contracts_service.get_contract_by_symbol(db, symbol, "Future")
+
+    # If the contract is not found, raise a 404 error
+    if future is None:
+        raise HTTPException(status_code=404, detail="Future not found")
+
+    return futures_service.get_continuous_bars(
+        db, future.id, data_type, bar_size, adjustment, order, limit
     )
 
-    # Return the list of price bars
-    return bars
+
+# Retrieve the roll schedule of a Future, i.e. the dated contract followed from each roll date
+@router.get("/{symbol}/rolls", response_model=List[schemas.FutureRoll])
+def get_future_rolls(symbol: str, db: Session = Depends(get_db)):
+    # Retrieve the Future contract by its symbol
+    future = contracts_service.get_contract_by_symbol(db, symbol, "Future")
+
+    # If the contract is not found, raise a 404 error
+    if future is None:
+        raise HTTPException(status_code=404, detail="Future not found")
+
+    return futures_service.get_rolls(db, future.id)
@@ -1,9 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, Request
 from models import schemas, models
 from models.database import get_db
 from sqlalchemy.orm import Session
-from services import contracts_service, prices_service
-from typing import List
+from services import (
+    contracts_service,
+    downsampling_service,
+    prices_service,
+    rollups_service,
+    serialization_service,
+    versions_service,
+)
+from typing import List, Optional
 
 # Create an API router for handling Index-related requests
 router = APIRouter()
@@ -11,7 +18,15 @@ router = APIRouter()
 
 # Get a list of all Index contracts from the database
 @router.get("/", response_model=List[schemas.Contract])
-def get_indices(db: Session = Depends(get_db)):
+def get_indices(request: Request, response: Response, db: Session = Depends(get_db)):
+    # Answer conditional requests without querying the contracts
+    not_modified, headers = versions_service.check_not_modified(
+        request, versions_service.contracts_key("Index")
+    )
+    if not_modified:
+        return versions_service.not_modified_response(headers)
+    response.headers.update(headers)
+
     # Retrieve any contracts classified as "Index" from the database
     indices = contracts_service.get_any_contracts(db, "Index")
     return indices
@@ -30,11 +45,13 @@ def create_index(index: schemas.Contract, db: Session = Depends(get_db)):
         contract_type="Index",
         exchange=index.exchange,
         currency=index.currency,
+        collect_ticks=index.collect_ticks,
     )
 
     # Add the new contract to the database and commit the transaction
     db.add(db_contract)
     db.commit()
+    versions_service.bump_version(versions_service.contracts_key("Index"))
     db.refresh(db_contract)  # Refresh the instance with the updated data from the DB
 
     # Return the newly created contract
@@ -54,6 +71,7 @@ def delete_index(index_id: int, db: Session = Depends(get_db)):
     # Delete the contract and commit the transaction to the database
     db.delete(index)
     db.commit()
+    versions_service.bump_version(versions_service.contracts_key("Index"))
 
     # Return a 204 (No Content) response to indicate successful deletion
     return Response(status_code=204)
@@ -63,6 +81,7 @@ def delete_index(index_id: int, db: Session = Depends(get_db)):
 @router.get("/{symbol}/bars", response_model=List[schemas.PriceBar])
 def get_stock_prices_by_symbol(
     symbol: str,
+    request: Request,
     data_type: str = Query(..., description="Data type e.g., ASK, BID, TRADES"),
     bar_size: int = Query(..., description="Bar size in minutes"),
     order: str = Query(
@@ -71,6 +90,10 @@ def get_stock_prices_by_symbol(
     limit: int = Query(
         500, description="Number of bars to return"
     ),  # Limit the number of bars to return
+    tz: str = Query("America/New_York", description="Time zone of the returned dates"),
+    max_points: Optional[int] = Query(
+        None, ge=3, description="Downsample to at most this many bars (LTTB)"
+    ),
     db: Session = Depends(get_db),
 ):
     # Retrieve the Index contract by its symbol
@@ -80,10 +103,47 @@ def get_stock_prices_by_symbol(
     if index is None:
         raise HTTPException(status_code=404, detail="Index not found")
 
+    # Answer conditional requests without touching the bar table
+    not_modified, headers = versions_service.check_not_modified(
+        request, versions_service.series_key(index.id)
+    )
+    if not_modified:
+        return versions_service.not_modified_response(headers)
+
     # Retrieve price bars (historical data) from the database for the Index contract
     bars = prices_service.get_price_bars_from_db(
-        db, index.id, data_type, bar_size, order, limit
+        db, index.id, data_type, bar_size, order, limit, raw=True
     )
 
-    # Return the list of price bars
-    return bars
+    # Charts only render a few thousand points, keep the bars that preserve the series' shape
+    if max_points:
+        bars = downsampling_service.downsample_bars(bars, max_points)
+
+    # Return the list of price bars, serialized without per-row validation
+    response = serialization_service.price_bars_response(bars, tz)
+    response.headers.update(headers)
+    return response
+
+
+# Retrieve hourly or daily rollups (OHLCV, VWAP) for a specific Index symbol
+@router.get("/{symbol}/rollups", response_model=List[schemas.PriceRollup])
+def get_index_rollups_by_symbol(
+    symbol: str,
+    period: str = Query(..., description="Rollup period e.g., hour, day"),
+    data_type: str = Query(..., description="Data type e.g., ASK, BID, TRADES"),
+    bar_size: int = Query(5, description="Size of the source bars in minutes"),
+    order: str = Query("desc", description="Order of the rollups"),
+    limit: int = Query(500, description="Number of rollups to return"),
+    db: Session = Depends(get_db),
+):
+    # Retrieve the Index contract by its symbol
+    index = contracts_service.get_contract_by_symbol(db, symbol, "Index")
+
+    # If the contract is not found, raise a 404 error
+    if index is None:
+        raise HTTPException(status_code=404, detail="Index not found")
+
+    # Retrieve the pre-aggregated rollups instead of the raw bars
+    return rollups_service.get_rollups_from_db(
+        db, index.id, data_type, bar_size, period, order, limit
+    )
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from models import schemas
+from models.database import get_primary_db
+from sqlalchemy.orm import Session
+from services import contracts_service, freshness_service
+from typing import List, Optional
+
+# Create an API router for monitoring the data collection
+router = APIRouter()
+
+
+# Get the newest bar, lag and missing bars of the current session for every series
+@router.get("/freshness", response_model=List[schemas.SeriesFreshness])
+def get_freshness(
+    contract_type: Optional[str] = Query(
+        None, description="Contract type e.g., stocks, options, futures"
+    ),
+    stale_after: Optional[int] = Query(
+        None, description="Only return series lagging by at least this many seconds"
+    ),
+    # Lag must be measured against the primary, a lagging replica would report false staleness
+    db: Session = Depends(get_primary_db),
+):
+    # Map the route name of the contract type to the stored one
+    if contract_type is not None:
+        if contract_type not in contracts_service.ROUTE_CONTRACT_TYPES:
+            raise HTTPException(status_code=400, detail="Invalid contract type")
+        contract_type = contracts_service.ROUTE_CONTRACT_TYPES[contract_type]
+
+    return freshness_service.get_series_freshness(db, contract_type, stale_after)
@@ -1,9 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import Response
 from models import schemas
 from models.database import get_db
 from sqlalchemy.orm import Session
-from services import prices_service, options_service
-from typing import List
+from services import (
+    downsampling_service,
+    prices_service,
+    options_service,
+    rollups_service,
+    serialization_service,
+    versions_service,
+)
+from typing import List, Optional
 
 # Create an API router for handling Options-related requests
 router = APIRouter()
@@ -13,8 +21,18 @@ router = APIRouter()
 @router.get("/{symbol}", response_model=List[str])
 def get_options_expiration_dates(
     symbol: str,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
 ):
+    # Answer conditional requests without querying the contracts
+    not_modified, headers = versions_service.check_not_modified(
+        request, versions_service.contracts_key("Option")
+    )
+    if not_modified:
+        return versions_service.not_modified_response(headers)
+    response.headers.update(headers)
+
     # Retrieve expiration dates for the options of a given symbol from the database
     expiration_dates = options_service.get_option_expiration_dates(db, symbol)
 
@@ -26,14 +44,48 @@ def get_options_expiration_dates(
 def get_options_strikes(
     symbol: str,
     expiration_date: str,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
 ):
+    # Answer conditional requests without querying the contracts
+    not_modified, headers = versions_service.check_not_modified(
+        request, versions_service.contracts_key("Option")
+    )
+    if not_modified:
+        return versions_service.not_modified_response(headers)
+    response.headers.update(headers)
+
     # Retrieve the strike prices for the given symbol and expiration date
     strikes = options_service.get_options_strikes(db, symbol, expiration_date)
 
     return strikes
 
 
+# Get implied volatility and Greeks for every strike, right and bar of a stored option chain
+@router.get(
+    "/{symbol}/{expiration_date}/greeks",
+    response_model=List[schemas.OptionGreeks],
+)
+def get_options_greeks(
+    symbol: str,
+    expiration_date: str,
+    price_source: str = Query(
+        "MID", description="Option price used e.g., MID, TRADES, BID, ASK"
+    ),
+    bar_size: int = Query(1, description="Bar size of the option bars in minutes"),
+    rate: float = Query(0.05, description="Annualized risk-free rate"),
+    db: Session = Depends(get_db),
+):
+    # Imported on first use, so that the API starts without NumPy and pandas
+    from services import greeks_service
+
+    # Compute IV and Greeks across the whole chain in one vectorized pass
+    return greeks_service.get_chain_greeks(
+        db, symbol, expiration_date, price_source, bar_size, rate
+    )
+
+
 # Get price bars (e.g., ask, bid, trades) for a specific option contract
 @router.get(
     "/{symbol}/{expiration_date}",
@@ -42,6 +94,7 @@ def get_options_strikes(
 def get_options_prices_by_symbol(
     symbol: str,
     expiration_date: str,
+    request: Request,
     strike: float = Query(
         ..., description="Strike price"
     ),  # Query parameter for the option's strike price
@@ -60,6 +113,10 @@ def get_options_prices_by_symbol(
     limit: int = Query(
         500, description="Number of bars to return"
     ),  # Limit the number of price bars returned
+    tz: str = Query("America/New_York", description="Time zone of the returned dates"),
+    max_points: Optional[int] = Query(
+        None, ge=3, description="Downsample to at most this many bars (LTTB)"
+    ),
     db: Session = Depends(get_db),
 ):
     # Retrieve the option contract based on the provided symbol, expiration date, strike price, and option right
@@ -71,9 +128,55 @@ def get_options_prices_by_symbol(
     if contract is None:
         raise HTTPException(status_code=404, detail="Option contract not found")
 
+    # Answer conditional requests without touching the bar table
+    not_modified, headers = versions_service.check_not_modified(
+        request, versions_service.series_key(contract.id)
+    )
+    if not_modified:
+        return versions_service.not_modified_response(headers)
+
     # Retrieve price bars (historical data) from the database for the option contract
     bars = prices_service.get_price_bars_from_db(
-        db, contract.id, data_type, bar_size, order, limit
+        db, contract.id, data_type, bar_size, order, limit, raw=True
+    )
+
+    # Charts only render a few thousand points, keep the bars that preserve the series' shape
+    if max_points:
+        bars = downsampling_service.downsample_bars(bars, max_points)
+
+    # Return the list of price bars, serialized without per-row validation
+    response = serialization_service.price_bars_response(bars, tz)
+    response.headers.update(headers)
+    return response
+
+
+# Get hourly or daily rollups (OHLCV, VWAP) for a specific option contract
+@router.get(
+    "/{symbol}/{expiration_date}/rollups",
+    response_model=List[schemas.PriceRollup],
+)
+def get_options_rollups_by_symbol(
+    symbol: str,
+    expiration_date: str,
+    strike: float = Query(..., description="Strike price"),
+    right: str = Query(..., description="Right e.g., CALL, PUT"),
+    period: str = Query(..., description="Rollup period e.g., hour, day"),
+    data_type: str = Query(..., description="Data type e.g., ASK, BID, TRADES"),
+    bar_size: int = Query(1, description="Size of the source bars in minutes"),
+    order: str = Query("desc", description="Order of the rollups"),
+    limit: int = Query(500, description="Number of rollups to return"),
+    db: Session = Depends(get_db),
+):
+    # Retrieve the option contract based on the provided symbol, expiration date, strike price, and option right
+    contract = options_service.get_option_contract_db(
+        db, symbol, expiration_date, strike, right
     )
 
-    return bars
+    # If the contract is not found, raise a 404 error
+    if contract is None:
+        raise HTTPException(status_code=404, detail="Option contract not found")
+
+    # Retrieve the pre-aggregated rollups instead of the raw bars
+    return rollups_service.get_rollups_from_db(
+        db, contract.id, data_type, bar_size, period, order, limit
+    )
@@ -1,11 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi.responses import Response
 from models import schemas
 from models.database import get_db
 from sqlalchemy.orm import Session
-from services import contracts_service, prices_service
-from tasks import stocks_tasks  # Celery tasks for asynchronous processing
-from typing import List
+from services import (
+    contracts_service,
+    downsampling_service,
+    dispatch_service,
+    prices_service,
+    rollups_service,
+    serialization_service,
+    versions_service,
+)
+from typing import List, Optional
 
 # Create an API router for handling stock-related requests
 router = APIRouter()
@@ -13,7 +20,15 @@ router = APIRouter()
 
 # Get a list of all Stock contracts from the database
 @router.get("/", response_model=List[schemas.Contract])
-def get_stocks(db: Session = Depends(get_db)):
+def get_stocks(request: Request, response: Response, db: Session = Depends(get_db)):
+    # Answer conditional requests without querying the contracts
+    not_modified, headers = versions_service.check_not_modified(
+        request, versions_service.contracts_key("Stock")
+    )
+    if not_modified:
+        return versions_service.not_modified_response(headers)
+    response.headers.update(headers)
+
     # Retrieve any contracts classified as "Stock" from the database
     stocks = contracts_service.get_any_contracts(db, "Stock")
     return stocks
@@ -27,8 +42,15 @@ def create_stock(stock: schemas.Contract, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Stock already exists")
 
     # Asynchronously fetch stock data from Interactive Brokers using Celery
-    stocks_tasks.fetch_stock.delay(
-        stock.symbol, stock.exchange, stock.currency, stock.to_trade
+    dispatch_service.send_task(
+        "tasks.stocks_tasks.fetch_stock",
+        (
+            stock.symbol,
+            stock.exchange,
+            stock.currency,
+            stock.to_trade,
+            stock.collect_ticks,
+        ),
     )
 
     # Return a 202 Accepted status, indicating that the request has been accepted for processing
@@ -39,6 +61,7 @@ def create_stock(stock: schemas.Contract, db: Session = Depends(get_db)):
 @router.get("/{symbol}/bars", response_model=List[schemas.PriceBar])
 def get_stock_prices_by_symbol(
     symbol: str,
+    request: Request,
     data_type: str = Query(
         ..., description="Data type e.g., ASK, BID, TRADES"
     ),  # Query parameter for data type
@@ -51,6 +74,10 @@ def get_stock_prices_by_symbol(
     limit: int = Query(
         500, description="Number of bars to return"
     ),  # Limit on the number of price bars
+    tz: str = Query("America/New_York", description="Time zone of the returned dates"),
+    max_points: Optional[int] = Query(
+        None, ge=3, description="Downsample to at most this many bars (LTTB)"
+    ),
     db: Session = Depends(get_db),
 ):
     # Retrieve the Stock contract by its symbol
@@ -60,10 +87,47 @@ def get_stock_prices_by_symbol(
     if stock is None:
         raise HTTPException(status_code=404, detail="Stock not found")
 
+    # Answer conditional requests without touching the bar table
+    not_modified, headers = versions_service.check_not_modified(
+        request, versions_service.series_key(stock.id)
+    )
+    if not_modified:
+        return versions_service.not_modified_response(headers)
+
     # Retrieve price bars (historical data) from the database for the stock contract
     bars = prices_service.get_price_bars_from_db(
-        db, stock.id, data_type, bar_size, order, limit
+        db, stock.id, data_type, bar_size, order, limit, raw=True
     )
 
-    # Return the list of price bars
-    return bars
+    # Charts only render a few thousand points, keep the bars that preserve the series' shape
+    if max_points:
+        bars = downsampling_service.downsample_bars(bars, max_points)
+
+    # Return the list of price bars, serialized without per-row validation
+    response = serialization_service.price_bars_response(bars, tz)
+    response.headers.update(headers)
+    return response
+
+
+# Retrieve hourly or daily rollups (OHLCV, VWAP) for a specific Stock symbol
+@router.get("/{symbol}/rollups", response_model=List[schemas.PriceRollup])
+def get_stock_rollups_by_symbol(
+    symbol: str,
+    period: str = Query(..., description="Rollup period e.g., hour, day"),
+    data_type: str = Query(..., description="Data type e.g., ASK, BID, TRADES"),
+    bar_size: int = Query(5, description="Size of the source bars in minutes"),
+    order: str = Query("desc", description="Order of the rollups"),
+    limit: int = Query(500, description="Number of rollups to return"),
+    db: Session = Depends(get_db),
+):
+    # Retrieve the Stock contract by its symbol
+    stock = contracts_service.get_contract_by_symbol(db, symbol, "Stock")
+
+    # If the contract is not found, raise a 404 error
+    if stock is None:
+        raise HTTPException(status_code=404, detail="Stock not found")
+
+    # Retrieve the pre-aggregated rollups instead of the raw bars
+    return rollups_service.get_rollups_from_db(
+        db, stock.id, data_type, bar_size, period, order, limit
+    )
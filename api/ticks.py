@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, Query
+from models.database import get_db
+from sqlalchemy.orm import Session
+from services import contracts_service, ticks_service
+from datetime import datetime
+from typing import Optional
+
+# Create an API router for reading captured historical ticks
+router = APIRouter()
+
+
+# Stream the ticks of a contract over a time range, as an Arrow IPC stream or a JSON array
+@router.get("/{contract_type}/{symbol}")
+def get_ticks(
+    contract_type: str,
+    symbol: str,
+    start: datetime = Query(..., description="Start of the range, UTC if naive"),
+    end: datetime = Query(..., description="End of the range (excluded), UTC if naive"),
+    tick_type: str = Query("TRADES", description="Tick type e.g., TRADES, BID_ASK"),
+    format: str = Query("arrow", description="Response format e.g., arrow, json"),
+    expiration_date: Optional[str] = Query(None, description="Option expiration date"),
+    strike: Optional[float] = Query(None, description="Option strike price"),
+    right: Optional[str] = Query(None, description="Option right e.g., C, P"),
+    db: Session = Depends(get_db),
+):
+    # Resolve the contract from the route it is exposed under (stocks, futures, options...)
+    contract = contracts_service.get_contract_by_route(
+        db, contract_type, symbol, expiration_date, strike, right
+    )
+
+    # The ticks are read in batches while the response is streamed
+    return ticks_service.ticks_response(contract.id, tick_type, start, end, format)
@@ -5,6 +5,9 @@ from tasks.celeryconfig import (
     CELERY_TASK_QUEUES,
     CELERY_TASK_ROUTES,
     CELERY_LOG_LEVEL,
+    CELERY_BROKER_TRANSPORT_OPTIONS,
+    CELERY_WORKER_PREFETCH_MULTIPLIER,
+    CELERY_TASK_ACKS_LATE,
 )
 
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL")
@@ -15,9 +18,22 @@ celery_app.conf.update(
     task_queues=CELERY_TASK_QUEUES,
     task_routes=CELERY_TASK_ROUTES,
     beat_schedule=CELERY_BEAT_SCHEDULE,
+    broker_transport_options=CELERY_BROKER_TRANSPORT_OPTIONS,
+    worker_prefetch_multiplier=CELERY_WORKER_PREFETCH_MULTIPLIER,
+    task_acks_late=CELERY_TASK_ACKS_LATE,
+    task_default_queue="default",
+    # Only used by workers started with --autoscale
+    worker_autoscaler="tasks.autoscaler:QueueAutoscaler",
 )
 
 celery_app.autodiscover_tasks(
-    ["tasks.market_reader_tasks", "tasks.stocks_tasks"],
+    [
+        "tasks.market_reader_tasks",
+        "tasks.stocks_tasks",
+        "tasks.archive_tasks",
+        "tasks.ticks_tasks",
+        "tasks.onboarding_tasks",
+        "tasks.autoscaler",  # Connects the runtime sampling signals in every process
+    ],
     force=True,
 )
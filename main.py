@@ -1,5 +1,15 @@
 from fastapi import FastAPI
-from api import stocks, options, futures, indices, forex
+from api import (
+    stocks,
+    options,
+    futures,
+    indices,
+    forex,
+    analytics,
+    monitoring,
+    ticks,
+    contracts,
+)
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware import Middleware
@@ -64,3 +74,7 @@ app.include_router(futures.router, prefix="/futures")
 app.include_router(indices.router, prefix="/indices")
 app.include_router(options.router, prefix="/options")
 app.include_router(forex.router, prefix="/forex")
+app.include_router(analytics.router, prefix="/analytics")
+app.include_router(monitoring.router, prefix="/monitoring")
+app.include_router(ticks.router, prefix="/ticks")
+app.include_router(contracts.router, prefix="/contracts")
@@ -2,6 +2,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import QueuePool, NullPool
 from sqlalchemy.ext.declarative import declarative_base
+from fastapi import Request
 import os
 from contextlib import contextmanager
 
@@ -24,18 +25,59 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Optional read replica serving the API's GET routes, with its own pool
+DB_READ_HOST = os.getenv("DB_READ_HOST")
+
+if DB_READ_HOST:
+    read_engine = create_engine(
+        f"postgresql://{DB_USER}:{DB_PASS}@{DB_READ_HOST}/{DB_NAME}",
+        poolclass=QueuePool,
+        pool_size=int(os.getenv("DB_READ_POOL_SIZE", 20)),
+        max_overflow=int(os.getenv("DB_READ_MAX_OVERFLOW", 10)),
+        pool_timeout=30,
+        pool_recycle=1800,
+    )
+else:
+    read_engine = engine
+
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# Seconds a replica may lag behind the primary, see versions_service.check_not_modified
+DB_READ_MAX_LAG = float(os.getenv("DB_READ_MAX_LAG", 5))
+
+# Requests sending this header are served by the primary, for reads that cannot be stale
+READ_PRIMARY_HEADER = "x-read-primary"
+
 Base = declarative_base()
 
 
-# Dependency
-def get_db():
+# Dependency, routing GET requests to the read replica unless they opt out
+def get_db(request: Request):
+    use_replica = (
+        request.method in ("GET", "HEAD")
+        and request.headers.get(READ_PRIMARY_HEADER) is None
+    )
+    request.state.read_replica = use_replica and read_engine is not engine
+
+    with get_celery_db(ReadSessionLocal if use_replica else SessionLocal) as db:
+        yield db
+
+
+# Dependency for reads that must see the latest commits, e.g. ingestion monitoring
+def get_primary_db():
     with get_celery_db() as db:
         yield db
 
 
 @contextmanager
-def get_celery_db():
-    db = SessionLocal()
+def get_read_db():
+    with get_celery_db(ReadSessionLocal) as db:
+        yield db
+
+
+@contextmanager
+def get_celery_db(session_factory: sessionmaker = SessionLocal):
+    db = session_factory()
     try:
         yield db
     except:
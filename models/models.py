@@ -7,10 +7,15 @@ from sqlalchemy import (
     Date,
     Boolean,
     BigInteger,
+    REAL,
+    SmallInteger,
+    TypeDecorator,
+    Index as SQLIndex,
+    UniqueConstraint,
 )
 from datetime import datetime
 from sqlalchemy.orm import relationship, Mapped, mapped_column
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from models.database import Base
 
 
@@ -25,6 +30,11 @@ class BaseContract(Base):
 
     to_trade: Mapped[bool | None] = mapped_column(Boolean, default=True, nullable=True)
 
+    # Whether historical ticks are captured as well as bars
+    collect_ticks: Mapped[bool | None] = mapped_column(
+        Boolean, default=False, nullable=True
+    )
+
     created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
     updated_at: Mapped[datetime] = mapped_column(
         DateTime, default=func.now(), onupdate=func.now()
@@ -40,6 +50,14 @@ class Stock(BaseContract):
         Float, default=2, nullable=True
     )
 
+    # Option expirations collected: the next weeklies (including 0DTE) and the next monthlies
+    option_weeklies: Mapped[int | None] = mapped_column(
+        Integer, default=1, nullable=True
+    )
+    option_monthlies: Mapped[int | None] = mapped_column(
+        Integer, default=0, nullable=True
+    )
+
     __mapper_args__ = {
         "polymorphic_identity": "Stock",
     }
@@ -66,14 +84,64 @@ class Option(BaseContract):
     }
 
 
+# Columns identifying an option contract, used for conflict detection on bulk inserts
+OPTION_KEY_COLUMNS = [
+    "underlying_id",
+    "lastTradeDateOrContractMonth",
+    "strike",
+    "right",
+]
+OPTION_KEY_WHERE = text("contract_type = 'Option'")
+
+SQLIndex(
+    "ix_contracts_option_key",
+    *[BaseContract.__table__.c[column] for column in OPTION_KEY_COLUMNS],
+    unique=True,
+    postgresql_where=OPTION_KEY_WHERE,
+)
+
+
+# Columns identifying the other contract types, several dated futures share them
+CONTRACT_KEY_COLUMNS = ["contract_type", "symbol", "exchange", "currency"]
+CONTRACT_KEY_WHERE = text("contract_type NOT IN ('Option', 'DatedFuture')")
+
+SQLIndex(
+    "ix_contracts_contract_key",
+    *[BaseContract.__table__.c[column] for column in CONTRACT_KEY_COLUMNS],
+    unique=True,
+    postgresql_where=CONTRACT_KEY_WHERE,
+    postgresql_nulls_not_distinct=True,  # Contracts without an exchange are unique too
+)
+
+
 class Future(BaseContract):
-    # Only supports Continuous Futures
+    # Continuous future root, its series is stitched from its DatedFuture contracts
 
     __mapper_args__ = {
         "polymorphic_identity": "Future",
     }
 
 
+class DatedFuture(BaseContract):
+    # A specific expiry of a Future root, sharing the conId and expiry columns of the
+    # other contract types on the single contracts table
+    conId: Mapped[int | None] = mapped_column(
+        Integer, unique=True, nullable=True, use_existing_column=True
+    )
+    lastTradeDateOrContractMonth: Mapped[datetime | None] = mapped_column(
+        Date, nullable=True, use_existing_column=True
+    )
+    underlying_id: Mapped[int | None] = mapped_column(
+        ForeignKey("contracts.id", ondelete="CASCADE"),
+        nullable=True,
+        use_existing_column=True,
+    )
+
+    __mapper_args__ = {
+        "polymorphic_identity": "DatedFuture",
+    }
+
+
 class Index(BaseContract):
     __mapper_args__ = {
         "polymorphic_identity": "Index",
@@ -86,6 +154,44 @@ class Forex(BaseContract):
     }
 
 
+# Codes stored in price_bars.data_type, never reuse or renumber them
+PRICE_DATA_TYPE_CODES = {
+    "TRADES": 1,
+    "BID": 2,
+    "ASK": 3,
+    "MIDPOINT": 4,
+    "BID_ASK": 5,  # Ticks only
+}
+PRICE_DATA_TYPE_NAMES = {code: name for name, code in PRICE_DATA_TYPE_CODES.items()}
+
+
+class PriceDataType(TypeDecorator):
+    # Stores the IB whatToShow names as a smallint enum, services keep using the names
+    impl = SmallInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if value not in PRICE_DATA_TYPE_CODES:
+            # Storing NULL would silently lose the bar's data type
+            raise ValueError(f"Unknown price data type: {value}")
+        return PRICE_DATA_TYPE_CODES[value]
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return PRICE_DATA_TYPE_NAMES.get(value)
+
+
+class IngestBatch(Base):
+    # One row per committed ingestion, replacing per-row audit timestamps on price_bars
+    __tablename__ = "ingest_batches"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
+
+
 class PriceBar(Base):
     __tablename__ = "price_bars"
 
@@ -96,16 +202,135 @@ class PriceBar(Base):
     low: Mapped[float] = mapped_column(Float)
     close: Mapped[float] = mapped_column(Float)
     volume: Mapped[int] = mapped_column(BigInteger)
-    bar_size: Mapped[int] = mapped_column(Integer)  # In minutes
+    bar_size: Mapped[int] = mapped_column(SmallInteger)  # In minutes
 
-    data_type: Mapped[str] = mapped_column(String)
+    data_type: Mapped[str] = mapped_column(PriceDataType)
 
     contract_id: Mapped[int] = mapped_column(ForeignKey("contracts.id"))
     contract: Mapped[BaseContract] = relationship(
         "BaseContract"
     )  # references 'Stock', 'Option', 'Future', 'Forex'
 
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
-    updated_at: Mapped[datetime] = mapped_column(
-        DateTime, default=func.now(), onupdate=func.now()
+    ingest_batch_id: Mapped[int | None] = mapped_column(
+        ForeignKey("ingest_batches.id"), nullable=True
+    )
+
+    __table_args__ = (
+        # Bars are appended in time order, so a BRIN index serves date ranges at a tiny size
+        SQLIndex("ix_price_bars_date_brin", "date", postgresql_using="brin"),
+        # One bar per series and date, making the buffered writes idempotent
+        UniqueConstraint(
+            "contract_id",
+            "data_type",
+            "bar_size",
+            "date",
+            name="uq_price_bars_series_date",
+        ),
+    )
+
+
+class PriceTick(Base):
+    # Historical ticks, kept compact: integer timestamps, float4 prices and no surrogate key.
+    # Trades fill price and size, quotes fill the bid and ask columns
+    __tablename__ = "price_ticks"
+
+    contract_id: Mapped[int] = mapped_column(
+        ForeignKey("contracts.id", ondelete="CASCADE"), primary_key=True
+    )
+    data_type: Mapped[str] = mapped_column(PriceDataType, primary_key=True)
+    # Microseconds since epoch, UTC
+    time_us: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    seq: Mapped[int] = mapped_column(SmallInteger, primary_key=True)  # Within time_us
+
+    price: Mapped[float | None] = mapped_column(REAL, nullable=True)
+    size: Mapped[float | None] = mapped_column(REAL, nullable=True)
+    bid_price: Mapped[float | None] = mapped_column(REAL, nullable=True)
+    ask_price: Mapped[float | None] = mapped_column(REAL, nullable=True)
+    bid_size: Mapped[float | None] = mapped_column(REAL, nullable=True)
+    ask_size: Mapped[float | None] = mapped_column(REAL, nullable=True)
+
+
+class SeriesState(Base):
+    # Ingestion watermark per series, updated in the same transaction as the bars
+    __tablename__ = "series_state"
+
+    contract_id: Mapped[int] = mapped_column(
+        ForeignKey("contracts.id", ondelete="CASCADE"), primary_key=True
     )
+    data_type: Mapped[str] = mapped_column(PriceDataType, primary_key=True)
+    bar_size: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+
+    last_bar_date: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    bar_count: Mapped[int] = mapped_column(BigInteger, default=0)
+    last_fetch_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+
+
+class FutureRoll(Base):
+    # Roll schedule of a Future root: from roll_date on, its continuous series follows contract_id
+    __tablename__ = "future_rolls"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    future_id: Mapped[int] = mapped_column(
+        ForeignKey("contracts.id", ondelete="CASCADE")
+    )
+    contract_id: Mapped[int] = mapped_column(
+        ForeignKey("contracts.id", ondelete="CASCADE")
+    )
+
+    # None for the first contract of a root, followed since the start of the series
+    roll_date: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+
+    __table_args__ = (
+        UniqueConstraint(
+            "future_id", "contract_id", name="uq_future_rolls_future_contract"
+        ),
+    )
+
+
+class PriceRollup(Base):
+    # Hourly and daily aggregates of price_bars, maintained incrementally at ingest
+    __tablename__ = "price_rollups"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    contract_id: Mapped[int] = mapped_column(
+        ForeignKey("contracts.id", ondelete="CASCADE")
+    )
+    data_type: Mapped[str] = mapped_column(String)
+    bar_size: Mapped[int] = mapped_column(Integer)  # Size of the source bars in minutes
+    period: Mapped[str] = mapped_column(String)  # "hour" or "day"
+    period_start: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+    # Dates of the first and last source bars, used to merge open/close out of order
+    first_bar_date: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    last_bar_date: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+    open: Mapped[float] = mapped_column(Float)
+    high: Mapped[float] = mapped_column(Float)
+    low: Mapped[float] = mapped_column(Float)
+    close: Mapped[float] = mapped_column(Float)
+    volume: Mapped[int] = mapped_column(BigInteger)
+    price_volume: Mapped[float] = mapped_column(Float)  # Sum of typical price * volume
+    bar_count: Mapped[int] = mapped_column(Integer)
+
+    __table_args__ = (
+        UniqueConstraint(
+            "contract_id",
+            "data_type",
+            "bar_size",
+            "period",
+            "period_start",
+            name="uq_price_rollups_series_period",
+        ),
+    )
+
+    @property
+    def vwap(self) -> float | None:
+        if not self.volume:
+            return None
+        return self.price_volume / self.volume
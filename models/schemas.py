@@ -1,10 +1,21 @@
 from pydantic import BaseModel, field_validator
-from typing import Optional
+from typing import Dict, List, Literal, Optional
 from datetime import datetime
-from ib_insync import Option as IBOption
 import pytz
 
 
+def to_ny_time(value):
+    # Define the New York time zone
+    ny_tz = pytz.timezone("America/New_York")
+
+    # If the date is naive (no timezone), assume it's in UTC and convert
+    if value.tzinfo is None:
+        value = pytz.utc.localize(value)
+
+    # Convert to New York time zone
+    return value.astimezone(ny_tz)
+
+
 class Contract(BaseModel):
     id: Optional[int] = None
     symbol: str
@@ -12,11 +23,33 @@ class Contract(BaseModel):
     conId: Optional[int] = None
     currency: Optional[str] = "USD"
     to_trade: Optional[bool] = True
+    collect_ticks: Optional[bool] = False
+
+
+# A row of a bulk import, options are collected from their underlying and cannot be imported
+class ContractImportRow(Contract):
+    contract_type: Literal["Stock", "Future", "Index", "Forex"]
 
 
-class IBOptionWithID(BaseModel):
-    option: IBOption
-    db_id: int
+class ContractImportStatus(BaseModel):
+    row: int  # 1-based position in the request, header excluded
+    contract_type: Optional[str] = None
+    symbol: Optional[str] = None
+    exchange: Optional[str] = None
+    currency: Optional[str] = None
+    status: str
+    detail: Optional[str] = None
+    id: Optional[int] = None
+    conId: Optional[int] = None
+
+
+class ContractImportJob(BaseModel):
+    job_id: str
+    status: str
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    counts: Dict[str, int]
+    rows: List[ContractImportStatus]
 
 
 class PriceBar(BaseModel):
@@ -30,12 +63,101 @@ class PriceBar(BaseModel):
 
     @field_validator("date", mode="before")
     def convert_to_ny_time(cls, value):
-        # Define the New York time zone
-        ny_tz = pytz.timezone("America/New_York")
+        return to_ny_time(value)
 
-        # If the date is naive (no timezone), assume it's in UTC and convert
-        if value.tzinfo is None:
-            value = pytz.utc.localize(value)
 
-        # Convert to New York time zone
-        return value.astimezone(ny_tz)
+class PriceRollup(BaseModel):
+    period: str
+    period_start: datetime
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: int
+    vwap: Optional[float] = None
+    bar_count: int
+
+    @field_validator("period_start", mode="before")
+    def convert_to_ny_time(cls, value):
+        return to_ny_time(value)
+
+
+class SpreadBar(BaseModel):
+    date: datetime
+    bid: float
+    ask: float
+    mid: float
+    spread: float
+    relative_spread: Optional[float] = None
+
+    @field_validator("date", mode="before")
+    def convert_to_ny_time(cls, value):
+        return to_ny_time(value)
+
+
+class IndicatorBar(BaseModel):
+    date: datetime
+    open: Optional[float] = None
+    high: Optional[float] = None
+    low: Optional[float] = None
+    close: Optional[float] = None
+    volume: Optional[int] = None
+    returns: Optional[float] = None
+    log_returns: Optional[float] = None
+    sma: Optional[float] = None
+    ema: Optional[float] = None
+    volatility: Optional[float] = None
+    atr: Optional[float] = None
+    vwap: Optional[float] = None
+    rsi: Optional[float] = None
+
+
+class OptionGreeks(BaseModel):
+    date: datetime
+    strike: float
+    right: str
+    option_price: float
+    underlying_price: float
+    time_to_expiry: float
+    iv: Optional[float] = None
+    delta: Optional[float] = None
+    gamma: Optional[float] = None
+    vega: Optional[float] = None
+    theta: Optional[float] = None
+    rho: Optional[float] = None
+
+
+class ContinuousBar(BaseModel):
+    date: datetime
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: int
+    contract_month: str
+
+
+class FutureRoll(BaseModel):
+    contract_id: int
+    conId: Optional[int] = None
+    contract_month: str
+    roll_date: Optional[datetime] = None
+
+    @field_validator("roll_date", mode="before")
+    def convert_to_ny_time(cls, value):
+        return to_ny_time(value) if value is not None else None
+
+
+class SeriesFreshness(BaseModel):
+    contract_id: int
+    symbol: str
+    contract_type: str
+    data_type: str
+    bar_size: int
+    last_bar_date: Optional[datetime] = None
+    last_fetch_at: Optional[datetime] = None
+    lag_seconds: Optional[float] = None
+    session_open: datetime
+    expected_bars: int
+    session_bars: int
+    missing_bars: int
@@ -0,0 +1,58 @@
+from models.database import get_celery_db
+from services import write_buffer_service
+from typing import List
+import socket
+import time
+
+# Seconds to wait before retrying a batch whose transaction failed
+WRITE_RETRY_DELAY = 5
+
+
+# Writes fetches one transaction each, acknowledging those that succeed and moving those
+# that still fail to the dead-letter stream
+def write_separately(entries: List[write_buffer_service.Entry]) -> None:
+    for entry in entries:
+        try:
+            with get_celery_db() as db:
+                write_buffer_service.write_entries(db, [entry])
+        except Exception as e:
+            print(f"Moving fetch {entry[0].decode()} to the dead-letter stream: {e}")
+            write_buffer_service.dead_letter_entries([entry], e)
+            continue
+
+        write_buffer_service.ack_entries([entry])
+
+
+# Drains the price bar stream into Postgres, one transaction per batch of fetches.
+# Fetches are acknowledged only once committed, so a crash re-delivers them to the next writer
+def main() -> None:
+    consumer = socket.gethostname()
+    write_buffer_service.ensure_group()
+    print(f"Price writer {consumer} started")
+
+    while True:
+        entries = write_buffer_service.read_entries(consumer)
+        if not entries:
+            continue
+
+        try:
+            with get_celery_db() as db:
+                write_buffer_service.write_entries(db, entries)
+        except Exception as e:
+            # The entries stay pending and are read again first
+            print(f"Failed to write {len(entries)} fetches, retrying: {e}")
+
+            # A batch failing on every delivery holds a fetch that cannot be written,
+            # isolate it instead of blocking ingestion
+            exhausted = write_buffer_service.get_exhausted_entries(consumer, entries)
+            if exhausted:
+                write_separately(exhausted)
+            else:
+                time.sleep(WRITE_RETRY_DELAY)
+            continue
+
+        write_buffer_service.ack_entries(entries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+from models.models import PriceBar
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import List
+import functools
+import pytz
+import os
+
+# Local directory or object store URI (e.g. s3://bucket/price_bars) holding the archive
+ARCHIVE_URI = os.getenv("PRICE_ARCHIVE_URI", "/app/archive/price_bars")
+
+# Bars older than this many days are moved out of Postgres
+ARCHIVE_AFTER_DAYS = int(os.getenv("PRICE_ARCHIVE_AFTER_DAYS", 30))
+
+# The nightly run leaves bars up to a day past the cutoff, and markets can then be
+# closed for a long weekend, so the oldest hot bar of an archived series can be this late
+ARCHIVE_CUTOFF_GRACE = timedelta(days=5)
+
+
+# pyarrow is imported on first use, so that the API starts without it
+@functools.lru_cache(maxsize=1)
+def get_archive_schema():
+    import pyarrow as pa
+
+    return pa.schema(
+        [
+            ("date", pa.timestamp("us", tz="UTC")),
+            ("open", pa.float64()),
+            ("high", pa.float64()),
+            ("low", pa.float64()),
+            ("close", pa.float64()),
+            ("volume", pa.int64()),
+            ("bar_size", pa.int32()),
+            ("data_type", pa.string()),
+        ]
+    )
+
+
+def get_archive_filesystem():
+    import pyarrow.fs as pafs
+
+    if "://" not in ARCHIVE_URI:
+        # Local files are memory-mapped instead of read into Python buffers
+        return pafs.LocalFileSystem(use_mmap=True), os.path.abspath(ARCHIVE_URI)
+
+    filesystem, root = pafs.FileSystem.from_uri(ARCHIVE_URI)
+    return filesystem, root.rstrip("/")
+
+
+# Whether bars older than a series' oldest hot bar can be in the archive. Series whose hot
+# window does not reach back to the cutoff were never archived, and are read from Postgres only
+def may_have_archived_bars(oldest_hot_date: datetime | None) -> bool:
+    if oldest_hot_date is None:
+        return True  # The whole series may have been archived
+
+    cutoff = datetime.now(pytz.utc) - timedelta(days=ARCHIVE_AFTER_DAYS)
+    return oldest_hot_date <= cutoff + ARCHIVE_CUTOFF_GRACE
+
+
+def get_contract_archive_path(root: str, contract_id: int) -> str:
+    return f"{root}/contract_id={contract_id}"
+
+
+# Exports bars older than the cutoff to Parquet per contract and month, then deletes them
+def archive_price_bars(
+    db: Session, archive_after_days: int = ARCHIVE_AFTER_DAYS
+) -> int:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    filesystem, root = get_archive_filesystem()
+    cutoff = datetime.now(pytz.utc) - timedelta(days=archive_after_days)
+    month = func.date_trunc("month", PriceBar.date)
+
+    partitions = (
+        db.query(PriceBar.contract_id, month)
+        .filter(PriceBar.date < cutoff)
+        .distinct()
+        .all()
+    )
+
+    archived = 0
+    for contract_id, month_start in partitions:
+        month_end = (month_start + timedelta(days=32)).replace(day=1)
+        filters = (
+            PriceBar.contract_id == contract_id,
+            PriceBar.date >= month_start,
+            PriceBar.date < min(month_end, cutoff),
+        )
+
+        rows = (
+            db.query(
+                PriceBar.date,
+                PriceBar.open,
+                PriceBar.high,
+                PriceBar.low,
+                PriceBar.close,
+                PriceBar.volume,
+                PriceBar.bar_size,
+                PriceBar.data_type,
+            )
+            .filter(*filters)
+            .order_by(PriceBar.date)
+            .all()
+        )
+        if not rows:
+            continue
+
+        table = pa.Table.from_pylist(
+            [row._asdict() for row in rows], schema=get_archive_schema()
+        )
+
+        # A month can be archived over several runs, so each run writes its own file
+        directory = (
+            f"{get_contract_archive_path(root, contract_id)}/"
+            f"month={month_start.strftime('%Y-%m')}"
+        )
+        filesystem.create_dir(directory, recursive=True)
+        run_id = datetime.now(pytz.utc).strftime("%Y%m%d%H%M%S%f")
+        pq.write_table(
+            table,
+            f"{directory}/part-{run_id}.parquet",
+            filesystem=filesystem,
+            compression="zstd",
+        )
+
+        # Only delete once the file is durably written
+        db.query(PriceBar).filter(*filters).delete(synchronize_session=False)
+        db.commit()
+
+        archived += len(rows)
+        print(f"Archived {len(rows)} bars for contract {contract_id} ({directory})")
+
+    return archived
+
+
+# Reads archived bars older than a date, newest first, returned as transient PriceBar objects
+def get_archived_price_bars(
+    contract_id: int,
+    data_type: str,
+    bar_size: int,
+    before: datetime | None,
+    limit: int,
+) -> List[PriceBar]:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.fs as pafs
+
+    schema = get_archive_schema()
+    filesystem, root = get_archive_filesystem()
+    path = get_contract_archive_path(root, contract_id)
+
+    if filesystem.get_file_info(path).type == pafs.FileType.NotFound:
+        return []
+
+    dataset = ds.dataset(
+        path, format="parquet", partitioning="hive", filesystem=filesystem
+    )
+
+    expression = (ds.field("data_type") == data_type) & (
+        ds.field("bar_size") == bar_size
+    )
+    if before is not None:
+        expression &= ds.field("date") < pa.scalar(before, schema.field("date").type)
+
+    table = dataset.to_table(columns=schema.names, filter=expression)
+    table = table.take(pc.sort_indices(table, [("date", "descending")]))
+    if limit > 0:
+        table = table.slice(0, limit)
+
+    return [PriceBar(contract_id=contract_id, **row) for row in table.to_pylist()]
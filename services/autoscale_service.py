@@ -0,0 +1,104 @@
+from services import cache, ibapi_service
+from tasks.routing import CELERY_BROKER_TRANSPORT_OPTIONS
+from datetime import datetime, time
+from typing import Iterable
+import functools
+import redis
+import math
+import pytz
+import os
+
+# Seconds between two reads of the queues, the autoscaler itself polls every second
+AUTOSCALE_INTERVAL = float(os.getenv("AUTOSCALE_INTERVAL", 5))
+
+# Seconds within which the waiting tasks of a pool should be started
+AUTOSCALE_TARGET_LATENCY = float(os.getenv("AUTOSCALE_TARGET_LATENCY", 60))
+
+# Runtime assumed for a queue before any of its tasks completed
+AUTOSCALE_DEFAULT_RUNTIME = float(os.getenv("AUTOSCALE_DEFAULT_RUNTIME", 10))
+
+# Processes started ahead of the open, when every option chain is collected at once
+AUTOSCALE_OPEN_CONCURRENCY = int(os.getenv("AUTOSCALE_OPEN_CONCURRENCY", 0))
+OPEN_WARMUP_START = time(9, 25)
+OPEN_WARMUP_END = time(10, 0)
+
+RUNTIME_SAMPLES = 100  # Latest task runtimes kept per queue
+
+MARKET_TIMEZONE = pytz.timezone("America/New_York")
+
+
+@functools.lru_cache(maxsize=1)
+def get_broker():
+    return redis.Redis.from_url(os.getenv("CELERY_BROKER_URL"))
+
+
+def runtimes_key(queue: str) -> str:
+    return f"autoscale:runtimes:{queue}"
+
+
+def record_runtime(queue: str, seconds: float) -> None:
+    pipeline = cache.r.pipeline(transaction=False)
+    pipeline.lpush(runtimes_key(queue), seconds)
+    pipeline.ltrim(runtimes_key(queue), 0, RUNTIME_SAMPLES - 1)
+    pipeline.execute()
+
+
+def get_average_runtime(queues: Iterable[str]) -> float:
+    pipeline = cache.r.pipeline(transaction=False)
+    for queue in queues:
+        pipeline.lrange(runtimes_key(queue), 0, -1)
+    samples = [float(sample) for samples in pipeline.execute() for sample in samples]
+    return sum(samples) / len(samples) if samples else AUTOSCALE_DEFAULT_RUNTIME
+
+
+# Counts the messages waiting in queues, stored by the Redis transport in one list per priority
+def get_queue_depth(queues: Iterable[str]) -> int:
+    separator = CELERY_BROKER_TRANSPORT_OPTIONS["sep"]
+    pipeline = get_broker().pipeline(transaction=False)
+    for queue in queues:
+        for priority in CELERY_BROKER_TRANSPORT_OPTIONS["priority_steps"]:
+            pipeline.llen(f"{queue}{separator}{priority}" if priority else queue)
+    return sum(pipeline.execute())
+
+
+def is_open_warmup() -> bool:
+    now = datetime.now(MARKET_TIMEZONE)
+    return now.weekday() < 5 and OPEN_WARMUP_START <= now.time() < OPEN_WARMUP_END
+
+
+def get_desired_concurrency(
+    queues: Iterable[str],
+    reserved: int,
+    processes: int,
+    min_concurrency: int,
+    max_concurrency: int,
+) -> int:
+    """
+    Computes the processes a worker pool needs to start its waiting tasks within the target latency.
+
+    Args:
+        queues (Iterable[str]): The queues the pool consumes.
+        reserved (int): Tasks the pool is running or has prefetched.
+        processes (int): The pool's current number of processes.
+        min_concurrency (int): Lower bound, from the worker's --autoscale option.
+        max_concurrency (int): Upper bound, from the worker's --autoscale option.
+
+    Returns:
+        int: The number of processes to scale to.
+    """
+    queues = list(queues)
+    depth = get_queue_depth(queues)
+
+    # Each process works through target_latency / runtime waiting tasks in time
+    desired = reserved + math.ceil(
+        depth * get_average_runtime(queues) / AUTOSCALE_TARGET_LATENCY
+    )
+    if is_open_warmup():
+        desired = max(desired, AUTOSCALE_OPEN_CONCURRENCY)
+
+    # New processes would only wait for the next pacing window or for a client slot
+    if ibapi_service.get_pacing_remaining() <= 0:
+        desired = min(desired, processes)
+    desired = min(desired, processes + ibapi_service.get_free_client_slots())
+
+    return max(min_concurrency, min(desired, max_concurrency))
@@ -1,5 +1,6 @@
 import redis
 import os
+import uuid
 
 # Create a Redis connection
 r = redis.Redis(
@@ -28,3 +29,48 @@ def get(key, default_to_return=None):
     :return: The value associated with the key or None if the key doesn't exist.
     """
     return r.get(key) or default_to_return
+
+
+# Deletes a key only if it still holds the caller's token, so an expired lock
+# re-acquired by someone else is never released by mistake
+_RELEASE_SCRIPT = r.register_script(
+    """
+    if redis.call("get", KEYS[1]) == ARGV[1] then
+        return redis.call("del", KEYS[1])
+    end
+    return 0
+    """
+)
+
+
+def acquire_lock(key, ttl):
+    """
+    Try to acquire a lock stored in Redis without blocking.
+
+    :param key: The lock key.
+    :param ttl: Expiration time in seconds, releasing the lock if its holder dies.
+    :return: A token to pass to release_lock, or None if the lock is already held.
+    """
+    token = uuid.uuid4().hex
+    if r.set(key, token, nx=True, ex=ttl):
+        return token
+    return None
+
+
+def release_lock(key, token):
+    """
+    Release a lock previously acquired with acquire_lock.
+
+    :param key: The lock key.
+    :param token: The token returned by acquire_lock.
+    """
+    return _RELEASE_SCRIPT(keys=[key], args=[token])
+
+
+def delete(key):
+    """
+    Delete a key from the Redis cache.
+
+    :param key: The key to delete.
+    """
+    return r.delete(key)
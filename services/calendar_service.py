@@ -1,12 +1,26 @@
 import datetime
-import pandas_market_calendars as mcal
+import functools
+
+# Calendar of the sessions each contract type trades in, NYSE for the others
+CONTRACT_TYPE_CALENDARS = {
+    "Future": "CME_Equity",
+    "DatedFuture": "CME_Equity",
+    "Forex": "24/5",
+}
+DEFAULT_CALENDAR = "NYSE"
+
+
+def get_calendar_name(contract_type: str) -> str:
+    return CONTRACT_TYPE_CALENDARS.get(contract_type, DEFAULT_CALENDAR)
 
 
 def get_0dte_expiration_date():
     # Get the current date
     current_date = datetime.datetime.now().date()
 
-    # Get the NYSE calendar
+    # Get the NYSE calendar, importing the calendar stack only when needed
+    import pandas_market_calendars as mcal
+
     nyse = mcal.get_calendar("NYSE")
 
     # Get the valid trading days from today onwards
@@ -25,3 +39,34 @@ def get_0dte_expiration_date():
         raise ValueError("No valid expiration date found within the next year.")
 
     return expiration_date
+
+
+# Fetches the regular sessions of a calendar over the ten days up to a date, cached per date
+@functools.lru_cache(maxsize=16)
+def get_recent_sessions(
+    current_date: datetime.date, calendar_name: str = DEFAULT_CALENDAR
+):
+    import pandas_market_calendars as mcal
+
+    # Sessions of futures open the evening before their date, so tomorrow's may have started
+    calendar = mcal.get_calendar(calendar_name)
+    return calendar.schedule(
+        start_date=current_date - datetime.timedelta(days=10),
+        end_date=current_date + datetime.timedelta(days=1),
+    )
+
+
+# Returns the open and close of a calendar's latest regular session that has started, in UTC
+def get_latest_session(calendar_name: str = DEFAULT_CALENDAR):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    schedule = get_recent_sessions(now.date(), calendar_name)
+
+    started = schedule[schedule["market_open"] <= now]
+    if started.empty:
+        raise ValueError("No trading session found within the last ten days.")
+
+    session = started.iloc[-1]
+    return (
+        session["market_open"].to_pydatetime(),
+        session["market_close"].to_pydatetime(),
+    )
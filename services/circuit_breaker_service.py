@@ -0,0 +1,60 @@
+from services import cache
+import os
+import random
+import time
+
+# Consecutive failures opening a circuit
+FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 3))
+
+# Seconds before the first probe of an open circuit, doubled on each failed probe
+BASE_BACKOFF = float(os.getenv("CIRCUIT_BASE_BACKOFF", 5))
+MAX_BACKOFF = float(os.getenv("CIRCUIT_MAX_BACKOFF", 300))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of attempting a call through an open circuit."""
+
+
+def get_key(name: str) -> str:
+    return f"circuit:{name}"
+
+
+def get_state(name: str) -> dict:
+    state = cache.r.hgetall(get_key(name))
+    return {key.decode(): value.decode() for key, value in state.items()}
+
+
+def is_open(name: str) -> bool:
+    # Open circuits stay open until a probe succeeds, see record_success
+    return get_state(name).get("state") == "open"
+
+
+def is_probe_due(name: str) -> bool:
+    state = get_state(name)
+    return state.get("state") == "open" and float(state["open_until"]) <= time.time()
+
+
+def get_backoff(opens: int) -> float:
+    # Exponential backoff with jitter, so workers do not probe a restarted gateway in lockstep
+    backoff = min(BASE_BACKOFF * 2 ** (opens - 1), MAX_BACKOFF)
+    return random.uniform(backoff / 2, backoff)
+
+
+def record_failure(name: str) -> None:
+    key = get_key(name)
+    failures = cache.r.hincrby(key, "failures", 1)
+    state = get_state(name)
+
+    if state.get("state") == "open" or failures >= FAILURE_THRESHOLD:
+        opens = cache.r.hincrby(key, "opens", 1)
+        cache.r.hset(
+            key,
+            mapping={"state": "open", "open_until": time.time() + get_backoff(opens)},
+        )
+        print(f"Circuit {name} open after {failures} failures")
+
+
+def record_success(name: str) -> None:
+    if get_state(name).get("state") == "open":
+        print(f"Circuit {name} closed")
+    cache.r.delete(get_key(name))
@@ -1,31 +1,35 @@
-from ib_insync import (
-    IB,
-    Contract,
-    Option,
-    ContractDetails,
-    OptionChain,
-    ContFuture,
-    Forex,
-    Index,
-    Stock,
-)
 from sqlalchemy.orm import Session
-from datetime import date, datetime
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.sql import func
+from datetime import date, datetime, timedelta
 from models.models import (
     Option as dbOption,
     Forex as dbForex,
     Future as dbFuture,
     Stock as dbStock,
     Index as dbIndex,
+    OPTION_KEY_COLUMNS,
+    OPTION_KEY_WHERE,
 )
-from models.schemas import IBOptionWithID, Contract as schemasContract
-from typing import List, Optional
+from models.schemas import Contract as schemasContract
+from services import versions_service
+from typing import TYPE_CHECKING, List, NamedTuple, Optional
 from fastapi import HTTPException
 from pytz import timezone
 
+# ib_insync is imported by the functions building IB objects only, so that the API
+# process can use the database helpers without loading the IB client
+if TYPE_CHECKING:
+    from ib_insync import IB, Contract, ContractDetails, Option, OptionChain
+
+
+class IBOptionWithID(NamedTuple):
+    option: "Option"
+    db_id: Optional[int] = None
+
 
 # Fetches contract details for a given contract using Interactive Brokers API
-def get_contract_details(ib: IB, contract: Contract) -> List[ContractDetails]:
+def get_contract_details(ib: "IB", contract: "Contract") -> List["ContractDetails"]:
     contract_details = ib.reqContractDetails(contract)
 
     # Raise an error if no contract details are found
@@ -36,7 +40,7 @@ def get_contract_details(ib: IB, contract: Contract) -> List[ContractDetails]:
 
 
 # Fetches option chains (i.e., available options) for a given underlying asset
-def get_option_chains(ib: IB, underlying: Contract) -> List[OptionChain]:
+def get_option_chains(ib: "IB", underlying: "Contract") -> List["OptionChain"]:
     chains = ib.reqSecDefOptParams(
         underlying.symbol, "", underlying.secType, underlying.conId
     )
@@ -48,69 +52,96 @@ def get_option_chains(ib: IB, underlying: Contract) -> List[OptionChain]:
     return chains
 
 
-# Retrieves option contracts from the database based on the underlying asset's ID and expiration date
+# Retrieves option contracts from the database based on the underlying asset's ID and expiration dates
 def get_db_option_contracts(
     db: Session,
     underlying_id: int,
-    expiration_date: date,
+    expiration_dates: List[date],
 ) -> List[dbOption]:
     return (
         db.query(dbOption)
         .filter(
             dbOption.underlying_id == underlying_id,
-            dbOption.lastTradeDateOrContractMonth == expiration_date,
+            dbOption.lastTradeDateOrContractMonth.in_(expiration_dates),
         )
         .all()
     )
 
 
-# Fetches option contracts from IB for a given underlying asset, expiration date, and price range
-def get_ib_option_contracts(
-    ib: IB,
-    underlying: Contract,
-    expiration_date: date,
-    latest_price: float,
-    spread_around_spot: float,
-) -> List[Option]:
+# Fetches the SMART option chain of an underlying asset from IB
+def get_smart_option_chain(ib: "IB", underlying: "Contract") -> "OptionChain":
     # Get all option chains for the underlying asset
     chains = get_option_chains(ib, underlying)
 
     # Filter the option chains for the "SMART" exchange
-    chain = [chain for chain in chains if chain.exchange == "SMART"][0]
+    return [chain for chain in chains if chain.exchange == "SMART"][0]
+
+
+# Checks whether an expiration is the standard monthly one, i.e. the third Friday of its month
+# or the Thursday before it when that Friday is a holiday
+def is_monthly_expiration(expiration: str, expirations: List[str]) -> bool:
+    expiration_date = datetime.strptime(expiration, "%Y%m%d").date()
+    if expiration_date.weekday() == 4:
+        return 15 <= expiration_date.day <= 21
+
+    friday = expiration_date + timedelta(days=1)
+    return (
+        expiration_date.weekday() == 3
+        and 15 <= friday.day <= 21
+        and friday.strftime("%Y%m%d") not in expirations
+    )
+
+
+# Selects the next weekly expirations and the next monthly ones from a chain, nearest first
+def select_option_expirations(
+    expirations: List[str], today: str, weeklies: int, monthlies: int
+) -> List[str]:
+    upcoming = sorted(expiration for expiration in expirations if expiration >= today)
+    monthly = [
+        expiration
+        for expiration in upcoming
+        if is_monthly_expiration(expiration, upcoming)
+    ]
+    return sorted(set(upcoming[:weeklies]) | set(monthly[:monthlies]))
 
-    # Raise an error if the specified expiration date is not found in the chain
-    if expiration_date not in chain.expirations:
-        raise ValueError("Expiration date not found in chain.")
 
-    # Filter the strikes around the latest price to limit the range of options fetched
-    strikes_to_fetch = [
+# Filters the strikes around the latest price to limit the range of options fetched
+def get_strikes_around(
+    strikes: List[float], latest_price: float, spread_around_spot: float
+) -> List[float]:
+    return [
         strike
-        for strike in chain.strikes
+        for strike in strikes
         if strike > latest_price - spread_around_spot
         and strike < latest_price + spread_around_spot
     ]
 
-    # Create a list of option contracts for the filtered strikes and both call (C) and put (P) options
-    option_contracts = []
-    for strike in strikes_to_fetch:
-        for right in [
-            "C",
-            "P",
-        ]:  # Right "C" represents Call options, "P" represents Put options
-            contract = Option(
-                symbol=underlying.symbol,
-                lastTradeDateOrContractMonth=expiration_date,
-                strike=strike,
-                right=right,
-                exchange="SMART",
-            )
-            option_contracts.append(contract)
-
-    return option_contracts
+
+# Generates option contracts for every expiration, strike and both call (C) and put (P) options,
+# without any IB request
+def generate_option_contracts(
+    symbol: str, expiration_dates: List[str], strikes: List[float]
+) -> List["Option"]:
+    from ib_insync import Option
+
+    return [
+        Option(
+            symbol=symbol,
+            lastTradeDateOrContractMonth=expiration_date,
+            strike=strike,
+            right=right,
+            exchange="SMART",
+        )
+        for expiration_date in expiration_dates
+        for strike in strikes
+        for right in ["C", "P"]
+    ]
 
 
 # Converts a list of database option contracts to IB option contracts, preserving the database ID
 def db_to_ib_option_contracts(option_contracts: List[dbOption]) -> List[IBOptionWithID]:
+    from ib_insync import Option
+
     return [
         IBOptionWithID(
             option=Option(
@@ -131,50 +162,71 @@ def db_to_ib_option_contracts(option_contracts: List[dbOption]) -> List[IBOption
 
 # Saves option contracts to the database and converts them into a form usable by IB, returning the updated list
 def save_ib_contracts_to_db_and_convert(
-    option_contracts: List[Option],
+    option_contracts: List["Option"],
     underlying_id: int,
     db: Session = None,
-) -> List[dbOption]:
-    # Create database contract objects from the IB option contracts
-    db_contracts = [
-        dbOption(
-            symbol=contract.symbol,
-            contract_type="Option",
-            lastTradeDateOrContractMonth=contract.lastTradeDateOrContractMonth,
-            strike=contract.strike,
-            right=contract.right,
-            exchange=contract.exchange,
-            currency=contract.currency,
-            underlying_id=underlying_id,
-        )
-        for contract in option_contracts
-    ]
+) -> List[IBOptionWithID]:
+    if not option_contracts:
+        return []
 
-    # If a database session is provided, save the contracts to the database
+    db_ids = {}
+
+    # If a database session is provided, save all contracts with a single multi-row INSERT ... RETURNING
     if db:
-        db.add_all(db_contracts)
-        db.commit()
+        rows = [
+            {
+                "symbol": contract.symbol,
+                "contract_type": "Option",
+                "lastTradeDateOrContractMonth": datetime.strptime(
+                    contract.lastTradeDateOrContractMonth, "%Y%m%d"
+                ).date(),
+                "strike": contract.strike,
+                "right": contract.right,
+                "exchange": contract.exchange,
+                "currency": contract.currency,
+                "underlying_id": underlying_id,
+            }
+            for contract in option_contracts
+        ]
+
+        statement = pg_insert(dbOption.__table__).values(rows)
+
+        # Existing strikes are touched rather than skipped so that RETURNING yields their ids too
+        statement = statement.on_conflict_do_update(
+            index_elements=OPTION_KEY_COLUMNS,
+            index_where=OPTION_KEY_WHERE,
+            set_={"updated_at": func.now()},
+        ).returning(
+            dbOption.__table__.c.id,
+            dbOption.__table__.c.lastTradeDateOrContractMonth,
+            dbOption.__table__.c.strike,
+            dbOption.__table__.c.right,
+        )
 
-        # Refresh the contracts from the database to retrieve the latest state
-        for db_contract in db_contracts:
-            db.refresh(db_contract)
+        db_ids = {
+            (
+                row.lastTradeDateOrContractMonth.strftime("%Y%m%d"),
+                row.strike,
+                row.right,
+            ): row.id
+            for row in db.execute(statement).all()
+        }
+        db.commit()
+        versions_service.bump_version(versions_service.contracts_key("Option"))
 
-    # Convert the database contracts into IB contracts with their IDs for further use
+    # Convert the IB contracts into contracts with their IDs for further use
     return [
         IBOptionWithID(
-            option=Option(
-                symbol=contract.symbol,
-                lastTradeDateOrContractMonth=contract.lastTradeDateOrContractMonth.strftime(
-                    "%Y%m%d"
-                ),
-                strike=contract.strike,
-                right=contract.right,
-                exchange=contract.exchange,
-                currency=contract.currency,
+            option=contract,
+            db_id=db_ids.get(
+                (
+                    contract.lastTradeDateOrContractMonth,
+                    contract.strike,
+                    contract.right,
+                )
             ),
-            db_id=contract.id,  # Include the database ID for reference
         )
-        for contract in db_contracts
+        for contract in option_contracts
     ]
 
 
@@ -267,6 +319,8 @@ def create_ib_contract(
     strike: Optional[float] = None,
     right: Optional[str] = None,
 ):
+    from ib_insync import ContFuture, Forex, Future, Index, Option, Stock
+
     if contract_type == "Stock":
         return Stock(symbol, exchange, currency, conId=conId)
 
@@ -284,6 +338,15 @@ def create_ib_contract(
     if contract_type == "Future":
         return ContFuture(symbol, exchange)
 
+    if contract_type == "DatedFuture":
+        return Future(
+            symbol,
+            lastTradeDateOrContractMonth,
+            exchange,
+            currency=currency,
+            conId=conId,
+        )
+
     if contract_type == "Forex":
         return Forex(symbol)
 
@@ -291,3 +354,59 @@ def create_ib_contract(
         return Index(symbol, exchange)
 
     return None
+
+
+# Maps the router prefixes to the contract types stored in the database
+ROUTE_CONTRACT_TYPES = {
+    "stocks": "Stock",
+    "futures": "Future",
+    "indices": "Index",
+    "forex": "Forex",
+    "options": "Option",
+}
+
+
+# Resolves a contract from the route it is exposed under, raising a 404 if it does not exist
+def get_contract_by_route(
+    db: Session,
+    route: str,
+    symbol: str,
+    expiration_date: Optional[str] = None,
+    strike: Optional[float] = None,
+    right: Optional[str] = None,
+):
+    contract_type = ROUTE_CONTRACT_TYPES.get(route)
+    if contract_type is None:
+        raise HTTPException(status_code=400, detail="Invalid contract type")
+
+    if contract_type != "Option":
+        contract = get_contract_by_symbol(db, symbol, contract_type)
+        if contract is None:
+            raise HTTPException(status_code=404, detail=f"{contract_type} not found")
+        return contract
+
+    # Options are identified by their underlying stock and their contract key
+    if expiration_date is None or strike is None or right is None:
+        raise HTTPException(
+            status_code=400,
+            detail="expiration_date, strike and right are required for options",
+        )
+
+    stock = get_contract_by_symbol(db, symbol, "Stock")
+    if stock is None:
+        raise HTTPException(status_code=404, detail="Stock not found")
+
+    option = (
+        db.query(dbOption)
+        .filter(
+            dbOption.underlying_id == stock.id,
+            dbOption.lastTradeDateOrContractMonth == expiration_date,
+            dbOption.strike == strike,
+            dbOption.right == right,
+        )
+        .first()
+    )
+    if option is None:
+        raise HTTPException(status_code=404, detail="Option contract not found")
+
+    return option
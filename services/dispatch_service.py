@@ -0,0 +1,126 @@
+from services import cache
+from tasks.routing import (
+    CELERY_BROKER_TRANSPORT_OPTIONS,
+    CELERY_QUEUE_PRIORITIES,
+    CELERY_TASK_ROUTES,
+    DEFAULT_QUEUE,
+    OPTIONS_QUEUE,
+    UNDERLYINGS_QUEUE,
+)
+from typing import Dict, List, Optional, Sequence
+import functools
+import uuid
+import os
+
+PRICE_DATA_DEDUP_TTL = 10 * 60  # Seconds before a lost fetch task's dedup key expires
+OPTION_BATCH_SIZE = int(os.getenv("OPTION_BATCH_SIZE", 25))  # Contracts per fetch task
+
+
+# A producer-only Celery app: tasks are sent by name, so the API never imports the
+# task modules and their IB and market calendar dependencies
+@functools.lru_cache(maxsize=1)
+def get_client():
+    from celery import Celery
+    from kombu import Exchange, Queue
+
+    client = Celery("market_data", broker=os.getenv("CELERY_BROKER_URL"))
+    client.conf.update(
+        task_queues=tuple(
+            Queue(name, Exchange(name), routing_key=name)
+            for name in CELERY_QUEUE_PRIORITIES
+        ),
+        task_routes=CELERY_TASK_ROUTES,
+        broker_transport_options=CELERY_BROKER_TRANSPORT_OPTIONS,
+        task_default_queue=DEFAULT_QUEUE,
+    )
+    return client
+
+
+def send_task(
+    name: str,
+    args: Sequence = (),
+    queue: Optional[str] = None,
+    priority: Optional[int] = None,
+):
+    return get_client().send_task(name, args=args, queue=queue, priority=priority)
+
+
+def price_data_dedup_key(contract_db_id: str, bar_size: int) -> str:
+    return f"dedup:get_price_data:{contract_db_id}:{bar_size}"
+
+
+# Enqueue a price data task unless an identical one is still queued or running
+def enqueue_price_data(
+    contract_db_id: str,
+    contract_type: str,
+    symbol: str,
+    exchange: str,
+    currency: str,
+    bar_size: int = 5,
+    conId: Optional[int] = None,
+    lastTradeDateOrContractMonth: Optional[str] = None,
+    strike: Optional[float] = None,
+    right: Optional[str] = None,
+    last_bar_dates: Optional[Dict[str, str]] = None,
+) -> bool:
+    # The task releases the claim with its token, never a newer cycle's claim
+    dedup_token = cache.acquire_lock(
+        price_data_dedup_key(contract_db_id, bar_size), PRICE_DATA_DEDUP_TTL
+    )
+    if dedup_token is None:
+        print(f"Price data task for {symbol} ({contract_db_id}) already pending")
+        return False
+
+    # Option bars are time-sensitive and get their own high-priority pool
+    queue = OPTIONS_QUEUE if contract_type == "Option" else UNDERLYINGS_QUEUE
+
+    send_task(
+        "tasks.market_reader_tasks.get_price_data",
+        (
+            contract_db_id,
+            contract_type,
+            symbol,
+            exchange,
+            currency,
+            bar_size,
+            conId,
+            lastTradeDateOrContractMonth,
+            strike,
+            right,
+            last_bar_dates,
+            dedup_token,
+        ),
+        queue=queue,
+        priority=CELERY_QUEUE_PRIORITIES[queue],
+    )
+    return True
+
+
+# Enqueue option fetches in batches sharing one IB connection, skipping contracts still pending
+def enqueue_price_data_batches(
+    contracts: List[Dict], batch_size: int = OPTION_BATCH_SIZE
+) -> int:
+    # Claim the dedup keys of the whole chain in one round trip, each with its own token
+    pipeline = cache.r.pipeline(transaction=False)
+    for contract in contracts:
+        contract["dedup_token"] = uuid.uuid4().hex
+        pipeline.set(
+            price_data_dedup_key(contract["contract_db_id"], contract["bar_size"]),
+            contract["dedup_token"],
+            nx=True,
+            ex=PRICE_DATA_DEDUP_TTL,
+        )
+    pending = [
+        contract for contract, claimed in zip(contracts, pipeline.execute()) if claimed
+    ]
+
+    for start in range(0, len(pending), batch_size):
+        send_task(
+            "tasks.market_reader_tasks.get_price_data_batch",
+            (pending[start : start + batch_size],),
+            queue=OPTIONS_QUEUE,
+            priority=CELERY_QUEUE_PRIORITIES[OPTIONS_QUEUE],
+        )
+
+    print(f"Enqueued {len(pending)} of {len(contracts)} option contracts")
+    return len(pending)
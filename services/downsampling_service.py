@@ -0,0 +1,58 @@
+from typing import TYPE_CHECKING, List
+
+# NumPy and pandas are imported on first use, so that the API starts without them
+if TYPE_CHECKING:
+    import numpy as np
+
+
+# Selects the indices of at most max_points points keeping the visual shape of a series,
+# with the Largest-Triangle-Three-Buckets algorithm
+def lttb_indices(x: "np.ndarray", y: "np.ndarray", max_points: int) -> "np.ndarray":
+    import numpy as np
+
+    size = len(x)
+    if max_points >= size or max_points < 3:
+        return np.arange(size)
+
+    # The first and last points are always kept, the others are split into equal buckets
+    edges = np.linspace(1, size - 1, max_points - 1).astype(np.int64)
+    edges = np.append(edges, size)
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, size - 1
+
+    previous = 0
+    for bucket in range(max_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+
+        # Average of the next bucket, which is the last point for the last bucket
+        next_x = x[end : edges[bucket + 2]].mean()
+        next_y = y[end : edges[bucket + 2]].mean()
+
+        # Keep the point forming the largest triangle with the previous kept point and the average
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+
+    return selected
+
+
+# Downsamples bars to at most max_points of them, selected by their close over time
+def downsample_bars(bars: List, max_points: int) -> List:
+    if len(bars) <= max_points:
+        return bars
+
+    import numpy as np
+    import pandas as pd
+
+    # Naive dates are assumed to be UTC, as in schemas.PriceBar
+    x = (
+        pd.to_datetime(pd.Series([bar.date for bar in bars]), utc=True)
+        .astype("int64")
+        .to_numpy(dtype=np.float64)
+    )
+    y = np.array([bar.close for bar in bars], dtype=np.float64)
+    return [bars[index] for index in lttb_indices(x, y, max_points)]
@@ -0,0 +1,135 @@
+from models.models import BaseContract, PriceBar, SeriesState
+from services import calendar_service
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import pytz
+
+EXPIRATION_TIMEZONE = pytz.timezone("America/New_York")
+
+
+# Filters the contracts trading in each calendar's sessions, the others follow NYSE's
+def get_calendar_filters(contract_type: Optional[str] = None) -> Dict[str, object]:
+    if contract_type is not None:
+        return {
+            calendar_service.get_calendar_name(contract_type): (
+                BaseContract.contract_type == contract_type
+            )
+        }
+
+    calendar_contract_types = {}
+    for name, calendar in calendar_service.CONTRACT_TYPE_CALENDARS.items():
+        calendar_contract_types.setdefault(calendar, []).append(name)
+
+    filters = {
+        calendar: BaseContract.contract_type.in_(contract_types)
+        for calendar, contract_types in calendar_contract_types.items()
+    }
+    filters[calendar_service.DEFAULT_CALENDAR] = BaseContract.contract_type.not_in(
+        list(calendar_service.CONTRACT_TYPE_CALENDARS)
+    )
+    return filters
+
+
+# Reports the freshness and session coverage of every series, with two set-based queries
+# per trading calendar
+def get_series_freshness(
+    db: Session,
+    contract_type: Optional[str] = None,
+    stale_after: Optional[int] = None,
+) -> List[Dict]:
+    report = []
+    for calendar_name, contract_filter in get_calendar_filters(contract_type).items():
+        report += get_calendar_freshness(
+            db, calendar_name, contract_filter, stale_after
+        )
+
+    report.sort(
+        key=lambda series: (series["symbol"], series["data_type"], series["bar_size"])
+    )
+    return report
+
+
+# Reports the series of the contracts trading in one calendar's sessions
+def get_calendar_freshness(
+    db: Session,
+    calendar_name: str,
+    contract_filter,
+    stale_after: Optional[int] = None,
+) -> List[Dict]:
+    now = datetime.now(timezone.utc)
+    session_open, session_close = calendar_service.get_latest_session(calendar_name)
+    session_end = min(now, session_close)
+
+    # Count the bars of the current session per series, served by the BRIN index on date
+    session_counts = (
+        db.query(
+            PriceBar.contract_id,
+            PriceBar.data_type,
+            PriceBar.bar_size,
+            func.count().label("session_bars"),
+        )
+        .filter(PriceBar.date >= session_open, PriceBar.date < session_end)
+        .group_by(PriceBar.contract_id, PriceBar.data_type, PriceBar.bar_size)
+        .subquery()
+    )
+
+    # Expired options and dated futures never receive new bars
+    expiry = BaseContract.__table__.c.lastTradeDateOrContractMonth
+    today = datetime.now(EXPIRATION_TIMEZONE).date()
+
+    query = (
+        db.query(
+            SeriesState,
+            BaseContract.symbol,
+            BaseContract.contract_type,
+            func.coalesce(session_counts.c.session_bars, 0),
+        )
+        .join(BaseContract, BaseContract.id == SeriesState.contract_id)
+        .outerjoin(
+            session_counts,
+            (session_counts.c.contract_id == SeriesState.contract_id)
+            & (session_counts.c.data_type == SeriesState.data_type)
+            & (session_counts.c.bar_size == SeriesState.bar_size),
+        )
+        .filter(contract_filter, or_(expiry.is_(None), expiry >= today))
+    )
+
+    session_seconds = max((session_end - session_open).total_seconds(), 0)
+
+    report = []
+    for state, symbol, state_contract_type, session_bars in query:
+        bar_seconds = state.bar_size * 60
+
+        # Only bars that have fully closed within the session are expected
+        expected_bars = int(session_seconds // bar_seconds)
+
+        lag_seconds = None
+        if state.last_bar_date is not None:
+            last_bar_end = state.last_bar_date.timestamp() + bar_seconds
+            lag_seconds = max(session_end.timestamp() - last_bar_end, 0)
+
+        # Series that have never received a bar are always reported as stale
+        is_fresh = lag_seconds is not None and lag_seconds < (stale_after or 0)
+        if stale_after is not None and is_fresh:
+            continue
+
+        report.append(
+            {
+                "contract_id": state.contract_id,
+                "symbol": symbol,
+                "contract_type": state_contract_type,
+                "data_type": state.data_type,
+                "bar_size": state.bar_size,
+                "last_bar_date": state.last_bar_date,
+                "last_fetch_at": state.last_fetch_at,
+                "lag_seconds": lag_seconds,
+                "session_open": session_open,
+                "expected_bars": expected_bars,
+                "session_bars": session_bars,
+                "missing_bars": max(expected_bars - session_bars, 0),
+            }
+        )
+
+    return report
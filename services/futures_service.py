@@ -0,0 +1,358 @@
+from models.models import (
+    BaseContract,
+    DatedFuture,
+    Future,
+    FutureRoll,
+    PriceBar,
+    SeriesState,
+)
+from services import archive_service, cache, dispatch_service, series_state_service
+from fastapi import HTTPException
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, List
+import pytz
+import json
+import os
+
+# IB, NumPy and pandas are imported on first use, so that the API starts without them
+if TYPE_CHECKING:
+    from ib_insync import IB, Future as ib_future
+    import pandas as pd
+
+ADJUSTMENTS = ["none", "back", "ratio"]
+
+# Number of unexpired contracts collected per root, the front month and the next ones
+CONTRACTS_AHEAD = int(os.getenv("FUTURE_CONTRACTS_AHEAD", 2))
+
+# Calendar days before the front month's last trade date when the series rolls
+ROLL_DAYS_BEFORE_EXPIRY = int(os.getenv("FUTURE_ROLL_DAYS", 5))
+
+# Results only change when a new completed bar is ingested or a contract is added,
+# so the cache key includes both and the TTL merely bounds memory usage
+CONTINUOUS_CACHE_TIME = 24 * 3600
+
+EXPIRATION_TIMEZONE = pytz.timezone("America/New_York")
+
+
+# Retrieves the dated contracts of a root that have not expired yet, front month first
+def get_active_dated_futures(db: Session, future_id: int) -> List[DatedFuture]:
+    today = datetime.now(EXPIRATION_TIMEZONE).date()
+    return (
+        db.query(DatedFuture)
+        .filter(
+            DatedFuture.underlying_id == future_id,
+            DatedFuture.lastTradeDateOrContractMonth >= today,
+        )
+        .order_by(DatedFuture.lastTradeDateOrContractMonth)
+        .all()
+    )
+
+
+# Fetches the next listed expiries of a root from IB
+def get_ib_dated_futures(ib: "IB", future: Future) -> List["ib_future"]:
+    from ib_insync import Future as ib_future
+
+    contract_details = ib.reqContractDetails(
+        ib_future(future.symbol, exchange=future.exchange, currency=future.currency)
+    )
+    if not contract_details:
+        raise ValueError("Future contracts not found.")
+
+    today = datetime.now(EXPIRATION_TIMEZONE).strftime("%Y%m%d")
+    contracts = sorted(
+        (
+            details.contract
+            for details in contract_details
+            if details.contract.lastTradeDateOrContractMonth >= today
+        ),
+        key=lambda contract: contract.lastTradeDateOrContractMonth,
+    )
+    return contracts[:CONTRACTS_AHEAD]
+
+
+# Stores dated contracts in one statement and extends the root's roll schedule
+def save_dated_futures(
+    db: Session, future: Future, contracts: List["ib_future"]
+) -> None:
+    if not contracts:
+        return
+
+    rows = [
+        {
+            "symbol": future.symbol,
+            "contract_type": "DatedFuture",
+            "exchange": contract.exchange or future.exchange,
+            "currency": future.currency,
+            "conId": contract.conId,
+            "lastTradeDateOrContractMonth": datetime.strptime(
+                contract.lastTradeDateOrContractMonth[:8], "%Y%m%d"
+            ).date(),
+            "underlying_id": future.id,
+        }
+        for contract in contracts
+    ]
+    statement = (
+        pg_insert(BaseContract)
+        .values(rows)
+        .on_conflict_do_update(
+            index_elements=["conId"], set_={"updated_at": func.now()}
+        )
+    )
+    db.execute(statement)
+    update_roll_schedule(db, future.id)
+    db.commit()
+
+
+# Adds a roll for every new dated contract, a fixed number of days before the previous expiry
+def update_roll_schedule(db: Session, future_id: int) -> None:
+    dated_futures = (
+        db.query(DatedFuture)
+        .filter(DatedFuture.underlying_id == future_id)
+        .order_by(DatedFuture.lastTradeDateOrContractMonth)
+        .all()
+    )
+    rows = []
+    for index, dated_future in enumerate(dated_futures):
+        if index == 0:
+            roll_date = None
+        else:
+            previous_expiry = dated_futures[index - 1].lastTradeDateOrContractMonth
+            roll_date = EXPIRATION_TIMEZONE.localize(
+                datetime.combine(previous_expiry, datetime.min.time())
+            ) - timedelta(days=ROLL_DAYS_BEFORE_EXPIRY)
+        rows.append(
+            {
+                "future_id": future_id,
+                "contract_id": dated_future.id,
+                "roll_date": roll_date,
+            }
+        )
+
+    # Past rolls never move, so the stitched history stays stable
+    db.execute(
+        pg_insert(FutureRoll)
+        .values(rows)
+        .on_conflict_do_nothing(constraint="uq_future_rolls_future_contract")
+    )
+
+
+# Process the dated contracts of a future root, discovering new expiries only when needed
+def process_futures(db: Session, ib: "IB", future: Future) -> None:
+    dated_futures = get_active_dated_futures(db, future.id)
+
+    if len(dated_futures) < CONTRACTS_AHEAD:
+        save_dated_futures(db, future, get_ib_dated_futures(ib, future))
+        dated_futures = get_active_dated_futures(db, future.id)
+
+    # Load the ingestion watermarks of every contract in one query
+    series_states = series_state_service.get_series_states(
+        db, [dated_future.id for dated_future in dated_futures]
+    )
+
+    # Each contract's bars are fetched incrementally, instead of the whole ContFuture history
+    for dated_future in dated_futures:
+        dispatch_service.enqueue_price_data(
+            dated_future.id,
+            "DatedFuture",
+            dated_future.symbol,
+            dated_future.exchange,
+            dated_future.currency,
+            5,
+            dated_future.conId,
+            dated_future.lastTradeDateOrContractMonth.strftime("%Y%m%d"),
+            last_bar_dates=series_state_service.get_last_bar_dates(
+                series_states, dated_future.id, 5
+            ),
+        )
+
+
+# Loads the roll schedule of a root with the expiry of each contract, in roll order
+def get_rolls(db: Session, future_id: int) -> List[Dict]:
+    rows = (
+        db.query(
+            FutureRoll.contract_id,
+            FutureRoll.roll_date,
+            DatedFuture.conId,
+            DatedFuture.lastTradeDateOrContractMonth,
+        )
+        .join(DatedFuture, DatedFuture.id == FutureRoll.contract_id)
+        .filter(FutureRoll.future_id == future_id)
+        .order_by(DatedFuture.lastTradeDateOrContractMonth)
+        .all()
+    )
+    return [
+        {
+            "contract_id": row.contract_id,
+            "conId": row.conId,
+            "contract_month": row.lastTradeDateOrContractMonth.strftime("%Y%m%d"),
+            "roll_date": row.roll_date,
+        }
+        for row in rows
+    ]
+
+
+# Loads the bars of every contract of a root into one frame, including archived ones
+def load_contract_bars(
+    db: Session, contract_ids: List[int], data_type: str, bar_size: int
+) -> "pd.DataFrame":
+    rows = (
+        db.query(
+            PriceBar.contract_id,
+            PriceBar.date,
+            PriceBar.open,
+            PriceBar.high,
+            PriceBar.low,
+            PriceBar.close,
+            PriceBar.volume,
+        )
+        .filter(
+            PriceBar.contract_id.in_(contract_ids),
+            PriceBar.data_type == data_type,
+            PriceBar.bar_size == bar_size,
+        )
+        .all()
+    )
+
+    # Bars older than each contract's hot window are read from the Parquet archive
+    oldest_dates = {}
+    for row in rows:
+        oldest_dates[row.contract_id] = min(
+            row.date, oldest_dates.get(row.contract_id, row.date)
+        )
+    for contract_id in contract_ids:
+        if not archive_service.may_have_archived_bars(oldest_dates.get(contract_id)):
+            continue
+        rows += [
+            (contract_id, bar.date, bar.open, bar.high, bar.low, bar.close, bar.volume)
+            for bar in archive_service.get_archived_price_bars(
+                contract_id, data_type, bar_size, oldest_dates.get(contract_id), 0
+            )
+        ]
+
+    import pandas as pd
+
+    frame = pd.DataFrame(
+        rows, columns=["contract_id", "date", "open", "high", "low", "close", "volume"]
+    )
+    frame["date"] = pd.to_datetime(frame["date"], utc=True)
+    return frame.sort_values("date", kind="stable")
+
+
+# Stitches the contracts' bars along the roll schedule, adjusting the history before each roll
+def stitch_continuous_bars(
+    bars: "pd.DataFrame", rolls: List[Dict], adjustment: str
+) -> "pd.DataFrame":
+    import numpy as np
+    import pandas as pd
+
+    contract_ids = np.array([roll["contract_id"] for roll in rolls])
+    roll_dates = pd.to_datetime([roll["roll_date"] for roll in rolls[1:]], utc=True)
+
+    # Index of the front contract of every bar, as of the bar's date
+    dates = bars["date"].to_numpy(dtype="datetime64[ns]")
+    segment = np.searchsorted(
+        roll_dates.to_numpy(dtype="datetime64[ns]"), dates, side="right"
+    )
+    is_front = bars["contract_id"].to_numpy() == contract_ids[segment]
+
+    # Price gap of each roll, between the last closes both contracts share before it
+    closes = bars.pivot_table(index="date", columns="contract_id", values="close")
+    differences = np.zeros(len(roll_dates))
+    ratios = np.ones(len(roll_dates))
+    for index, roll_date in enumerate(roll_dates):
+        old, new = contract_ids[index], contract_ids[index + 1]
+        if adjustment == "none" or old not in closes or new not in closes:
+            continue
+
+        shared = closes.loc[closes.index < roll_date, [old, new]].dropna()
+        if shared.empty:
+            print(f"No shared bar before the roll to contract {new}, not adjusting it")
+            continue
+
+        old_close, new_close = shared.iloc[-1]
+        differences[index] = new_close - old_close
+        ratios[index] = new_close / old_close
+
+    # Every segment is shifted by the gaps of all the rolls after it
+    offsets = np.append(np.cumsum(differences[::-1])[::-1], 0.0)
+    factors = np.append(np.cumprod(ratios[::-1])[::-1], 1.0)
+
+    stitched = bars[is_front].copy()
+    front_segment = segment[is_front]
+    for column in ["open", "high", "low", "close"]:
+        if adjustment == "back":
+            stitched[column] = stitched[column] + offsets[front_segment]
+        elif adjustment == "ratio":
+            stitched[column] = stitched[column] * factors[front_segment]
+
+    contract_months = {roll["contract_id"]: roll["contract_month"] for roll in rolls}
+    stitched["contract_month"] = stitched["contract_id"].map(contract_months)
+    return stitched.drop(columns="contract_id")
+
+
+# Builds the response rows, oldest first
+def to_rows(stitched: "pd.DataFrame") -> List[Dict]:
+    stitched = stitched.copy()
+    stitched["date"] = (
+        stitched["date"]
+        .dt.tz_convert("America/New_York")
+        .map(lambda date: date.isoformat())
+    )
+    stitched["volume"] = stitched["volume"].astype(int)
+    return stitched.to_dict(orient="records")
+
+
+# Returns the continuous series of a root, served from the cache while no new bar has been ingested
+def get_continuous_bars(
+    db: Session,
+    future_id: int,
+    data_type: str,
+    bar_size: int,
+    adjustment: str,
+    order: str,
+    limit: int,
+) -> List[Dict]:
+    if adjustment not in ADJUSTMENTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid adjustment, expected any of {', '.join(ADJUSTMENTS)}",
+        )
+
+    rolls = get_rolls(db, future_id)
+    if not rolls:
+        return []
+    contract_ids = [roll["contract_id"] for roll in rolls]
+
+    last_bar_date = (
+        db.query(func.max(SeriesState.last_bar_date))
+        .filter(
+            SeriesState.contract_id.in_(contract_ids),
+            SeriesState.data_type == data_type,
+            SeriesState.bar_size == bar_size,
+        )
+        .scalar()
+    )
+    if last_bar_date is None:
+        return []
+
+    cache_key = (
+        f"continuous:{future_id}:{data_type}:{bar_size}:{adjustment}:"
+        f"{contract_ids[-1]}:{last_bar_date.isoformat()}"
+    )
+    cached = cache.get(cache_key)
+    if cached:
+        rows = json.loads(cached)
+    else:
+        bars = load_contract_bars(db, contract_ids, data_type, bar_size)
+        if bars.empty:
+            return []
+        rows = to_rows(stitch_continuous_bars(bars, rolls, adjustment))
+        cache.set(cache_key, json.dumps(rows), CONTINUOUS_CACHE_TIME)
+
+    # The whole series is cached, each request only slices it
+    if limit > 0:
+        rows = rows[-limit:]
+    return rows[::-1] if order == "desc" else rows
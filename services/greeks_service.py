@@ -0,0 +1,311 @@
+from models.models import Option, PriceBar
+from services import cache, contracts_service, series_state_service
+from fastapi import HTTPException
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import Dict, List
+import numpy as np
+import pandas as pd
+import pytz
+import json
+
+OPTION_PRICE_SOURCES = ["MID", "TRADES", "BID", "ASK"]
+
+MIN_VOLATILITY = 1e-4
+MAX_VOLATILITY = 5.0
+IV_ITERATIONS = 50
+IV_TOLERANCE = 1e-6
+
+# Results only change when a new completed bar is ingested, so the cache key
+# includes the last bar dates of the chain and its underlying, and the TTL merely bounds memory usage
+GREEKS_CACHE_TIME = 24 * 3600
+
+SECONDS_PER_YEAR = 365 * 24 * 3600
+
+# Options expire at the close of the regular session
+EXPIRATION_TIMEZONE = pytz.timezone("America/New_York")
+EXPIRATION_TIME = "16:00"
+
+
+def norm_pdf(x: np.ndarray) -> np.ndarray:
+    return np.exp(-0.5 * x * x) / np.sqrt(2 * np.pi)
+
+
+def norm_cdf(x: np.ndarray) -> np.ndarray:
+    # Abramowitz & Stegun 26.2.17, absolute error below 7.5e-8, avoids a SciPy dependency
+    t = 1 / (1 + 0.2316419 * np.abs(x))
+    polynomial = t * (
+        0.319381530
+        + t * (-0.356563782 + t * (1.781477937 + t * (-1.821255978 + t * 1.330274429)))
+    )
+    upper_tail = norm_pdf(x) * polynomial
+    return np.where(x >= 0, 1 - upper_tail, upper_tail)
+
+
+def d1_d2(spot, strike, time, rate, volatility):
+    sqrt_time = np.sqrt(time)
+    d1 = (np.log(spot / strike) + (rate + 0.5 * volatility**2) * time) / (
+        volatility * sqrt_time
+    )
+    return d1, d1 - volatility * sqrt_time
+
+
+# Black-Scholes prices for arrays of calls (is_call True) and puts
+def black_scholes_price(spot, strike, time, rate, volatility, is_call):
+    d1, d2 = d1_d2(spot, strike, time, rate, volatility)
+    discount = np.exp(-rate * time)
+    call = spot * norm_cdf(d1) - strike * discount * norm_cdf(d2)
+    put = strike * discount * norm_cdf(-d2) - spot * norm_cdf(-d1)
+    return np.where(is_call, call, put)
+
+
+# Solves implied volatility for every row at once with a safeguarded Newton method:
+# Newton steps that leave the bracket fall back to bisection, as in Brent-style solvers
+def implied_volatility(price, spot, strike, time, rate, is_call) -> np.ndarray:
+    low = np.full_like(price, MIN_VOLATILITY)
+    high = np.full_like(price, MAX_VOLATILITY)
+    volatility = np.full_like(price, 0.3)
+
+    # Prices outside the no-arbitrage bounds have no implied volatility
+    discount = np.exp(-rate * time)
+    intrinsic = np.where(
+        is_call,
+        np.maximum(spot - strike * discount, 0),
+        np.maximum(strike * discount - spot, 0),
+    )
+    upper_bound = np.where(is_call, spot, strike * discount)
+    solvable = (price > intrinsic) & (price < upper_bound) & (time > 0)
+
+    for _ in range(IV_ITERATIONS):
+        difference = (
+            black_scholes_price(spot, strike, time, rate, volatility, is_call) - price
+        )
+        if np.all(np.abs(difference[solvable]) < IV_TOLERANCE):
+            break
+
+        # Price is increasing in volatility, so the sign of the error tightens the bracket
+        high = np.where(difference > 0, volatility, high)
+        low = np.where(difference <= 0, volatility, low)
+
+        d1, _ = d1_d2(spot, strike, time, rate, volatility)
+        vega = spot * norm_pdf(d1) * np.sqrt(time)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            newton = volatility - difference / vega
+        in_bracket = np.isfinite(newton) & (newton > low) & (newton < high)
+        volatility = np.where(in_bracket, newton, (low + high) / 2)
+
+    return np.where(solvable, volatility, np.nan)
+
+
+# Computes the Greeks for every row at once, per unit of underlying
+def greeks(spot, strike, time, rate, volatility, is_call) -> Dict[str, np.ndarray]:
+    d1, d2 = d1_d2(spot, strike, time, rate, volatility)
+    sqrt_time = np.sqrt(time)
+    discount = np.exp(-rate * time)
+    pdf_d1 = norm_pdf(d1)
+
+    common_theta = -spot * pdf_d1 * volatility / (2 * sqrt_time)
+    call_theta = common_theta - rate * strike * discount * norm_cdf(d2)
+    put_theta = common_theta + rate * strike * discount * norm_cdf(-d2)
+
+    return {
+        "delta": np.where(is_call, norm_cdf(d1), norm_cdf(d1) - 1),
+        "gamma": pdf_d1 / (spot * volatility * sqrt_time),
+        "vega": spot * pdf_d1 * sqrt_time / 100,  # Per volatility point
+        "theta": np.where(is_call, call_theta, put_theta) / 365,  # Per calendar day
+        "rho": np.where(
+            is_call,
+            strike * time * discount * norm_cdf(d2),
+            -strike * time * discount * norm_cdf(-d2),
+        )
+        / 100,  # Per rate point
+    }
+
+
+# Loads the close of every bar of the chain, one row per contract and date
+def load_chain_prices(
+    db: Session,
+    underlying_id: int,
+    expiration_date: str,
+    price_source: str,
+    bar_size: int,
+) -> pd.DataFrame:
+    data_types = ["BID", "ASK"] if price_source == "MID" else [price_source]
+
+    rows = (
+        db.query(
+            PriceBar.date,
+            PriceBar.data_type,
+            PriceBar.close,
+            Option.strike,
+            Option.right,
+        )
+        .join(Option, Option.id == PriceBar.contract_id)
+        .filter(
+            Option.underlying_id == underlying_id,
+            Option.lastTradeDateOrContractMonth == expiration_date,
+            PriceBar.data_type.in_(data_types),
+            PriceBar.bar_size == bar_size,
+        )
+        .all()
+    )
+
+    frame = pd.DataFrame(
+        rows, columns=["date", "data_type", "close", "strike", "right"]
+    )
+    if frame.empty:
+        return frame
+
+    frame["date"] = pd.to_datetime(frame["date"], utc=True)
+
+    # Pivot BID/ASK side by side to average them in one operation
+    prices = frame.pivot_table(
+        index=["date", "strike", "right"], columns="data_type", values="close"
+    )
+    if price_source == "MID":
+        option_price = prices[["BID", "ASK"]].mean(axis=1, skipna=False)
+    else:
+        option_price = prices[price_source]
+
+    chain = option_price.rename("option_price").dropna().reset_index()
+
+    # Bars are stamped with their start, but their close is only known at their end
+    chain["close_time"] = chain["date"] + pd.Timedelta(minutes=bar_size)
+    return chain
+
+
+# Loads the underlying's TRADES closes of one bar size over the chain's dates, used as spot
+# for each option bar
+def load_underlying_prices(
+    db: Session, underlying_id: int, bar_size: int, start: datetime, end: datetime
+) -> pd.DataFrame:
+    rows = (
+        db.query(PriceBar.date, PriceBar.close)
+        .filter(
+            PriceBar.contract_id == underlying_id,
+            PriceBar.data_type == "TRADES",
+            PriceBar.bar_size == bar_size,
+            PriceBar.date >= start - timedelta(minutes=bar_size),
+            PriceBar.date <= end,
+        )
+        .all()
+    )
+
+    frame = pd.DataFrame(rows, columns=["date", "underlying_price"])
+    frame["close_time"] = pd.to_datetime(frame["date"], utc=True) + pd.Timedelta(
+        minutes=bar_size
+    )
+    return frame[["close_time", "underlying_price"]]
+
+
+# Computes IV and Greeks for every strike, right and date of a stored chain in one pass
+def compute_chain_greeks(
+    chain: pd.DataFrame,
+    underlying: pd.DataFrame,
+    expiration_date: str,
+    rate: float,
+) -> pd.DataFrame:
+    # Attach the latest underlying close known when each option bar closed,
+    # so coarser underlying bars never leak prices from the future
+    chain = pd.merge_asof(
+        chain.sort_values("close_time"),
+        underlying.sort_values("close_time"),
+        on="close_time",
+        direction="backward",
+    ).dropna(subset=["underlying_price"])
+
+    expiration = EXPIRATION_TIMEZONE.localize(
+        datetime.strptime(f"{expiration_date} {EXPIRATION_TIME}", "%Y%m%d %H:%M")
+    )
+    time = (pd.Timestamp(expiration) - chain["close_time"]).dt.total_seconds()
+    time = time.to_numpy()
+    time = np.maximum(time, 0) / SECONDS_PER_YEAR
+
+    spot = chain["underlying_price"].to_numpy(dtype=np.float64)
+    strike = chain["strike"].to_numpy(dtype=np.float64)
+    price = chain["option_price"].to_numpy(dtype=np.float64)
+    is_call = (chain["right"] == "C").to_numpy()
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        volatility = implied_volatility(price, spot, strike, time, rate, is_call)
+        computed = greeks(spot, strike, time, rate, volatility, is_call)
+
+    chain["time_to_expiry"] = time
+    chain["iv"] = volatility
+    for name, values in computed.items():
+        chain[name] = values
+
+    return chain.drop(columns="close_time").sort_values(["date", "strike", "right"])
+
+
+# Builds the response rows, replacing NaN values with None
+def to_rows(chain: pd.DataFrame) -> List[Dict]:
+    chain = chain.astype(object).where(chain.notna(), None)
+    chain["date"] = chain["date"].map(
+        lambda date: date.tz_convert("America/New_York").isoformat()
+    )
+    return chain.to_dict(orient="records")
+
+
+# Returns the IV and Greeks of a chain, served from the cache while no new bar has been ingested
+def get_chain_greeks(
+    db: Session,
+    symbol: str,
+    expiration_date: str,
+    price_source: str,
+    bar_size: int,
+    rate: float,
+) -> List[Dict]:
+    if price_source not in OPTION_PRICE_SOURCES:
+        raise HTTPException(status_code=400, detail="Invalid price source")
+
+    stock = contracts_service.get_contract_by_symbol(db, symbol, "Stock")
+    if stock is None:
+        raise HTTPException(status_code=404, detail="Stock not found")
+
+    last_bar_date = (
+        db.query(func.max(PriceBar.date))
+        .join(Option, Option.id == PriceBar.contract_id)
+        .filter(
+            Option.underlying_id == stock.id,
+            Option.lastTradeDateOrContractMonth == expiration_date,
+            PriceBar.bar_size == bar_size,
+        )
+        .scalar()
+    )
+    # Spot is read from the underlying's finest series, whose bars arrive separately
+    underlying_state = series_state_service.get_finest_series_state(
+        db, stock.id, "TRADES"
+    )
+    if last_bar_date is None or underlying_state is None:
+        return []
+
+    cache_key = (
+        f"greeks:{stock.id}:{expiration_date}:{price_source}:{bar_size}:{rate}:"
+        f"{last_bar_date.isoformat()}:{underlying_state.bar_size}:"
+        f"{underlying_state.last_bar_date.isoformat()}"
+    )
+    cached = cache.get(cache_key)
+    if cached:
+        return json.loads(cached)
+
+    chain = load_chain_prices(db, stock.id, expiration_date, price_source, bar_size)
+    if chain.empty:
+        return []
+
+    underlying = load_underlying_prices(
+        db,
+        stock.id,
+        underlying_state.bar_size,
+        chain["close_time"].min().to_pydatetime(),
+        chain["close_time"].max().to_pydatetime(),
+    )
+    if underlying.empty:
+        return []
+
+    rows = to_rows(compute_chain_greeks(chain, underlying, expiration_date, rate))
+
+    cache.set(cache_key, json.dumps(rows), GREEKS_CACHE_TIME)
+    return rows
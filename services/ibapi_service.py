@@ -1,60 +1,326 @@
-from ib_insync import IB
+from services import cache, circuit_breaker_service
+from services.circuit_breaker_service import CircuitOpenError
+from typing import TYPE_CHECKING, Dict, List, Optional
+import asyncio
+import bisect
+import hashlib
 import os
 import time
 import random
+import uuid
 from contextlib import contextmanager
 
+if TYPE_CHECKING:
+    from ib_insync import IB
+
+
+def parse_gateways() -> Dict[str, tuple]:
+    """
+    Parses the IB Gateways to shard collection across.
+
+    IB_GATEWAYS is a comma-separated list of host:port pairs. When it is not set, the single
+    IB_GATEWAY_IP/IB_GATEWAY_PORT gateway is used.
+
+    Returns:
+        Dict[str, tuple]: The (host, port) of each gateway, keyed by "host:port".
+    """
+    gateways = os.getenv("IB_GATEWAYS")
+    if not gateways:
+        gateways = (
+            f"{os.getenv('IB_GATEWAY_IP', 'host.docker.internal')}:"
+            f"{os.getenv('IB_GATEWAY_PORT', 4002)}"
+        )
+
+    parsed = {}
+    for gateway in gateways.split(","):
+        host, port = gateway.strip().rsplit(":", 1)
+        parsed[f"{host}:{port}"] = (host, int(port))
+    return parsed
+
+
+def parse_contract_type_gateways() -> Dict[str, List[str]]:
+    """
+    Parses the optional pinning of contract types to a subset of gateways.
+
+    IB_GATEWAY_CONTRACT_TYPES looks like "Option=gw-2:4004|gw-3:4004;Future=gw-1:4004".
+    Contract types that are not listed are spread across all gateways.
+    """
+    pinned = {}
+    for entry in filter(None, os.getenv("IB_GATEWAY_CONTRACT_TYPES", "").split(";")):
+        contract_type, gateways = entry.split("=", 1)
+        pinned[contract_type.strip()] = [
+            gateway.strip() for gateway in gateways.split("|") if gateway.strip()
+        ]
+    return pinned
+
+
+GATEWAYS = parse_gateways()
+CONTRACT_TYPE_GATEWAYS = parse_contract_type_gateways()
+
+# IB accepts 32 API clients per gateway
+GATEWAY_MAX_CLIENTS = int(os.getenv("IB_GATEWAY_MAX_CLIENTS", 32))
+
+# Seconds a client slot is held without activity, freeing the slots of killed workers
+GATEWAY_LEASE_TTL = int(os.getenv("IB_GATEWAY_LEASE_TTL", 300))
+
+# Error sent by IB when another API client is connected with the same clientId
+CLIENT_ID_IN_USE_ERROR = 326
+
+# IB allows 60 historical data requests per 10 minutes per gateway session
+PACING_LIMIT = int(os.getenv("IB_PACING_LIMIT", 60))
+PACING_WINDOW = int(os.getenv("IB_PACING_WINDOW", 600))
+
+# Virtual nodes per gateway on the hash ring, smoothing the distribution of contracts
+HASH_RING_REPLICAS = 64
+
+
+def hash_value(value: str) -> int:
+    return int(hashlib.md5(value.encode()).hexdigest()[:16], 16)
+
+
+def get_gateway_candidates(
+    routing_key: Optional[str] = None, contract_type: Optional[str] = None
+) -> List[str]:
+    """
+    Orders the gateways to try for a contract by consistent hashing.
+
+    The first gateway is the contract's owner, the next ones are its failover order, so
+    adding or removing a gateway only moves the contracts it owns.
+
+    Args:
+        routing_key (str, optional): Usually the contract's database ID. Random if not provided.
+        contract_type (str, optional): Restricts the candidates to the gateways pinned to it.
+
+    Returns:
+        List[str]: The gateway names, in the order they should be tried.
+    """
+    gateways = CONTRACT_TYPE_GATEWAYS.get(contract_type) or list(GATEWAYS)
+    if routing_key is None:
+        return random.sample(gateways, len(gateways))
+
+    ring = sorted(
+        (hash_value(f"{gateway}#{replica}"), gateway)
+        for gateway in gateways
+        for replica in range(HASH_RING_REPLICAS)
+    )
+    start = bisect.bisect(ring, (hash_value(str(routing_key)),))
+
+    candidates = []
+    for index in range(len(ring)):
+        gateway = ring[(start + index) % len(ring)][1]
+        if gateway not in candidates:
+            candidates.append(gateway)
+    return candidates
+
+
+def clients_key(gateway: str) -> str:
+    return f"gateway_clients:{gateway}"
+
+
+def acquire_client_slot(gateway: str) -> Optional[str]:
+    # Each API client connected to a gateway holds a lease scored by its expiry,
+    # expired leases are pruned before counting the clients across all workers
+    key = clients_key(gateway)
+    lease = uuid.uuid4().hex
+    now = time.time()
+
+    pipeline = cache.r.pipeline()
+    pipeline.zremrangebyscore(key, "-inf", now)
+    pipeline.zadd(key, {lease: now + GATEWAY_LEASE_TTL})
+    pipeline.zcard(key)
+    pipeline.expire(key, GATEWAY_LEASE_TTL)
+    _, _, used, _ = pipeline.execute()
+
+    if used > GATEWAY_MAX_CLIENTS:
+        cache.r.zrem(key, lease)
+        return None
+    return lease
+
+
+def refresh_client_slot(gateway: str, lease: str) -> None:
+    # Extends the lease of a connected client, restoring it if it was pruned meanwhile
+    pipeline = cache.r.pipeline()
+    pipeline.zadd(clients_key(gateway), {lease: time.time() + GATEWAY_LEASE_TTL})
+    pipeline.expire(clients_key(gateway), GATEWAY_LEASE_TTL)
+    pipeline.execute()
+
+
+def release_client_slot(gateway: str, lease: str) -> None:
+    cache.r.zrem(clients_key(gateway), lease)
+
+
+def consume_pacing(ib: "IB") -> bool:
+    """
+    Consumes one historical data request from the pacing budget of the IB instance's gateway.
+
+    Args:
+        ib (IB): An instance connected through connect_to_ib.
+
+    Returns:
+        bool: False if the gateway's budget for the current window is exhausted.
+    """
+    gateway = getattr(ib, "gateway", None)
+    if gateway is None:
+        return True
+
+    key = f"pacing:{gateway}:{int(time.time() // PACING_WINDOW)}"
+    pipeline = cache.r.pipeline()
+    pipeline.incr(key)
+    pipeline.expire(key, PACING_WINDOW)
+    used, _ = pipeline.execute()
+    return used <= PACING_LIMIT
+
+
+def get_pacing_remaining() -> int:
+    # Historical data requests left across all gateways in the current pacing window
+    window = int(time.time() // PACING_WINDOW)
+    used = cache.r.mget([f"pacing:{gateway}:{window}" for gateway in GATEWAYS])
+    return sum(max(PACING_LIMIT - int(count or 0), 0) for count in used)
+
+
+def get_free_client_slots() -> int:
+    # API clients that can still connect across all gateways, after pruning expired leases
+    pipeline = cache.r.pipeline()
+    for gateway in GATEWAYS:
+        pipeline.zremrangebyscore(clients_key(gateway), "-inf", time.time())
+        pipeline.zcard(clients_key(gateway))
+    used = pipeline.execute()[1::2]
+    return sum(max(GATEWAY_MAX_CLIENTS - count, 0) for count in used)
+
 
 @contextmanager
-def connect_to_ib(clientId: int = None):
+def connect_to_ib(
+    clientId: int = None,
+    routing_key: Optional[str] = None,
+    contract_type: Optional[str] = None,
+):
     """
     A context manager to handle connection to Interactive Brokers (IB) Gateway.
 
     Args:
         clientId (int, optional): A unique client ID for the IB connection. If not provided, a random ID is used.
+        routing_key (str, optional): Key assigning the connection to a gateway, usually the contract's database ID.
+        contract_type (str, optional): Contract type, for gateways pinned to some contract types.
 
     Yields:
         ib: The connected IB instance for use within the context.
     """
+    from ib_insync import IB  # Deferred, the API process imports this module without IB
+
     ib = IB()  # Create an IB instance
     connected = False  # Track connection status
     max_retries = 5  # Maximum number of retries
     retry_count = 0  # Track how many attempts have been made
+    gateway = None
+    lease = None
 
     # If no clientId is provided, generate a random clientId
     if not clientId:
         clientId = random.randint(1, 32767)
 
-    # Retry logic for connecting to IB Gateway
-    while not connected and retry_count < max_retries:
+    # Gateways with an open circuit are skipped until the health probe closes it
+    candidates = [
+        gateway
+        for gateway in get_gateway_candidates(routing_key, contract_type)
+        if not circuit_breaker_service.is_open(gateway)
+    ]
+    if not candidates:
+        raise CircuitOpenError("All IB gateways are unavailable.")
+
+    # IB reports a clientId already in use with error 326 before closing the socket
+    error_codes = []
+
+    def record_error(reqId, errorCode, *args):
+        error_codes.append(errorCode)
+
+    ib.errorEvent += record_error
+
+    # Retry logic for connecting to IB Gateway, failing over along the candidates
+    while not connected and retry_count < max_retries and candidates:
+        gateway = candidates[0]
+        retry_count += 1  # Increase the retry count
+
+        lease = acquire_client_slot(gateway)
+        if lease is None:
+            print(f"Gateway {gateway} has no client slot left, trying the next one")
+            candidates.append(candidates.pop(0))
+            continue
+
+        error_codes.clear()
         try:
-            # Attempt to connect to IB Gateway using environment variables or default values
-            ib.connect(
-                os.getenv(
-                    "IB_GATEWAY_IP", "host.docker.internal"
-                ),  # Get the gateway IP or default to localhost
-                os.getenv(
-                    "IB_GATEWAY_PORT", 4002
-                ),  # Get the gateway port or default to 4002
-                clientId=clientId,  # Use the provided or generated clientId
-            )
+            host, port = GATEWAYS[gateway]
+            ib.connect(host, port, clientId=clientId)
+            ib.gateway = gateway  # Used to account the pacing budget per gateway
             connected = True  # Mark as connected
-            print(f"Connected with clientId {clientId}")
+            circuit_breaker_service.record_success(gateway)
+            print(f"Connected to {gateway} with clientId {clientId}")
         except Exception as e:
-            # If the connection fails, increment the clientId and retry
-            print(f"ClientId {clientId} failed. Retrying with new clientId...")
-            clientId += 1  # Increment the clientId to avoid duplication issues
-            retry_count += 1  # Increase the retry count
-            time.sleep(1)  # Wait before retrying
+            release_client_slot(gateway, lease)
+            if CLIENT_ID_IN_USE_ERROR in error_codes:
+                # Retry the same gateway at once with the next clientId
+                print(f"ClientId {clientId} is in use on {gateway}, retrying")
+                clientId += 1
+            elif isinstance(e, (OSError, asyncio.TimeoutError)):
+                # The gateway is down or hanging (e.g. nightly restart), fail over
+                print(f"Gateway {gateway} is unreachable ({e!r}), trying the next one")
+                circuit_breaker_service.record_failure(gateway)
+                candidates.remove(gateway)
+            else:
+                ib.errorEvent -= record_error
+                raise
+
+    ib.errorEvent -= record_error
 
     # If connection fails after all retries, raise an exception
+    if not connected and not candidates:
+        raise CircuitOpenError("All IB gateways are unreachable.")
     if not connected:
         raise Exception("Failed to connect after multiple attempts.")
 
+    # Any message from the gateway shows the client is alive, extend its lease at most
+    # every third of the TTL
+    refreshed_at = time.monotonic()
+
+    def refresh_lease():
+        nonlocal refreshed_at
+        if time.monotonic() - refreshed_at > GATEWAY_LEASE_TTL / 3:
+            refreshed_at = time.monotonic()
+            refresh_client_slot(gateway, lease)
+
+    ib.updateEvent += refresh_lease
+
     try:
         yield ib  # Provide the connected IB instance for use within the context block
     finally:
         # Ensure the IB connection is properly closed at the end of the context
         if connected:
-            print(f"Disconnecting clientId {clientId}")
+            print(f"Disconnecting clientId {clientId} from {gateway}")
+            ib.updateEvent -= refresh_lease
             ib.disconnect()  # Disconnect IB instance
+            release_client_slot(gateway, lease)
+
+
+def probe_gateway(gateway: str, timeout: float = 5) -> bool:
+    """
+    Checks that a gateway accepts API connections, closing its circuit if it does.
+
+    Args:
+        gateway (str): The gateway name, as in IB_GATEWAYS.
+        timeout (float): Seconds to wait for the API handshake.
+
+    Returns:
+        bool: Whether the gateway is reachable.
+    """
+    from ib_insync import IB
+
+    ib = IB()
+    host, port = GATEWAYS[gateway]
+    try:
+        ib.connect(host, port, clientId=random.randint(1, 32767), timeout=timeout)
+    except Exception:
+        circuit_breaker_service.record_failure(gateway)
+        return False
+
+    ib.disconnect()
+    circuit_breaker_service.record_success(gateway)
+    return True
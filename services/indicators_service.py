@@ -0,0 +1,260 @@
+from models.models import PriceBar
+from services import cache
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+import json
+
+INDICATORS = [
+    "returns",
+    "log_returns",
+    "sma",
+    "ema",
+    "volatility",
+    "atr",
+    "vwap",
+    "rsi",
+]
+
+# Results only change when a new completed bar is ingested, so the cache key
+# includes the last bar date and the TTL merely bounds memory usage
+INDICATORS_CACHE_TIME = 24 * 3600
+
+
+# Loads a series' bars once into column arrays, oldest first. Only the hot window is read,
+# archived bars are not
+def load_bar_arrays(
+    db: Session, contract_id: int, data_type: str, bar_size: int, limit: int
+) -> Dict[str, np.ndarray]:
+    query = (
+        db.query(
+            PriceBar.date,
+            PriceBar.open,
+            PriceBar.high,
+            PriceBar.low,
+            PriceBar.close,
+            PriceBar.volume,
+        )
+        .filter(
+            PriceBar.contract_id == contract_id,
+            PriceBar.data_type == data_type,
+            PriceBar.bar_size == bar_size,
+        )
+        .order_by(PriceBar.date.desc())
+    )
+    if limit > 0:
+        query = query.limit(limit)
+
+    # Rows come back newest first, reverse them to compute indicators forward in time
+    rows = query.all()[::-1]
+
+    columns = list(zip(*rows)) if rows else [[]] * 6
+    return {
+        "date": pd.to_datetime(list(columns[0]), utc=True),
+        "open": np.asarray(columns[1], dtype=np.float64),
+        "high": np.asarray(columns[2], dtype=np.float64),
+        "low": np.asarray(columns[3], dtype=np.float64),
+        "close": np.asarray(columns[4], dtype=np.float64),
+        "volume": np.asarray(columns[5], dtype=np.float64),
+    }
+
+
+def returns(close: np.ndarray) -> np.ndarray:
+    result = np.full_like(close, np.nan)
+    result[1:] = close[1:] / close[:-1] - 1
+    return result
+
+
+def log_returns(close: np.ndarray) -> np.ndarray:
+    result = np.full_like(close, np.nan)
+    result[1:] = np.diff(np.log(close))
+    return result
+
+
+def sma(values: np.ndarray, window: int) -> np.ndarray:
+    result = np.full_like(values, np.nan)
+    if len(values) < window:
+        return result
+
+    cumsum = np.cumsum(np.insert(values, 0, 0.0))
+    result[window - 1 :] = (cumsum[window:] - cumsum[:-window]) / window
+    return result
+
+
+def ema(values: np.ndarray, window: int) -> np.ndarray:
+    return pd.Series(values).ewm(span=window, adjust=False).mean().to_numpy()
+
+
+def volatility(close: np.ndarray, window: int) -> np.ndarray:
+    # Rolling standard deviation of log returns, not annualized
+    log_ret = log_returns(close)
+    result = np.full_like(close, np.nan)
+    if len(close) <= window:
+        return result
+
+    windows = np.lib.stride_tricks.sliding_window_view(log_ret[1:], window)
+    result[window:] = windows.std(axis=1, ddof=1)
+    return result
+
+
+def atr(
+    high: np.ndarray, low: np.ndarray, close: np.ndarray, window: int
+) -> np.ndarray:
+    previous_close = np.roll(close, 1)
+    previous_close[0] = np.nan
+
+    true_range = np.fmax(
+        high - low,
+        np.fmax(np.abs(high - previous_close), np.abs(low - previous_close)),
+    )
+
+    # Wilder's smoothing
+    return pd.Series(true_range).ewm(alpha=1 / window, adjust=False).mean().to_numpy()
+
+
+def vwap(
+    dates: pd.DatetimeIndex,
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    volume: np.ndarray,
+) -> np.ndarray:
+    # Session VWAP, reset at each New York trading day
+    volume = np.clip(volume, 0, None)
+    frame = pd.DataFrame(
+        {
+            "session": dates.tz_convert("America/New_York").date,
+            "price_volume": (high + low + close) / 3 * volume,
+            "volume": volume,
+        }
+    )
+    cumulative = frame.groupby("session")[["price_volume", "volume"]].cumsum()
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = cumulative["price_volume"].to_numpy() / cumulative["volume"].to_numpy()
+    return np.where(np.isfinite(result), result, np.nan)
+
+
+def rsi(close: np.ndarray, window: int) -> np.ndarray:
+    delta = np.diff(close, prepend=np.nan)
+    gains = pd.Series(np.clip(delta, 0, None))
+    losses = pd.Series(np.clip(-delta, 0, None))
+
+    # Wilder's smoothing of average gains and losses
+    average_gain = gains.ewm(alpha=1 / window, adjust=False).mean().to_numpy()
+    average_loss = losses.ewm(alpha=1 / window, adjust=False).mean().to_numpy()
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = 100 - 100 / (1 + average_gain / average_loss)
+    result[(average_loss == 0) & (average_gain > 0)] = 100.0
+    return result
+
+
+# Computes the requested indicators over the whole series in one vectorized pass
+def compute_indicators(
+    bars: Dict[str, np.ndarray], indicators: List[str], window: int
+) -> Dict[str, np.ndarray]:
+    close = bars["close"]
+    computed = {}
+
+    for indicator in indicators:
+        if indicator == "returns":
+            computed[indicator] = returns(close)
+        elif indicator == "log_returns":
+            computed[indicator] = log_returns(close)
+        elif indicator == "sma":
+            computed[indicator] = sma(close, window)
+        elif indicator == "ema":
+            computed[indicator] = ema(close, window)
+        elif indicator == "volatility":
+            computed[indicator] = volatility(close, window)
+        elif indicator == "atr":
+            computed[indicator] = atr(bars["high"], bars["low"], close, window)
+        elif indicator == "vwap":
+            computed[indicator] = vwap(
+                bars["date"], bars["high"], bars["low"], close, bars["volume"]
+            )
+        elif indicator == "rsi":
+            computed[indicator] = rsi(close, window)
+
+    return computed
+
+
+# Builds the response rows, replacing NaN warm-up values with None
+def to_rows(
+    bars: Dict[str, np.ndarray],
+    computed: Dict[str, np.ndarray],
+    include_bars: bool,
+) -> List[Dict]:
+    columns = dict(computed)
+    if include_bars:
+        for column in ["open", "high", "low", "close", "volume"]:
+            columns[column] = bars[column]
+
+    frame = pd.DataFrame(columns)
+    frame = frame.astype(object).where(frame.notna(), None)
+    frame.insert(
+        0,
+        "date",
+        bars["date"].tz_convert("America/New_York").map(lambda date: date.isoformat()),
+    )
+    return frame.to_dict(orient="records")
+
+
+def parse_indicators(indicators: str) -> List[str]:
+    # Strip before dropping empty entries, so "rsi, " is valid
+    requested = [
+        name for name in (part.strip() for part in indicators.split(",")) if name
+    ]
+    invalid = [indicator for indicator in requested if indicator not in INDICATORS]
+    if invalid or not requested:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid indicators, expected any of {', '.join(INDICATORS)}",
+        )
+    return requested
+
+
+# Returns the indicators of a series, served from the cache while no new bar has been ingested
+def get_indicators(
+    db: Session,
+    contract_id: int,
+    data_type: str,
+    bar_size: int,
+    indicators: List[str],
+    window: int,
+    limit: int,
+    include_bars: bool,
+) -> List[Dict]:
+    if window < 1:
+        raise HTTPException(status_code=400, detail="Window must be positive")
+
+    last_bar_date: Optional[tuple] = (
+        db.query(PriceBar.date)
+        .filter(
+            PriceBar.contract_id == contract_id,
+            PriceBar.data_type == data_type,
+            PriceBar.bar_size == bar_size,
+        )
+        .order_by(PriceBar.date.desc())
+        .first()
+    )
+    if last_bar_date is None:
+        return []
+
+    cache_key = (
+        f"indicators:{contract_id}:{data_type}:{bar_size}:"
+        f"{last_bar_date[0].isoformat()}:{','.join(indicators)}:"
+        f"{window}:{limit}:{int(include_bars)}"
+    )
+    cached = cache.get(cache_key)
+    if cached:
+        return json.loads(cached)
+
+    bars = load_bar_arrays(db, contract_id, data_type, bar_size, limit)
+    rows = to_rows(bars, compute_indicators(bars, indicators, window), include_bars)
+
+    cache.set(cache_key, json.dumps(rows), INDICATORS_CACHE_TIME)
+    return rows
@@ -0,0 +1,243 @@
+from models.models import BaseContract
+from models.schemas import ContractImportRow
+from services import cache, contracts_service, versions_service
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from collections import Counter
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Optional
+import asyncio
+import pytz
+import json
+import uuid
+import csv
+import io
+import os
+
+if TYPE_CHECKING:
+    from ib_insync import IB
+
+# Rows accepted per import, bounding the size of the job kept in Redis
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", 5000))
+
+# Contract details requests in flight on the shared connection, IB accepts 50 messages per second
+IMPORT_CONCURRENCY = int(os.getenv("IMPORT_CONCURRENCY", 20))
+
+# Seconds to wait for the details of one contract
+IMPORT_REQUEST_TIMEOUT = float(os.getenv("IMPORT_REQUEST_TIMEOUT", 10))
+
+IMPORT_JOB_TTL = 24 * 3600  # Seconds a finished job can still be looked up
+
+
+def job_key(job_id: str) -> str:
+    return f"import:{job_id}"
+
+
+# Identifies a contract across imports, as check_contract_exist without to_trade
+def contract_key(row: Dict) -> tuple:
+    return (row["contract_type"], row["symbol"], row["exchange"], row["currency"])
+
+
+# Reads the rows of a CSV file with a header, or of a JSON list (optionally under "contracts")
+def read_records(body: bytes, content_type: str) -> List[Dict]:
+    if content_type.startswith("text/csv"):
+        try:
+            reader = csv.DictReader(io.StringIO(body.decode("utf-8-sig")))
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="Invalid CSV, expected UTF-8")
+        # Empty cells fall back to the defaults of the contract schema
+        records = [
+            {
+                key.strip(): value.strip()
+                for key, value in record.items()
+                if key and value
+            }
+            for record in reader
+        ]
+    else:
+        try:
+            records = json.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid JSON body")
+        if isinstance(records, dict):
+            records = records.get("contracts")
+        if not isinstance(records, list):
+            raise HTTPException(status_code=400, detail="Expected a list of contracts")
+
+    if not records:
+        raise HTTPException(status_code=400, detail="No contracts to import")
+    if len(records) > IMPORT_MAX_ROWS:
+        raise HTTPException(
+            status_code=413, detail=f"Too many contracts, at most {IMPORT_MAX_ROWS}"
+        )
+    return records
+
+
+# Validates each record on its own, so that one bad row does not reject the whole import
+def parse_rows(records: List[Dict]) -> List[Dict]:
+    rows = []
+    seen = set()
+    for index, record in enumerate(records, start=1):
+        try:
+            contract = ContractImportRow.model_validate(record)
+        except ValidationError as e:
+            detail = "; ".join(
+                f"{'.'.join(map(str, error['loc']))}: {error['msg']}"
+                for error in e.errors()
+            )
+            rows.append({"row": index, "status": "invalid", "detail": detail})
+            continue
+
+        row = {"row": index, "status": "pending", **contract.model_dump(exclude={"id"})}
+        if contract_key(row) in seen:
+            row.update(status="duplicate", detail="Contract listed more than once")
+        seen.add(contract_key(row))
+        rows.append(row)
+    return rows
+
+
+def save_job(job: Dict) -> None:
+    cache.set(job_key(job["job_id"]), json.dumps(job), IMPORT_JOB_TTL)
+
+
+def load_job(job_id: str) -> Optional[Dict]:
+    job = cache.get(job_key(job_id))
+    return json.loads(job) if job else None
+
+
+def update_job(job: Dict, status: str) -> None:
+    job["status"] = status
+    if status in ("done", "failed"):
+        job["finished_at"] = datetime.now(pytz.utc).isoformat()
+    save_job(job)
+
+
+# Creates an import job from a request body, finished at once if no row is valid
+def create_job(body: bytes, content_type: str) -> Dict:
+    rows = parse_rows(read_records(body, content_type))
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "status": "pending",
+        "created_at": datetime.now(pytz.utc).isoformat(),
+        "finished_at": None,
+        "rows": rows,
+    }
+    if any(row["status"] == "pending" for row in rows):
+        save_job(job)
+    else:
+        update_job(job, "done")
+    return job
+
+
+# Returns a job with the number of rows in each status, raising a 404 if it is unknown or expired
+def get_job(job_id: str) -> Dict:
+    job = load_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    job["counts"] = dict(Counter(row["status"] for row in job["rows"]))
+    return job
+
+
+# Marks the rows whose contract is already stored, before any IB request
+def mark_existing(db: Session, rows: List[Dict]) -> None:
+    pending = [row for row in rows if row["status"] == "pending"]
+    if not pending:
+        return
+
+    existing = {
+        contract_key(contract._asdict()): contract.id
+        for contract in db.query(
+            BaseContract.id,
+            BaseContract.contract_type,
+            BaseContract.symbol,
+            BaseContract.exchange,
+            BaseContract.currency,
+        ).filter(BaseContract.symbol.in_({row["symbol"] for row in pending}))
+    }
+    for row in pending:
+        if contract_key(row) in existing:
+            row.update(status="exists", id=existing[contract_key(row)])
+
+
+async def resolve_contract(ib: "IB", semaphore: asyncio.Semaphore, row: Dict) -> None:
+    contract = contracts_service.create_ib_contract(
+        row["contract_type"],
+        row["symbol"],
+        row["exchange"],
+        row["currency"],
+        row["conId"],
+    )
+    async with semaphore:
+        try:
+            contract_details = await asyncio.wait_for(
+                ib.reqContractDetailsAsync(contract), IMPORT_REQUEST_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            row.update(status="failed", detail="Contract details request timed out")
+            return
+
+    if not contract_details:
+        row.update(status="not_found", detail="Contract details not found")
+        return
+    row["conId"] = contract_details[0].contract.conId
+
+
+async def resolve_all(ib: "IB", rows: List[Dict]) -> None:
+    semaphore = asyncio.Semaphore(IMPORT_CONCURRENCY)
+    await asyncio.gather(*(resolve_contract(ib, semaphore, row) for row in rows))
+
+
+# Requests the details of the pending rows concurrently on one IB connection
+def resolve_contracts(ib: "IB", rows: List[Dict]) -> None:
+    ib.run(resolve_all(ib, [row for row in rows if row["status"] == "pending"]))
+
+
+# Stores the resolved rows in one transaction, rows conflicting with a stored contract are
+# skipped by the unique contract key, including those stored since mark_existing ran
+def save_contracts(db: Session, rows: List[Dict]) -> None:
+    resolved = [row for row in rows if row["status"] == "pending"]
+    if not resolved:
+        return
+
+    values = [
+        {
+            "symbol": row["symbol"],
+            "contract_type": row["contract_type"],
+            "exchange": row["exchange"],
+            "currency": row["currency"],
+            "to_trade": row["to_trade"],
+            "collect_ticks": row["collect_ticks"],
+            # Only stocks keep their conId, a ContFuture shares the one of its front month
+            "conId": row["conId"] if row["contract_type"] == "Stock" else None,
+        }
+        for row in resolved
+    ]
+    statement = (
+        pg_insert(BaseContract)
+        .values(values)
+        # Without a target, both ix_contracts_contract_key and the conId of stocks arbitrate
+        .on_conflict_do_nothing()
+        .returning(
+            BaseContract.id,
+            BaseContract.contract_type,
+            BaseContract.symbol,
+            BaseContract.exchange,
+            BaseContract.currency,
+        )
+    )
+    created = {
+        contract_key(contract._asdict()): contract.id
+        for contract in db.execute(statement)
+    }
+    db.commit()
+
+    for row in resolved:
+        if contract_key(row) in created:
+            row.update(status="created", id=created[contract_key(row)])
+        else:
+            row.update(status="exists", detail="Conflicts with a stored contract")
+
+    for contract_type in {row["contract_type"] for row in resolved}:
+        versions_service.bump_version(versions_service.contracts_key(contract_type))
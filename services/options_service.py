@@ -1,10 +1,30 @@
 from models import models
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
-from typing import List
-from services import contracts_service, prices_service
-from tasks import market_reader_tasks
-from ib_insync import IB, Stock as ib_stock
+from typing import TYPE_CHECKING, Dict, List
+from services import (
+    cache,
+    contracts_service,
+    dispatch_service,
+    prices_service,
+    series_state_service,
+)
+from datetime import datetime
+import pytz
+import json
+import math
+import os
+
+if TYPE_CHECKING:
+    from ib_insync import IB, Stock as ib_stock
+
+# Expirations closer than this many days are collected every cycle
+OPTION_NEAR_DAYS = int(os.getenv("OPTION_NEAR_DAYS", 7))
+
+# Minutes between two collections of farther expirations
+OPTION_FAR_INTERVAL = int(os.getenv("OPTION_FAR_INTERVAL", 30))
+
+OPTION_CHAIN_CACHE_TIME = 24 * 3600
 
 
 def get_option_expiration_dates(db: Session, symbol: str) -> List[str]:
@@ -111,38 +131,131 @@ def get_option_contract_db(
     return option
 
 
-# Process option contracts for stocks
+# Process option contracts of the configured expirations for stocks
 def process_options(
-    db: Session, ib: IB, stock: models.Stock, expiration_date: str, underlying: ib_stock
+    db: Session, ib: "IB", stock: models.Stock, underlying: "ib_stock"
 ) -> None:
-    db_option_contracts = contracts_service.get_db_option_contracts(
-        db, stock.id, expiration_date
-    )
+    chain = get_option_chain(ib, stock, underlying)
+    today = datetime.now(pytz.timezone("America/New_York")).strftime("%Y%m%d")
 
-    if not db_option_contracts:
+    expiration_dates = [
+        expiration_date
+        for expiration_date in contracts_service.select_option_expirations(
+            chain["expirations"],
+            today,
+            stock.option_weeklies if stock.option_weeklies is not None else 1,
+            stock.option_monthlies or 0,
+        )
+        if is_expiration_due(stock.id, expiration_date, today)
+    ]
+    if not expiration_dates:
+        return
+
+    # Recenter the strike window on the latest stored underlying bar, asking IB only before the first one
+    latest_price = prices_service.get_latest_stored_close(db, stock.id)
+    if latest_price is None:
         latest_price = prices_service.get_latest_price(underlying, ib)
-        option_contracts = contracts_service.get_ib_option_contracts(
-            ib, underlying, expiration_date, latest_price, stock.spread_around_spot
+    if latest_price is None or math.isnan(latest_price):
+        print(f"No price for {stock.symbol}, skipping its options")
+        return
+
+    strikes = contracts_service.get_strikes_around(
+        chain["strikes"], latest_price, stock.spread_around_spot
+    )
+    # Strikes that drifted out of the window stay stored but are no longer scheduled
+    strikes_in_range = set(strikes)
+    db_option_contracts = [
+        option
+        for option in contracts_service.get_db_option_contracts(
+            db, stock.id, expiration_dates
+        )
+        if option.strike in strikes_in_range
+    ]
+    option_contracts = contracts_service.db_to_ib_option_contracts(db_option_contracts)
+
+    # Create the strikes entering the window, across all expirations, with a single insert
+    stored_keys = {
+        (
+            option.lastTradeDateOrContractMonth.strftime("%Y%m%d"),
+            option.strike,
+            option.right,
         )
-        option_contracts = contracts_service.save_ib_contracts_to_db_and_convert(
-            option_contracts, stock.id, db
+        for option in db_option_contracts
+    }
+    new_contracts = [
+        contract
+        for contract in contracts_service.generate_option_contracts(
+            underlying.symbol, expiration_dates, strikes
         )
-    else:
-        option_contracts = contracts_service.db_to_ib_option_contracts(
-            db_option_contracts
+        if (
+            contract.lastTradeDateOrContractMonth,
+            contract.strike,
+            contract.right,
         )
+        not in stored_keys
+    ]
+    if new_contracts:
+        option_contracts += contracts_service.save_ib_contracts_to_db_and_convert(
+            new_contracts, stock.id, db
+        )
+
+    # Load the ingestion watermarks of the whole chain in one query
+    series_states = series_state_service.get_series_states(
+        db, [option_contract.db_id for option_contract in option_contracts]
+    )
+
+    # Trigger price data collection in batches sharing one IB connection each
+    dispatch_service.enqueue_price_data_batches(
+        [
+            {
+                "contract_db_id": option_contract.db_id,
+                "contract_type": "Option",
+                "symbol": option_contract.option.symbol,
+                "exchange": option_contract.option.exchange,
+                "currency": option_contract.option.currency,
+                "bar_size": 1,
+                "lastTradeDateOrContractMonth": option_contract.option.lastTradeDateOrContractMonth,
+                "strike": option_contract.option.strike,
+                "right": option_contract.option.right,
+                "last_bar_dates": series_state_service.get_last_bar_dates(
+                    series_states, option_contract.db_id, 1
+                ),
+            }
+            for option_contract in option_contracts
+        ]
+    )
+
 
-    # Trigger price data collection for each option contract
-    for option_contract in option_contracts:
-        market_reader_tasks.get_price_data.delay(
-            option_contract.db_id,
-            "Option",
-            option_contract.option.symbol,
-            option_contract.option.exchange,
-            option_contract.option.currency,
+# Reads the expirations and strikes listed for an underlying, requested from IB once a day
+def get_option_chain(ib: "IB", stock: models.Stock, underlying: "ib_stock") -> Dict:
+    cache_key = f"option_chain:{stock.id}:{datetime.now().strftime('%Y%m%d')}"
+    cached = cache.get(cache_key)
+    if cached:
+        return json.loads(cached)
+
+    chain = contracts_service.get_smart_option_chain(ib, underlying)
+    chain = {
+        "expirations": sorted(chain.expirations),
+        "strikes": sorted(chain.strikes),
+    }
+    cache.set(cache_key, json.dumps(chain), OPTION_CHAIN_CACHE_TIME)
+    return chain
+
+
+# Near expirations are collected every cycle, far ones once every OPTION_FAR_INTERVAL minutes
+def is_expiration_due(stock_id: int, expiration_date: str, today: str) -> bool:
+    days_to_expiration = (
+        datetime.strptime(expiration_date, "%Y%m%d")
+        - datetime.strptime(today, "%Y%m%d")
+    ).days
+    if days_to_expiration < OPTION_NEAR_DAYS:
+        return True
+
+    return bool(
+        cache.r.set(
+            f"option_schedule:{stock_id}:{expiration_date}",
             1,
-            None,
-            option_contract.option.lastTradeDateOrContractMonth,
-            option_contract.option.strike,
-            option_contract.option.right,
+            nx=True,
+            ex=OPTION_FAR_INTERVAL * 60,
         )
+    )
@@ -1,14 +1,19 @@
-from ib_insync import Contract, IB, BarDataList
 import math
-from typing import List
-from models.models import PriceBar
-from sqlalchemy.orm import Session
-from datetime import date, datetime, timedelta
+from typing import TYPE_CHECKING, List, Optional
+from models.models import PriceBar, IngestBatch
+from sqlalchemy import Row, and_, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, aliased
+from datetime import datetime, timedelta
 from pytz import timezone
+from services import archive_service, ibapi_service, series_state_service
+
+if TYPE_CHECKING:
+    from ib_insync import Contract, IB, BarDataList
 
 
 # Function to get the latest price for a given contract from IB
-def get_latest_price(contract: Contract, ib: IB):
+def get_latest_price(contract: "Contract", ib: "IB"):
     # Request market data for the contract
     market_data = ib.reqMktData(contract, "", False, False)
 
@@ -23,17 +28,46 @@ def get_latest_price(contract: Contract, ib: IB):
     return market_data.last
 
 
+# Function to get the close of a contract's latest stored bar, located through its series watermark
+def get_latest_stored_close(
+    db: Session, contract_id: int, data_type: str = "TRADES", bar_size: int = 5
+) -> Optional[float]:
+    last_bar_date = series_state_service.get_last_bar_date(
+        db, contract_id, data_type, bar_size
+    )
+    if last_bar_date is None:
+        return None
+
+    bar = (
+        db.query(PriceBar.close)
+        .filter(
+            PriceBar.contract_id == contract_id,
+            PriceBar.data_type == data_type,
+            PriceBar.bar_size == bar_size,
+            PriceBar.date == last_bar_date,
+        )
+        .first()
+    )
+    return bar[0] if bar else None
+
+
 # Function to retrieve historical bars for a given contract from IB
 def get_historical_bars(
-    ib: IB,
-    contract: Contract,
+    ib: "IB",
+    contract: "Contract",
     whatToShow: str,
     endDateTime: str = "",
     durationStr: str = "1 D",
     barSizeSetting: str = "1 min",
     useRTH: bool = False,
     formatDate: int = 1,
-) -> BarDataList:
+) -> "BarDataList":
+    # Skip the request when the gateway's pacing budget is spent, the series
+    # watermark makes the next cycle fetch the missing bars
+    if not ibapi_service.consume_pacing(ib):
+        print(f"Pacing budget exhausted, skipping {whatToShow} for {contract.symbol}")
+        return []
+
     # Request historical data for the contract (e.g., 1-minute bars for 1 day)
     print(durationStr)
     return ib.reqHistoricalData(
@@ -47,58 +81,26 @@ def get_historical_bars(
     )
 
 
-# Function to check if a price bar already exists in the database for a specific date and contract
-def check_bar_exists(
-    db: Session,
-    date: date,
-    contract_id: str,
-    contract_type: str,
-    data_type: str,
-    bar_size: int,
-) -> PriceBar:
-    # Query the database to check if a price bar with the same contract, date, data type, and bar size exists
-    return (
-        db.query(PriceBar)
-        .filter(
-            PriceBar.contract_id == contract_id,
-            PriceBar.date == date,
-            PriceBar.data_type == data_type,
-            PriceBar.bar_size == bar_size,
-        )
-        .first()  # Return the first matching record
-    )
-
-
 # Function to retrieve historical price bars and add them to the database if not already present
 def get_add_price_bars(
-    ib: IB,
-    contract: Contract,
+    ib: "IB",
+    contract: "Contract",
     data_type: str,
     contract_id: str,
     contract_type: str,
     bar_size: int,
     bars_to_create: List,
-    db: Session,
+    last_bar_date: Optional[datetime] = None,
 ):
-    # Check the most recent price bar in the database for this contract
-    last_bar = db.query(PriceBar).filter(
-        PriceBar.bar_size == bar_size,
-        PriceBar.data_type == data_type,
-        PriceBar.contract_id == contract_id,
-    )
-
     durationStr = "1 D"  # Default duration
 
     # Adjust duration based on contract type (longer for certain types)
-    if contract_type in ["Stock", "Index", "Forex", "Future"]:
+    if contract_type in ["Stock", "Index", "Forex", "Future", "DatedFuture"]:
         durationStr = "10 D"
 
-    # Order by date descending and get the last bar
-    last_bar = last_bar.order_by(PriceBar.date.desc()).first()
-
     # If we have a last bar, calculate the time difference and adjust duration accordingly
-    if last_bar:
-        difference = datetime.now(timezone("America/New_York")) - last_bar.date
+    if last_bar_date:
+        difference = datetime.now(timezone("America/New_York")) - last_bar_date
         difference_insec = difference.total_seconds()
 
         # Set duration based on the time difference since the last bar
@@ -111,12 +113,6 @@ def get_add_price_bars(
                 f"{math.ceil(difference_insec / 3600 / 6.5)} D"  # Days duration
             )
 
-    # Fetch all existing bars for the contract in the relevant time range from the database
-    existing_bars = get_existing_bars(db, contract_id, data_type, bar_size)
-
-    # Convert existing bars to a set of bar dates for fast lookup
-    existing_bar_dates = {bar.date for bar in existing_bars}
-
     # Fetch historical bars from IB based on the adjusted duration
     for bar in get_historical_bars(
         ib,
@@ -125,12 +121,10 @@ def get_add_price_bars(
         durationStr=durationStr,
         barSizeSetting=f"{bar_size} mins",
     ):
-        # Skip bars that are too recent or already exist in the fetched set of existing bars
-        if (
-            bar.date + timedelta(minutes=bar_size)
-            > datetime.now(timezone("America/New_York"))
-            or bar.date in existing_bar_dates
-        ):
+        # Skip bars that are too recent or already stored, per the series watermark
+        if bar.date + timedelta(minutes=bar_size) > datetime.now(
+            timezone("America/New_York")
+        ) or (last_bar_date is not None and bar.date <= last_bar_date):
             continue
 
         # Append new price bars to the list to be added to the database
@@ -151,17 +145,61 @@ def get_add_price_bars(
     return bars_to_create
 
 
-def get_existing_bars(db: Session, contract_id: int, data_type: str, bar_size: int):
-    # Query the database for all bars that match the contract_id, data_type, and bar_size
-    return (
-        db.query(PriceBar)
-        .filter(
-            PriceBar.contract_id == contract_id,
-            PriceBar.data_type == data_type,
-            PriceBar.bar_size == bar_size,
+# Rows per INSERT statement, bounding the number of bound parameters
+INSERT_CHUNK_SIZE = 5000
+
+# Columns of the inserted bars returned by insert_price_bars
+INSERTED_BAR_COLUMNS = (
+    PriceBar.contract_id,
+    PriceBar.data_type,
+    PriceBar.bar_size,
+    PriceBar.date,
+    PriceBar.open,
+    PriceBar.high,
+    PriceBar.low,
+    PriceBar.close,
+    PriceBar.volume,
+)
+
+
+# Function to insert price bars under a fresh ingestion batch, skipping the bars already stored.
+# Returns the bars actually inserted, so that re-delivered bars are not rolled up twice
+def insert_price_bars(db: Session, rows: List[dict]) -> List[Row]:
+    if not rows:
+        return []
+
+    batch = IngestBatch()
+    db.add(batch)
+    db.flush()
+
+    inserted = []
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        statement = (
+            pg_insert(PriceBar)
+            .values(
+                [
+                    {**row, "ingest_batch_id": batch.id}
+                    for row in rows[start : start + INSERT_CHUNK_SIZE]
+                ]
+            )
+            .on_conflict_do_nothing(constraint="uq_price_bars_series_date")
+            .returning(*INSERTED_BAR_COLUMNS)
         )
-        .all()
-    )
+        inserted.extend(db.execute(statement).all())
+
+    return inserted
+
+
+# Columns returned by the bar routes, in schemas.PriceBar order
+PRICE_BAR_RESPONSE_COLUMNS = (
+    PriceBar.id,
+    PriceBar.date,
+    PriceBar.open,
+    PriceBar.high,
+    PriceBar.low,
+    PriceBar.close,
+    PriceBar.volume,
+)
 
 
 # Function to retrieve price bars from the database based on specific criteria
@@ -172,10 +210,14 @@ def get_price_bars_from_db(
     bar_size: int,
     order: str,
     limit: int,
+    raw: bool = False,
 ) -> List[PriceBar]:
+    # Raw mode selects the response columns only, skipping ORM instantiation
+    entities = PRICE_BAR_RESPONSE_COLUMNS if raw else (PriceBar,)
+
     # Query price bars from the database based on the contract ID, data type, and bar size
     query = (
-        db.query(PriceBar)
+        db.query(*entities)
         .filter(
             PriceBar.data_type == data_type,
             PriceBar.bar_size == bar_size,
@@ -192,8 +234,75 @@ def get_price_bars_from_db(
     else:
         recent_bars = query.all()
 
+    # If the query reaches past the hot window, complete it from the Parquet archive
+    oldest_date = recent_bars[-1].date if recent_bars else None
+    if (
+        limit <= 0 or len(recent_bars) < limit
+    ) and archive_service.may_have_archived_bars(oldest_date):
+        recent_bars += archive_service.get_archived_price_bars(
+            contract_id,
+            data_type,
+            bar_size,
+            oldest_date,
+            limit - len(recent_bars) if limit > 0 else 0,
+        )
+
     # Return the bars in the requested order: if 'desc', keep descending, else reverse to ascending
     if order == "desc":
         return recent_bars  # Already in descending order
     else:
         return recent_bars[::-1]  # Reverse to ascending order
+
+
+# Function to retrieve BID and ASK bars joined on date, with mid-price and spread computed in SQL
+def get_spread_bars_from_db(
+    db: Session,
+    contract_id: int,
+    bar_size: int,
+    order: str,
+    limit: int,
+) -> List[Row]:
+    # Only the hot window is joined, archived bars are not read
+    bid = aliased(PriceBar)
+    ask = aliased(PriceBar)
+
+    mid = (bid.close + ask.close) / 2
+    spread = ask.close - bid.close
+
+    query = (
+        db.query(
+            bid.date.label("date"),
+            bid.close.label("bid"),
+            ask.close.label("ask"),
+            mid.label("mid"),
+            spread.label("spread"),
+            (spread / func.nullif(mid, 0)).label("relative_spread"),
+        )
+        .join(
+            ask,
+            and_(
+                ask.contract_id == bid.contract_id,
+                ask.bar_size == bid.bar_size,
+                ask.date == bid.date,
+                ask.data_type == "ASK",
+            ),
+        )
+        .filter(
+            bid.contract_id == contract_id,
+            bid.bar_size == bar_size,
+            bid.data_type == "BID",
+        )
+        .order_by(bid.date.desc())  # Latest bars first, as for get_price_bars_from_db
+    )
+
+    # Apply the limit to get the most recent 'limit' bars
+    if limit > 0:
+        recent_bars = query.limit(limit).all()
+    else:
+        recent_bars = query.all()
+
+    # Return the bars in the requested order
+    if order == "desc":
+        return recent_bars
+    else:
+        return recent_bars[::-1]
@@ -0,0 +1,146 @@
+from models.models import PriceBar, PriceRollup
+from fastapi import HTTPException
+from sqlalchemy import case, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Dict, List, Tuple
+import pytz
+
+ROLLUP_PERIODS = ["hour", "day"]
+
+# Sessions are bucketed on the exchange's wall clock, not UTC
+ROLLUP_TIMEZONE = pytz.timezone("America/New_York")
+
+
+# Truncates a bar date to the start of its hourly or daily bucket in New York time
+def get_period_start(date: datetime, period: str) -> datetime:
+    if date.tzinfo is None:
+        date = pytz.utc.localize(date)
+
+    local_date = date.astimezone(ROLLUP_TIMEZONE)
+    if period == "hour":
+        local_start = local_date.replace(minute=0, second=0, microsecond=0)
+    elif period == "day":
+        local_start = local_date.replace(hour=0, minute=0, second=0, microsecond=0)
+    else:
+        raise ValueError(f"Invalid rollup period: {period}")
+
+    # Re-localize so the bucket carries the right UTC offset across DST changes
+    return ROLLUP_TIMEZONE.localize(local_start.replace(tzinfo=None))
+
+
+# Aggregates new bars into one partial rollup row per series and bucket
+def aggregate_bars(bars: List[PriceBar]) -> List[Dict]:
+    rollups: Dict[Tuple, Dict] = {}
+
+    for bar in sorted(bars, key=lambda bar: bar.date):
+        # BID/ASK bars report a volume of -1, which must not leak into the sums
+        volume = max(bar.volume, 0)
+        typical_price = (bar.high + bar.low + bar.close) / 3
+
+        for period in ROLLUP_PERIODS:
+            period_start = get_period_start(bar.date, period)
+            key = (bar.contract_id, bar.data_type, bar.bar_size, period, period_start)
+
+            rollup = rollups.get(key)
+            if rollup is None:
+                rollups[key] = {
+                    "contract_id": bar.contract_id,
+                    "data_type": bar.data_type,
+                    "bar_size": bar.bar_size,
+                    "period": period,
+                    "period_start": period_start,
+                    "first_bar_date": bar.date,
+                    "last_bar_date": bar.date,
+                    "open": bar.open,
+                    "high": bar.high,
+                    "low": bar.low,
+                    "close": bar.close,
+                    "volume": volume,
+                    "price_volume": typical_price * volume,
+                    "bar_count": 1,
+                }
+                continue
+
+            # Bars are sorted, so each new bar extends the bucket on the right
+            rollup["last_bar_date"] = bar.date
+            rollup["high"] = max(rollup["high"], bar.high)
+            rollup["low"] = min(rollup["low"], bar.low)
+            rollup["close"] = bar.close
+            rollup["volume"] += volume
+            rollup["price_volume"] += typical_price * volume
+            rollup["bar_count"] += 1
+
+    return list(rollups.values())
+
+
+# Merges new bars into the rollup tables within the caller's transaction
+def upsert_rollups(db: Session, bars: List[PriceBar]) -> None:
+    rows = aggregate_bars(bars)
+    if not rows:
+        return
+
+    statement = pg_insert(PriceRollup.__table__).values(rows)
+    existing = PriceRollup.__table__.c
+    new = statement.excluded
+
+    statement = statement.on_conflict_do_update(
+        constraint="uq_price_rollups_series_period",
+        set_={
+            "open": case(
+                (new.first_bar_date < existing.first_bar_date, new.open),
+                else_=existing.open,
+            ),
+            "close": case(
+                (new.last_bar_date > existing.last_bar_date, new.close),
+                else_=existing.close,
+            ),
+            "first_bar_date": func.least(existing.first_bar_date, new.first_bar_date),
+            "last_bar_date": func.greatest(existing.last_bar_date, new.last_bar_date),
+            "high": func.greatest(existing.high, new.high),
+            "low": func.least(existing.low, new.low),
+            "volume": existing.volume + new.volume,
+            "price_volume": existing.price_volume + new.price_volume,
+            "bar_count": existing.bar_count + new.bar_count,
+        },
+    )
+
+    db.execute(statement)
+
+
+# Function to retrieve rollups from the database based on specific criteria
+def get_rollups_from_db(
+    db: Session,
+    contract_id: int,
+    data_type: str,
+    bar_size: int,
+    period: str,
+    order: str,
+    limit: int,
+) -> List[PriceRollup]:
+    if period not in ROLLUP_PERIODS:
+        raise HTTPException(status_code=400, detail="Invalid rollup period")
+
+    query = (
+        db.query(PriceRollup)
+        .filter(
+            PriceRollup.contract_id == contract_id,
+            PriceRollup.data_type == data_type,
+            PriceRollup.bar_size == bar_size,
+            PriceRollup.period == period,
+        )
+        .order_by(PriceRollup.period_start.desc())
+    )
+
+    # Apply the limit to get the most recent 'limit' rollups
+    if limit > 0:
+        recent_rollups = query.limit(limit).all()
+    else:
+        recent_rollups = query.all()
+
+    # Return the rollups in the requested order
+    if order == "desc":
+        return recent_rollups
+    else:
+        return recent_rollups[::-1]
@@ -0,0 +1,62 @@
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from typing import Iterator, List
+import pytz
+
+# Rows encoded per chunk of the streamed JSON array
+STREAM_CHUNK_SIZE = 1000
+
+PRICE_BAR_FIELDS = ["id", "date", "open", "high", "low", "close", "volume"]
+
+
+def get_timezone(tz: str):
+    try:
+        return pytz.timezone(tz)
+    except pytz.UnknownTimeZoneError:
+        raise HTTPException(status_code=400, detail="Unknown time zone")
+
+
+# Converts all bar dates to the requested time zone in one vectorized operation
+def convert_dates(dates: List, tz: str) -> List:
+    if not dates:
+        return []
+
+    # pandas is imported on first use, so that the API starts without it
+    import pandas as pd
+
+    # Naive dates are assumed to be UTC, as in schemas.PriceBar
+    converted = pd.to_datetime(pd.Series(dates), utc=True).dt.tz_convert(tz)
+    return list(converted.dt.to_pydatetime())
+
+
+def stream_json_array(rows: List[dict]) -> Iterator[bytes]:
+    import orjson
+
+    yield b"["
+    for start in range(0, len(rows), STREAM_CHUNK_SIZE):
+        if start:
+            yield b","
+        # Strip the brackets of each encoded chunk to splice them into one array
+        yield orjson.dumps(rows[start : start + STREAM_CHUNK_SIZE])[1:-1]
+    yield b"]"
+
+
+# Builds a streamed orjson response from raw bar rows, bypassing per-row Pydantic validation
+def price_bars_response(bars: List, tz: str) -> StreamingResponse:
+    get_timezone(tz)
+
+    dates = convert_dates([bar.date for bar in bars], tz)
+    rows = [
+        {
+            "id": bar.id,
+            "date": date,
+            "open": bar.open,
+            "high": bar.high,
+            "low": bar.low,
+            "close": bar.close,
+            "volume": bar.volume,
+        }
+        for bar, date in zip(bars, dates)
+    ]
+
+    return StreamingResponse(stream_json_array(rows), media_type="application/json")
@@ -0,0 +1,144 @@
+from models.models import PriceBar, SeriesState, PRICE_DATA_TYPE_CODES
+from services import cache
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+import pytz
+
+SeriesKey = Tuple[int, str, int]  # (contract_id, data_type, bar_size)
+
+
+def get_redis_key(contract_id: int, data_type: str, bar_size: int) -> str:
+    return f"series_state:{contract_id}:{data_type}:{bar_size}"
+
+
+# Loads the watermarks of many contracts in a single query
+def get_series_states(
+    db: Session, contract_ids: Iterable[int]
+) -> Dict[SeriesKey, SeriesState]:
+    contract_ids = list(contract_ids)
+    if not contract_ids:
+        return {}
+
+    states = db.query(SeriesState).filter(SeriesState.contract_id.in_(contract_ids))
+    return {
+        (state.contract_id, state.data_type, state.bar_size): state for state in states
+    }
+
+
+# Serializes the last bar dates of a contract's series, to be passed as a task argument
+def get_last_bar_dates(
+    states: Dict[SeriesKey, SeriesState], contract_id: int, bar_size: int
+) -> Dict[str, str]:
+    last_bar_dates = {}
+    for data_type in PRICE_DATA_TYPE_CODES:
+        state = states.get((contract_id, data_type, bar_size))
+        if state is not None and state.last_bar_date is not None:
+            last_bar_dates[data_type] = state.last_bar_date.isoformat()
+    return last_bar_dates
+
+
+# Reads the last bar date of one series from the Redis mirror, falling back to the table
+def get_last_bar_date(
+    db: Session, contract_id: int, data_type: str, bar_size: int
+) -> Optional[datetime]:
+    mirrored = cache.r.hget(
+        get_redis_key(contract_id, data_type, bar_size), "last_bar_date"
+    )
+    if mirrored:
+        return datetime.fromisoformat(mirrored.decode())
+
+    state = db.get(SeriesState, (contract_id, data_type, bar_size))
+    return state.last_bar_date if state else None
+
+
+# Loads the watermark of a contract's finest series with bars for a data type
+def get_finest_series_state(
+    db: Session, contract_id: int, data_type: str
+) -> Optional[SeriesState]:
+    return (
+        db.query(SeriesState)
+        .filter(
+            SeriesState.contract_id == contract_id,
+            SeriesState.data_type == data_type,
+            SeriesState.last_bar_date.isnot(None),
+        )
+        .order_by(SeriesState.bar_size)
+        .first()
+    )
+
+
+# Advances the watermarks of the fetched series within the caller's transaction
+def update_series_states(
+    db: Session,
+    contract_id: int,
+    bar_size: int,
+    data_types: List[str],
+    bars: List[PriceBar],
+) -> None:
+    fetched_at = datetime.now(pytz.utc)
+    rows = {
+        data_type: {
+            "contract_id": contract_id,
+            "data_type": data_type,
+            "bar_size": bar_size,
+            "last_bar_date": None,
+            "bar_count": 0,
+            "last_fetch_at": fetched_at,
+        }
+        for data_type in data_types
+    }
+    for bar in bars:
+        row = rows[bar.data_type]
+        row["bar_count"] += 1
+        if row["last_bar_date"] is None or bar.date > row["last_bar_date"]:
+            row["last_bar_date"] = bar.date
+
+    if not rows:
+        return
+
+    statement = pg_insert(SeriesState).values(list(rows.values()))
+    existing = SeriesState.__table__.c
+    new = statement.excluded
+    statement = statement.on_conflict_do_update(
+        index_elements=["contract_id", "data_type", "bar_size"],
+        set_={
+            # greatest() ignores NULLs, so fetches without new bars keep the watermark
+            "last_bar_date": func.greatest(existing.last_bar_date, new.last_bar_date),
+            "bar_count": existing.bar_count + new.bar_count,
+            "last_fetch_at": new.last_fetch_at,
+        },
+    ).returning(
+        existing.contract_id,
+        existing.data_type,
+        existing.bar_size,
+        existing.last_bar_date,
+        existing.bar_count,
+        existing.last_fetch_at,
+    )
+
+    # Keep the committed values to mirror them once the transaction succeeds
+    db.info.setdefault("series_states", []).extend(db.execute(statement).all())
+
+
+# Mirrors the series states written by update_series_states to Redis, call after commit
+def mirror_series_states(db: Session) -> None:
+    states = db.info.pop("series_states", [])
+    if not states:
+        return
+
+    pipeline = cache.r.pipeline(transaction=False)
+    for state in states:
+        pipeline.hset(
+            get_redis_key(state.contract_id, state.data_type, state.bar_size),
+            mapping={
+                "last_bar_date": (
+                    state.last_bar_date.isoformat() if state.last_bar_date else ""
+                ),
+                "bar_count": state.bar_count,
+                "last_fetch_at": state.last_fetch_at.isoformat(),
+            },
+        )
+    pipeline.execute()
@@ -0,0 +1,269 @@
+from models.models import PriceTick, PRICE_DATA_TYPE_CODES
+from models.database import get_read_db
+from services import calendar_service, ibapi_service
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Iterator, List, Optional
+import functools
+import pytz
+import io
+import os
+
+# IB, pyarrow and pandas are imported on first use, so that the API starts without them
+if TYPE_CHECKING:
+    from ib_insync import IB, Contract
+    import pandas as pd
+    import pyarrow as pa
+
+TICK_TYPES = ["TRADES", "BID_ASK"]
+
+# IB returns at most 1000 ticks per request, plus the rest of the last second
+TICKS_PER_REQUEST = 1000
+
+# Requests per tick type and task, bounding how long one task holds its IB connection
+TICK_MAX_REQUESTS = int(os.getenv("TICK_MAX_REQUESTS", 20))
+
+# Ticks read per database round trip and Arrow record batch
+TICK_READ_BATCH_SIZE = 50_000
+
+TICK_COLUMNS = {
+    "TRADES": ["price", "size"],
+    "BID_ASK": ["bid_price", "ask_price", "bid_size", "ask_size"],
+}
+
+
+@functools.lru_cache(maxsize=None)
+def get_tick_schema(tick_type: str) -> "pa.Schema":
+    import pyarrow as pa
+
+    return pa.schema(
+        [("time", pa.timestamp("us", tz="UTC"))]
+        + [(column, pa.float32()) for column in TICK_COLUMNS[tick_type]]
+    )
+
+
+def to_microseconds(value: datetime) -> int:
+    # Naive dates are assumed to be UTC, as in schemas.PriceBar
+    if value.tzinfo is None:
+        value = pytz.utc.localize(value)
+    return int(value.timestamp() * 1_000_000)
+
+
+def check_tick_type(tick_type: str) -> None:
+    if tick_type not in TICK_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid tick type, expected any of {', '.join(TICK_TYPES)}",
+        )
+
+
+# Returns the time of a contract's latest stored tick, read from the primary key index
+def get_last_tick_time(db: Session, contract_id: int, tick_type: str) -> Optional[int]:
+    return (
+        db.query(func.max(PriceTick.time_us))
+        .filter(PriceTick.contract_id == contract_id, PriceTick.data_type == tick_type)
+        .scalar()
+    )
+
+
+# Requests the ticks following a time up to the last completed second from IB, one page of
+# TICKS_PER_REQUEST at a time
+def fetch_historical_ticks(
+    ib: "IB", contract: "Contract", tick_type: str, start: datetime
+) -> List:
+    # Ticks can still arrive in the current second, so the capture stops before it and
+    # every stored second is complete
+    end = (datetime.now(pytz.utc) - timedelta(seconds=1)).replace(microsecond=0)
+
+    ticks = []
+    for _ in range(TICK_MAX_REQUESTS):
+        if start >= end:
+            break
+
+        # The gateway's pacing budget is shared with the bar requests
+        if not ibapi_service.consume_pacing(ib):
+            print(
+                f"Pacing budget exhausted, stopping {tick_type} ticks for {contract.symbol}"
+            )
+            break
+
+        page = ib.reqHistoricalTicks(
+            contract,
+            startDateTime=start,
+            endDateTime="",
+            numberOfTicks=TICKS_PER_REQUEST,
+            whatToShow=tick_type,
+            useRth=False,
+        )
+        if not page:
+            break
+
+        ticks.extend(tick for tick in page if tick.time < end)
+        if len(page) < TICKS_PER_REQUEST or page[-1].time >= end:
+            break
+
+        # Pages always end on a complete second, which has a one second resolution
+        start = page[-1].time + timedelta(seconds=1)
+
+    return ticks
+
+
+# Converts IB ticks into the table's columns in one vectorized pass
+def ticks_to_frame(ticks: List, contract_id: int, tick_type: str) -> "pd.DataFrame":
+    import pandas as pd
+
+    if tick_type == "TRADES":
+        frame = pd.DataFrame(
+            {
+                "time": [tick.time for tick in ticks],
+                "price": [tick.price for tick in ticks],
+                "size": [tick.size for tick in ticks],
+            }
+        )
+    else:
+        frame = pd.DataFrame(
+            {
+                "time": [tick.time for tick in ticks],
+                "bid_price": [tick.priceBid for tick in ticks],
+                "ask_price": [tick.priceAsk for tick in ticks],
+                "bid_size": [tick.sizeBid for tick in ticks],
+                "ask_size": [tick.sizeAsk for tick in ticks],
+            }
+        )
+
+    frame["time_us"] = (
+        pd.to_datetime(frame.pop("time"), utc=True).astype("int64") // 1_000
+    )
+    # Ticks sharing a timestamp keep their order through a sequence number
+    frame["seq"] = frame.groupby("time_us").cumcount()
+    frame["contract_id"] = contract_id
+    frame["data_type"] = PRICE_DATA_TYPE_CODES[tick_type]  # COPY bypasses PriceDataType
+    return frame[
+        ["contract_id", "data_type", "time_us", "seq", *TICK_COLUMNS[tick_type]]
+    ]
+
+
+# Bulk loads ticks with COPY within the session's transaction, bypassing the ORM
+def copy_ticks(db: Session, frame: "pd.DataFrame") -> int:
+    if frame.empty:
+        return 0
+
+    buffer = io.StringIO()
+    frame.to_csv(buffer, index=False, header=False)  # NaN become empty, i.e. NULL
+    buffer.seek(0)
+
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY price_ticks ({', '.join(frame.columns)}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+    finally:
+        cursor.close()
+    return len(frame)
+
+
+# Fetches and stores the ticks of a contract since its latest stored one, or since the session open
+def add_ticks(
+    db: Session, ib: "IB", contract: "Contract", contract_id: int, tick_type: str
+) -> int:
+    last_tick_time = get_last_tick_time(db, contract_id, tick_type)
+    if last_tick_time is not None:
+        # Stored seconds are always complete, so resume with the next one
+        start = datetime.fromtimestamp(last_tick_time // 1_000_000 + 1, pytz.utc)
+    else:
+        start, _ = calendar_service.get_latest_session()
+
+    ticks = fetch_historical_ticks(ib, contract, tick_type, start)
+    return copy_ticks(db, ticks_to_frame(ticks, contract_id, tick_type))
+
+
+# Streams the ticks of a time range as Arrow record batches, with its own session so that
+# the connection outlives the request handler
+def iter_tick_batches(
+    contract_id: int, tick_type: str, start: datetime, end: datetime
+) -> Iterator["pa.RecordBatch"]:
+    import pyarrow as pa
+
+    columns = TICK_COLUMNS[tick_type]
+    schema = get_tick_schema(tick_type)
+    statement = (
+        select(
+            PriceTick.time_us, *[PriceTick.__table__.c[column] for column in columns]
+        )
+        .where(
+            PriceTick.contract_id == contract_id,
+            PriceTick.data_type == tick_type,
+            PriceTick.time_us >= to_microseconds(start),
+            PriceTick.time_us < to_microseconds(end),
+        )
+        .order_by(PriceTick.time_us, PriceTick.seq)
+        .execution_options(stream_results=True, yield_per=TICK_READ_BATCH_SIZE)
+    )
+
+    with get_read_db() as db:
+        for rows in db.execute(statement).partitions():
+            values = list(zip(*rows))
+            yield pa.RecordBatch.from_arrays(
+                [
+                    pa.array(values[index], type=field.type)
+                    for index, field in enumerate(schema)
+                ],
+                schema=schema,
+            )
+
+
+# Encodes record batches as an Arrow IPC stream, one chunk per batch
+def arrow_stream(
+    batches: Iterator["pa.RecordBatch"], schema: "pa.Schema"
+) -> Iterator[bytes]:
+    import pyarrow as pa
+
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()
+
+
+# Encodes record batches as a JSON array of rows, one chunk per batch
+def json_stream(batches: Iterator["pa.RecordBatch"]) -> Iterator[bytes]:
+    import orjson
+
+    yield b"["
+    first = True
+    for batch in batches:
+        if batch.num_rows == 0:
+            continue
+        if not first:
+            yield b","
+        first = False
+        # Strip the brackets of each encoded batch to splice them into one array
+        yield orjson.dumps(batch.to_pylist())[1:-1]
+    yield b"]"
+
+
+# Builds a streamed response of the ticks of a time range, as Arrow IPC or JSON
+def ticks_response(
+    contract_id: int, tick_type: str, start: datetime, end: datetime, format: str
+) -> StreamingResponse:
+    check_tick_type(tick_type)
+    batches = iter_tick_batches(contract_id, tick_type, start, end)
+
+    if format == "arrow":
+        return StreamingResponse(
+            arrow_stream(batches, get_tick_schema(tick_type)),
+            media_type="application/vnd.apache.arrow.stream",
+        )
+    if format == "json":
+        return StreamingResponse(json_stream(batches), media_type="application/json")
+
+    raise HTTPException(
+        status_code=400, detail="Invalid format, expected arrow or json"
+    )
@@ -0,0 +1,74 @@
+from services import cache
+from models.database import DB_READ_MAX_LAG
+from fastapi import Request
+from fastapi.responses import Response
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Tuple
+import hashlib
+import time
+
+
+# Version of a contract's bars, bumped whenever new bars are committed
+def series_key(contract_id: int) -> str:
+    return f"version:series:{contract_id}"
+
+
+# Version of a contract type's list, bumped whenever contracts are created or deleted
+def contracts_key(contract_type: str) -> str:
+    return f"version:contracts:{contract_type}"
+
+
+def bump_version(key: str) -> None:
+    cache.set(key, time.time())
+
+
+def get_version(key: str) -> float:
+    version = cache.get(key)
+    if version is None:
+        # Unknown versions (e.g. after a Redis flush) start now, any later change bumps them
+        cache.r.set(key, time.time(), nx=True)
+        version = cache.get(key)
+    return float(version)
+
+
+# Returns the validators of a resource and whether the client's cached copy is still fresh
+def check_not_modified(request: Request, key: str) -> Tuple[bool, Dict[str, str]]:
+    version = get_version(key)
+
+    # The query string is part of the tag, as it selects a different representation
+    digest = hashlib.sha1(
+        f"{key}:{version}:{request.url.path}?{request.url.query}".encode()
+    ).hexdigest()
+    headers = {
+        "ETag": f'"{digest}"',
+        "Last-Modified": formatdate(version, usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+
+    # A replica may not have replayed a change bumped moments ago, so its response
+    # must not be cached under the new version's validators
+    if (
+        getattr(request.state, "read_replica", False)
+        and time.time() - version < DB_READ_MAX_LAG
+    ):
+        return False, {"Cache-Control": "no-cache"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return headers["ETag"] in tags or "*" in tags, headers
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False, headers
+        # HTTP dates have a one second resolution
+        return int(version) <= since, headers
+
+    return False, headers
+
+
+def not_modified_response(headers: Dict[str, str]) -> Response:
+    return Response(status_code=304, headers=headers)
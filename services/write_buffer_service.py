@@ -0,0 +1,187 @@
+from models.models import PriceBar
+from services import (
+    cache,
+    prices_service,
+    rollups_service,
+    series_state_service,
+    versions_service,
+)
+from sqlalchemy.orm import Session
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Tuple
+import redis
+import json
+import os
+
+# Stream buffering fetched bars until the writer commits them
+PRICE_BAR_STREAM = "stream:price_bars"
+PRICE_BAR_GROUP = "price_bar_writers"
+
+# Stream keeping the fetches that could not be written, with the error they failed with
+DEAD_LETTER_STREAM = "stream:price_bars:dead"
+
+# Fetches drained per transaction, each holding the new bars of one contract
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", 500))
+
+# Milliseconds the writer waits for new fetches when the stream is empty
+WRITE_BLOCK_MS = int(os.getenv("WRITE_BLOCK_MS", 1000))
+
+# Milliseconds after which the fetches read by a dead writer are claimed by another one
+WRITE_CLAIM_IDLE_MS = int(os.getenv("WRITE_CLAIM_IDLE_MS", 60_000))
+
+# Deliveries after which the fetches of a failing batch are written one by one, and those
+# still failing are moved to the dead-letter stream
+WRITE_MAX_DELIVERIES = int(os.getenv("WRITE_MAX_DELIVERIES", 10))
+
+Entry = Tuple[bytes, Dict[bytes, bytes]]  # (stream ID, fields)
+
+# Fields of each buffered bar, the contract and bar size are shared by the whole fetch
+BAR_FIELDS = ["data_type", "date", "open", "high", "low", "close", "volume"]
+
+
+# Appends the bars of one fetch to the stream, with the data types fetched to advance their
+# last fetch time even when no bar is new
+def append_bars(
+    contract_id: int, bar_size: int, data_types: List[str], bars: List[PriceBar]
+) -> None:
+    payload = {
+        "contract_id": contract_id,
+        "bar_size": bar_size,
+        "data_types": data_types,
+        "bars": [[getattr(bar, field) for field in BAR_FIELDS] for bar in bars],
+    }
+    cache.r.xadd(PRICE_BAR_STREAM, {"payload": json.dumps(payload, default=str)})
+
+
+def ensure_group() -> None:
+    try:
+        cache.r.xgroup_create(PRICE_BAR_STREAM, PRICE_BAR_GROUP, id="0", mkstream=True)
+    except redis.ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def get_entries(response) -> List[Entry]:
+    entries = response[0][1] if response else []
+    # Pending entries deleted from the stream come back without fields
+    return [(entry_id, fields) for entry_id, fields in entries if fields]
+
+
+# Reads the next fetches to write: the consumer's own unacknowledged ones first (e.g. after a
+# failed transaction), then those abandoned by a dead writer, then new ones
+def read_entries(consumer: str) -> List[Entry]:
+    entries = get_entries(
+        cache.r.xreadgroup(
+            PRICE_BAR_GROUP, consumer, {PRICE_BAR_STREAM: "0"}, count=WRITE_BATCH_SIZE
+        )
+    )
+    if entries:
+        return entries
+
+    _, claimed, *_ = cache.r.xautoclaim(
+        PRICE_BAR_STREAM,
+        PRICE_BAR_GROUP,
+        consumer,
+        WRITE_CLAIM_IDLE_MS,
+        count=WRITE_BATCH_SIZE,
+    )
+    entries = get_entries([(PRICE_BAR_STREAM, claimed)])
+    if entries:
+        return entries
+
+    return get_entries(
+        cache.r.xreadgroup(
+            PRICE_BAR_GROUP,
+            consumer,
+            {PRICE_BAR_STREAM: ">"},
+            count=WRITE_BATCH_SIZE,
+            block=WRITE_BLOCK_MS,
+        )
+    )
+
+
+# Writes the bars of many fetches in one transaction, with their rollups and watermarks.
+# Bars already stored are skipped, so re-delivered fetches are harmless
+def write_entries(db: Session, entries: List[Entry]) -> None:
+    rows = []
+    data_types = defaultdict(set)
+    for _, fields in entries:
+        payload = json.loads(fields[b"payload"])
+        series = (payload["contract_id"], payload["bar_size"])
+        data_types[series].update(payload["data_types"])
+        for values in payload["bars"]:
+            row = dict(zip(BAR_FIELDS, values))
+            row["date"] = datetime.fromisoformat(row["date"])
+            row["contract_id"], row["bar_size"] = series
+            rows.append(row)
+
+    inserted = prices_service.insert_price_bars(db, rows)
+    rollups_service.upsert_rollups(db, inserted)
+
+    inserted_by_series = defaultdict(list)
+    for bar in inserted:
+        inserted_by_series[(bar.contract_id, bar.bar_size)].append(bar)
+    for (contract_id, bar_size), series_data_types in data_types.items():
+        series_state_service.update_series_states(
+            db,
+            contract_id,
+            bar_size,
+            sorted(series_data_types),
+            inserted_by_series[(contract_id, bar_size)],
+        )
+
+    db.commit()
+    series_state_service.mirror_series_states(db)
+
+    # Invalidate the cached copies clients hold of the updated series
+    for contract_id in {bar.contract_id for bar in inserted}:
+        versions_service.bump_version(versions_service.series_key(contract_id))
+
+    print(f"Wrote {len(inserted)} of {len(rows)} bars from {len(entries)} fetches")
+
+
+# Acknowledges committed fetches and drops them from the stream, bounding its memory
+def ack_entries(entries: List[Entry]) -> None:
+    entry_ids = [entry_id for entry_id, _ in entries]
+    pipeline = cache.r.pipeline()
+    pipeline.xack(PRICE_BAR_STREAM, PRICE_BAR_GROUP, *entry_ids)
+    pipeline.xdel(PRICE_BAR_STREAM, *entry_ids)
+    pipeline.execute()
+
+
+# Selects the fetches delivered WRITE_MAX_DELIVERIES times or more, as counted by the group
+def get_exhausted_entries(consumer: str, entries: List[Entry]) -> List[Entry]:
+    pending = cache.r.xpending_range(
+        PRICE_BAR_STREAM,
+        PRICE_BAR_GROUP,
+        min=entries[0][0],  # Entries are read in stream order
+        max=entries[-1][0],
+        count=len(entries),
+        consumername=consumer,
+    )
+    exhausted = {
+        message["message_id"]
+        for message in pending
+        if message["times_delivered"] >= WRITE_MAX_DELIVERIES
+    }
+    return [entry for entry in entries if entry[0] in exhausted]
+
+
+# Moves fetches that cannot be written to the dead-letter stream, so they stop blocking
+# the writer while staying available for inspection and replay
+def dead_letter_entries(entries: List[Entry], error: Exception) -> None:
+    entry_ids = [entry_id for entry_id, _ in entries]
+    pipeline = cache.r.pipeline()
+    for entry_id, fields in entries:
+        pipeline.xadd(
+            DEAD_LETTER_STREAM, {**fields, b"entry_id": entry_id, b"error": str(error)}
+        )
+    pipeline.xack(PRICE_BAR_STREAM, PRICE_BAR_GROUP, *entry_ids)
+    pipeline.xdel(PRICE_BAR_STREAM, *entry_ids)
+    pipeline.execute()
+
+
+# Number of fetches buffered and not yet committed
+def get_backlog() -> int:
+    return cache.r.xlen(PRICE_BAR_STREAM)
@@ -0,0 +1,13 @@
+from celery_app import celery_app
+from models.database import get_celery_db
+from services import archive_service
+
+
+@celery_app.task
+def archive_price_bars() -> None:
+    """
+    Task to move price bars older than the archive cutoff from Postgres to Parquet files.
+    """
+    with get_celery_db() as db:
+        archived = archive_service.archive_price_bars(db)
+        print(f"Archived {archived} price bars")
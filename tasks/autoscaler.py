@@ -0,0 +1,63 @@
+from celery.signals import task_postrun, task_prerun
+from celery.worker import state
+from celery.worker.autoscale import Autoscaler
+from services import autoscale_service
+import time
+
+# Start times of the tasks running in this process, by task ID
+task_started_at = {}
+
+
+@task_prerun.connect
+def record_task_start(task_id=None, **kwargs) -> None:
+    task_started_at[task_id] = time.monotonic()
+
+
+# Samples task runtimes per queue, estimating how long each pool needs to drain its queues
+@task_postrun.connect
+def record_task_runtime(task_id=None, task=None, **kwargs) -> None:
+    started_at = task_started_at.pop(task_id, None)
+    queue = (task.request.delivery_info or {}).get("routing_key") if task else None
+    if started_at is None or queue is None:
+        return
+
+    autoscale_service.record_runtime(queue, time.monotonic() - started_at)
+
+
+class QueueAutoscaler(Autoscaler):
+    """
+    Scales a worker pool from the depth of its queues, the runtime of their tasks and the
+    IB pacing budget left, instead of Celery's count of prefetched tasks.
+
+    Enabled by starting the worker with --autoscale=max,min.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.desired = self.min_concurrency
+        self.checked_at = 0.0
+
+    @property
+    def qty(self) -> int:
+        # Polled every second by the autoscaler thread, the queues are read less often
+        if time.monotonic() - self.checked_at < autoscale_service.AUTOSCALE_INTERVAL:
+            return self.desired
+        self.checked_at = time.monotonic()
+
+        try:
+            desired = autoscale_service.get_desired_concurrency(
+                self.worker.app.amqp.queues.consume_from or self.worker.app.amqp.queues,
+                len(state.reserved_requests),
+                self.processes,
+                self.min_concurrency,
+                self.max_concurrency,
+            )
+        except Exception as e:
+            # Keep the current target while Redis is unreachable
+            print(f"Autoscaler failed to read the queues: {e}")
+            return self.desired
+
+        if desired != self.desired:
+            print(f"Autoscaling from {self.processes} to {desired} processes")
+        self.desired = desired
+        return desired
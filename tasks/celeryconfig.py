@@ -2,20 +2,39 @@ from celery.schedules import crontab
 from datetime import timedelta
 from kombu import Exchange, Queue
 import logging
+from tasks.routing import (  # noqa: F401, re-exported to celery_app
+    CELERY_BROKER_TRANSPORT_OPTIONS,
+    CELERY_QUEUE_PRIORITIES,
+    CELERY_TASK_ROUTES,
+)
 
 CELERY_BEAT_SCHEDULE = {
     "market_data_collector": {
         "task": "tasks.market_reader_tasks.get_market_data",
         "schedule": timedelta(minutes=5),  # Run every 5 minutes
     },
+    "price_bars_archiver": {
+        "task": "tasks.archive_tasks.archive_price_bars",
+        "schedule": crontab(hour=2, minute=0),  # Run nightly, outside market hours
+    },
+    "tick_data_collector": {
+        "task": "tasks.ticks_tasks.collect_tick_data",
+        "schedule": timedelta(minutes=5),  # Run every 5 minutes
+    },
+    "ib_gateways_probe": {
+        "task": "tasks.market_reader_tasks.probe_ib_gateways",
+        # Only gateways due for a probe are contacted
+        "schedule": timedelta(seconds=30),
+    },
 }
 
+CELERY_TASK_QUEUES = tuple(
+    Queue(name, Exchange(name), routing_key=name) for name in CELERY_QUEUE_PRIORITIES
+)
 
-CELERY_TASK_QUEUES = (Queue("default", Exchange("default"), routing_key="default"),)
-
-CELERY_TASK_ROUTES = {
-    "tasks.market_reader_tasks.*": {"queue": "default"},
-    "tasks.stocks_tasks.*": {"queue": "default"},
-}
+# Long IB requests would otherwise be prefetched behind short ones;
+# each worker pool can still override this with --prefetch-multiplier
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TASK_ACKS_LATE = True
 
 CELERY_LOG_LEVEL = logging.CRITICAL
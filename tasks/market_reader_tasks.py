@@ -1,39 +1,56 @@
 from celery_app import celery_app
 from models.database import get_celery_db
 from services import (
-    calendar_service,
     prices_service,
     ibapi_service,
     contracts_service,
     options_service,
+    futures_service,
+    cache,
+    series_state_service,
+    circuit_breaker_service,
+    dispatch_service,
+    write_buffer_service,
 )
+from services.circuit_breaker_service import CircuitOpenError
 from models.models import Stock, Future, Forex, Index
-from typing import List, Optional
+from typing import Dict, List, Optional
 from ib_insync import (
     Stock as ib_stock,
     IB,
 )
 from sqlalchemy.orm import Session
+from datetime import datetime
+
+MARKET_DATA_LOCK_KEY = "lock:get_market_data"
+MARKET_DATA_LOCK_TTL = 15 * 60  # Seconds before a crashed cycle's lock expires
 
 
 # Celery task to fetch market data for stocks, futures, forex, and indices
 @celery_app.task
 def get_market_data() -> None:
-    expiration_date: str = (
-        calendar_service.get_0dte_expiration_date()
-    )  # Get today's 0DTE expiration date
-    print(f"Expiration date: {expiration_date}")
+    # Skip this cycle if the previous one is still running
+    lock_token = cache.acquire_lock(MARKET_DATA_LOCK_KEY, MARKET_DATA_LOCK_TTL)
+    if lock_token is None:
+        print("Previous market data cycle still running, skipping")
+        return
 
-    # Connect to Interactive Brokers (IB)
-    with ibapi_service.connect_to_ib() as ib:
-        with get_celery_db() as db:
-            # Process all tradable stocks
-            process_contracts(db, ib, Stock, "Stock", expiration_date)
+    try:
+        # Connect to Interactive Brokers (IB)
+        with ibapi_service.connect_to_ib() as ib:
+            with get_celery_db() as db:
+                # Process all tradable stocks and their option chains
+                process_contracts(db, ib, Stock, "Stock")
 
-            # Process futures, forex, and indices
-            process_contracts(db, ib, Future, "Future")
-            process_contracts(db, ib, Forex, "Forex")
-            process_contracts(db, ib, Index, "Index")
+                # Process futures, forex, and indices
+                process_contracts(db, ib, Future, "Future")
+                process_contracts(db, ib, Forex, "Forex")
+                process_contracts(db, ib, Index, "Index")
+    except CircuitOpenError as e:
+        # Gateways are restarting, skip the cycle instead of blocking the worker
+        print(f"Skipping market data cycle: {e}")
+    finally:
+        cache.release_lock(MARKET_DATA_LOCK_KEY, lock_token)
 
 
 # Helper function to process contracts (stocks, futures, forex, etc.)
@@ -42,11 +59,26 @@ def process_contracts(
     ib: IB,
     model,
     contract_type: str,
-    expiration_date: Optional[str] = None,
 ) -> None:
     contracts = db.query(model).all()
 
+    # Load the ingestion watermarks of every contract in one query
+    series_states = series_state_service.get_series_states(
+        db, [contract.id for contract in contracts]
+    )
+
     for contract in contracts:
+        if contract_type == "Future":
+            # Roots are collected through their dated contracts, stitched at query time.
+            # A root IB lists no expiry for is skipped without aborting the cycle
+            try:
+                futures_service.process_futures(db, ib, contract)
+            except Exception as e:
+                db.rollback()
+                print(f"Failed to process the futures of {contract.symbol}: {e}")
+            # The root's own series is still collected below for /futures/{symbol}/bars and
+            # /rollups, deprecated in favor of /futures/{symbol}/continuous
+
         if contract_type == "Stock":
             underlying = ib_stock(
                 contract.symbol,
@@ -54,13 +86,11 @@ def process_contracts(
                 contract.currency,
                 conId=contract.conId,
             )
-            # Retrieve or create option contracts for the stock
-            options_service.process_options(
-                db, ib, contract, expiration_date, underlying
-            )
+            # Retrieve or create option contracts for the stock's expirations
+            options_service.process_options(db, ib, contract, underlying)
 
         # Trigger price data collection
-        get_price_data.delay(
+        dispatch_service.enqueue_price_data(
             contract.id,
             contract_type,
             contract.symbol,
@@ -68,9 +98,67 @@ def process_contracts(
             contract.currency,
             5,
             contract.conId if contract_type == "Stock" else None,
+            last_bar_dates=series_state_service.get_last_bar_dates(
+                series_states, contract.id, 5
+            ),
         )
 
 
+def get_data_types(contract_type: str) -> List[str]:
+    if contract_type == "Index":
+        return ["TRADES"]
+    if contract_type == "Forex":
+        return ["ASK", "BID"]
+    return ["BID", "ASK", "TRADES"]
+
+
+# Fetches the new bars of a contract and buffers them for the writer, which commits them
+# with their rollups and watermarks
+def add_price_data(
+    db: Session,
+    ib: IB,
+    contract,
+    contract_db_id: str,
+    contract_type: str,
+    symbol: str,
+    bar_size: int,
+    last_bar_dates: Optional[Dict[str, str]] = None,
+) -> List:
+    data_types = get_data_types(contract_type)
+    bars_to_create: List = []
+
+    # Collect price bars for all data types
+    for data_type in data_types:
+        # Watermarks are passed by process_contracts, otherwise read them
+        if last_bar_dates is not None:
+            last_bar_date = last_bar_dates.get(data_type)
+            if last_bar_date is not None:
+                last_bar_date = datetime.fromisoformat(last_bar_date)
+        else:
+            last_bar_date = series_state_service.get_last_bar_date(
+                db, contract_db_id, data_type, bar_size
+            )
+
+        bars_to_create = prices_service.get_add_price_bars(
+            ib,
+            contract,
+            data_type,
+            contract_db_id,
+            contract_type,
+            bar_size,
+            bars_to_create,
+            last_bar_date,
+        )
+
+        print(f"Got {len(bars_to_create)} bars for {data_type} and {symbol}")
+
+    # Postgres latency no longer holds the IB connection, see price_writer.py
+    write_buffer_service.append_bars(
+        contract_db_id, bar_size, data_types, bars_to_create
+    )
+    return bars_to_create
+
+
 # Celery task to fetch price data for a contract (Stock, Option, Future, etc.)
 @celery_app.task
 def get_price_data(
@@ -84,47 +172,113 @@ def get_price_data(
     lastTradeDateOrContractMonth: Optional[str] = None,
     strike: Optional[float] = None,
     right: Optional[str] = None,
+    last_bar_dates: Optional[Dict[str, str]] = None,
+    dedup_token: Optional[str] = None,
 ) -> None:
-    data_types: List[str] = (
-        ["BID", "ASK", "TRADES"] if contract_type != "Forex" else ["ASK", "BID"]
-    )
-
-    if contract_type == "Index":
-        data_types = ["TRADES"]
-
-    # Create the appropriate contract object
-    contract = contracts_service.create_ib_contract(
-        contract_type,
-        symbol,
-        exchange,
-        currency,
-        conId,
-        lastTradeDateOrContractMonth,
-        strike,
-        right,
-    )
-    if not contract:
-        return  # Skip if conditions for 0DTE options are not met
-
-    with ibapi_service.connect_to_ib() as ib:
-        with get_celery_db() as db:
-            bars_to_create: List = []
+    try:
+        # Create the appropriate contract object
+        contract = contracts_service.create_ib_contract(
+            contract_type,
+            symbol,
+            exchange,
+            currency,
+            conId,
+            lastTradeDateOrContractMonth,
+            strike,
+            right,
+        )
+        if not contract:
+            return  # Skip if conditions for 0DTE options are not met
 
-            # Collect price bars for all data types
-            for data_type in data_types:
-                bars_to_create = prices_service.get_add_price_bars(
+        # Connect to the gateway owning this contract, failing over if it is down
+        with ibapi_service.connect_to_ib(
+            routing_key=contract_db_id, contract_type=contract_type
+        ) as ib:
+            # The session only serves watermark reads missing from the Redis mirror
+            with get_celery_db() as db:
+                add_price_data(
+                    db,
                     ib,
                     contract,
-                    data_type,
                     contract_db_id,
                     contract_type,
+                    symbol,
                     bar_size,
-                    bars_to_create,
-                    db,
+                    last_bar_dates,
+                )
+    except CircuitOpenError as e:
+        # Fail fast, the next cycle resumes from the series' watermark
+        print(f"Skipping price data for {symbol} ({contract_db_id}): {e}")
+    finally:
+        # Allow the next cycle to enqueue this series again, unless the claim expired and
+        # was taken by a newer cycle
+        if dedup_token:
+            cache.release_lock(
+                dispatch_service.price_data_dedup_key(contract_db_id, bar_size),
+                dedup_token,
+            )
+
+
+# Celery task to fetch the price data of a batch of contracts over one IB connection
+@celery_app.task
+def get_price_data_batch(contracts: List[Dict]) -> None:
+    try:
+        ib_contracts = []
+        for contract in contracts:
+            ib_contract = contracts_service.create_ib_contract(
+                contract["contract_type"],
+                contract["symbol"],
+                contract["exchange"],
+                contract["currency"],
+                contract.get("conId"),
+                contract.get("lastTradeDateOrContractMonth"),
+                contract.get("strike"),
+                contract.get("right"),
+            )
+            if ib_contract:
+                ib_contracts.append((ib_contract, contract))
+        if not ib_contracts:
+            return  # Skip if conditions for 0DTE options are not met
+
+        with ibapi_service.connect_to_ib(
+            routing_key=contracts[0]["contract_db_id"],
+            contract_type=contracts[0]["contract_type"],
+        ) as ib:
+            with get_celery_db() as db:
+                for ib_contract, contract in ib_contracts:
+                    add_price_data(
+                        db,
+                        ib,
+                        ib_contract,
+                        contract["contract_db_id"],
+                        contract["contract_type"],
+                        contract["symbol"],
+                        contract["bar_size"],
+                        contract.get("last_bar_dates"),
+                    )
+    except CircuitOpenError as e:
+        # Fail fast, the next cycle resumes from the series' watermarks
+        print(f"Skipping price data for a batch of {len(contracts)} contracts: {e}")
+    finally:
+        # Allow the next cycle to enqueue these series again, keeping newer claims
+        for contract in contracts:
+            if contract.get("dedup_token"):
+                cache.release_lock(
+                    dispatch_service.price_data_dedup_key(
+                        contract["contract_db_id"], contract["bar_size"]
+                    ),
+                    contract["dedup_token"],
                 )
 
-                print(f"Got {len(bars_to_create)} bars for {data_type} and {symbol}")
 
-            # Add the collected bars to the database
-            db.add_all(bars_to_create)
-            db.commit()
+# Celery task probing the gateways whose circuit is open, closing it once they accept connections
+@celery_app.task
+def probe_ib_gateways() -> None:
+    for gateway in ibapi_service.GATEWAYS:
+        if not circuit_breaker_service.is_probe_due(gateway):
+            continue
+
+        if ibapi_service.probe_gateway(gateway):
+            print(f"Gateway {gateway} is reachable again")
+        else:
+            print(f"Gateway {gateway} is still unreachable")
@@ -0,0 +1,45 @@
+from celery_app import celery_app
+from models.database import get_celery_db
+from services import circuit_breaker_service, ibapi_service, onboarding_service
+from services.circuit_breaker_service import CircuitOpenError
+
+
+@celery_app.task(bind=True, max_retries=None)
+def import_contracts(self, job_id: str) -> None:
+    """
+    Task resolving the contracts of an import job against IB and storing them.
+
+    Args:
+        job_id (str): The job created by onboarding_service.create_job.
+    """
+    job = onboarding_service.load_job(job_id)
+    if job is None:
+        print(f"Import job {job_id} expired before it ran")
+        return
+
+    rows = job["rows"]
+    onboarding_service.update_job(job, "running")
+
+    try:
+        with get_celery_db() as db:
+            onboarding_service.mark_existing(db, rows)
+
+        if any(row["status"] == "pending" for row in rows):
+            # One connection for the whole job, instead of one per contract
+            with ibapi_service.connect_to_ib() as ib:
+                onboarding_service.resolve_contracts(ib, rows)
+
+        with get_celery_db() as db:
+            onboarding_service.save_contracts(db, rows)
+    except CircuitOpenError as e:
+        # Gateways are restarting, defer the job instead of failing its rows
+        countdown = circuit_breaker_service.get_backoff(self.request.retries + 1)
+        print(f"Deferring import job {job_id} by {countdown:.0f}s: {e}")
+        onboarding_service.update_job(job, "pending")
+        raise self.retry(countdown=countdown)
+    except Exception:
+        onboarding_service.update_job(job, "failed")
+        raise
+
+    onboarding_service.update_job(job, "done")
+    print(f"Import job {job_id} done")
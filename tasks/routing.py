@@ -0,0 +1,37 @@
+# Queue names, priorities and routes, kept free of Celery imports so that task producers
+# such as the API can use them without loading Celery, see services/dispatch_service.py
+
+# Queues per workload class, so time-sensitive option bars never wait behind bulk work
+OPTIONS_QUEUE = "options"  # 1-minute 0DTE option fetches
+UNDERLYINGS_QUEUE = "underlyings"  # 5-minute stock, future, forex and index fetches
+ONBOARDING_QUEUE = "onboarding"  # New contracts resolved against IB
+BACKFILL_QUEUE = "backfill"  # Long historical requests
+DEFAULT_QUEUE = "default"  # Collection cycle coordination
+
+# Priority given to tasks sent to each queue (0 is the highest with the Redis broker)
+CELERY_QUEUE_PRIORITIES = {
+    OPTIONS_QUEUE: 0,
+    DEFAULT_QUEUE: 2,
+    UNDERLYINGS_QUEUE: 3,
+    ONBOARDING_QUEUE: 6,
+    BACKFILL_QUEUE: 9,
+}
+
+CELERY_TASK_ROUTES = {
+    "tasks.market_reader_tasks.get_market_data": {"queue": DEFAULT_QUEUE},
+    # get_price_data is routed per call, see dispatch_service.enqueue_price_data
+    "tasks.market_reader_tasks.get_price_data": {"queue": UNDERLYINGS_QUEUE},
+    "tasks.market_reader_tasks.get_price_data_batch": {"queue": OPTIONS_QUEUE},
+    "tasks.market_reader_tasks.*": {"queue": DEFAULT_QUEUE},
+    "tasks.stocks_tasks.*": {"queue": ONBOARDING_QUEUE},
+    "tasks.onboarding_tasks.*": {"queue": ONBOARDING_QUEUE},
+    "tasks.archive_tasks.*": {"queue": BACKFILL_QUEUE},
+    "tasks.ticks_tasks.collect_tick_data": {"queue": DEFAULT_QUEUE},
+    "tasks.ticks_tasks.*": {"queue": BACKFILL_QUEUE},
+}
+
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    "priority_steps": list(range(10)),
+    "sep": ":",
+    "queue_order_strategy": "priority",
+}
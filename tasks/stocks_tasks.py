@@ -1,12 +1,25 @@
 from celery_app import celery_app
 from models.database import get_celery_db
-from services import ibapi_service, contracts_service
+from services import (
+    ibapi_service,
+    contracts_service,
+    versions_service,
+    circuit_breaker_service,
+)
+from services.circuit_breaker_service import CircuitOpenError
 from models.models import Stock
 from ib_insync import Stock as ib_stock
 
 
-@celery_app.task
-def fetch_stock(symbol: str, exchange: str, currency: str, to_trade: bool) -> None:
+@celery_app.task(bind=True, max_retries=None)
+def fetch_stock(
+    self,
+    symbol: str,
+    exchange: str,
+    currency: str,
+    to_trade: bool,
+    collect_ticks: bool = False,
+) -> None:
     """
     Task to fetch stock details from IB and store them in the database.
 
@@ -15,26 +28,36 @@ def fetch_stock(symbol: str, exchange: str, currency: str, to_trade: bool) -> No
         exchange (str): The exchange where the stock is traded.
         currency (str): The currency in which the stock is traded.
         to_trade (bool): Whether the stock is marked for trading or not.
+        collect_ticks (bool): Whether historical ticks are captured for the stock.
     """
-    # Connect to Interactive Brokers (IB)
-    with ibapi_service.connect_to_ib() as ib:
-        # Create an IB stock contract
-        stock = ib_stock(symbol, exchange, currency)
+    try:
+        # Connect to Interactive Brokers (IB)
+        with ibapi_service.connect_to_ib() as ib:
+            # Create an IB stock contract
+            stock = ib_stock(symbol, exchange, currency)
 
-        # Get contract details, including the conId
-        contract_details = contracts_service.get_contract_details(ib, stock)
-        conId = contract_details[0].contract.conId
+            # Get contract details, including the conId
+            contract_details = contracts_service.get_contract_details(ib, stock)
+            conId = contract_details[0].contract.conId
+    except CircuitOpenError as e:
+        # Gateways are restarting, defer the onboarding instead of losing it
+        countdown = circuit_breaker_service.get_backoff(self.request.retries + 1)
+        print(f"Deferring {symbol} by {countdown:.0f}s: {e}")
+        raise self.retry(countdown=countdown)
 
-        # Connect to the database and store stock details
-        with get_celery_db() as db:
-            db_stock = Stock(
-                symbol=symbol,
-                contract_type="Stock",
-                exchange=exchange,
-                currency=currency,
-                conId=conId,
-                to_trade=to_trade,  # Mark whether the stock is marked for trading
-            )
-            db.add(db_stock)  # Add the stock to the database
-            db.commit()  # Commit the transaction
-            db.refresh(db_stock)  # Refresh the instance with the updated state
+    # Connect to the database and store stock details
+    with get_celery_db() as db:
+        db_stock = Stock(
+            symbol=symbol,
+            contract_type="Stock",
+            exchange=exchange,
+            currency=currency,
+            conId=conId,
+            to_trade=to_trade,  # Mark whether the stock is marked for trading
+            collect_ticks=collect_ticks,
+        )
+        db.add(db_stock)  # Add the stock to the database
+        db.commit()  # Commit the transaction
+        db.refresh(db_stock)  # Refresh the instance with the updated state
+
+    versions_service.bump_version(versions_service.contracts_key("Stock"))
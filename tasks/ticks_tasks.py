@@ -0,0 +1,77 @@
+from celery_app import celery_app
+from models.database import get_celery_db
+from models.models import BaseContract
+from services import cache, contracts_service, ibapi_service, ticks_service
+from services.circuit_breaker_service import CircuitOpenError
+from typing import Optional
+
+TICK_DATA_DEDUP_TTL = 30 * 60  # Seconds before a lost tick task's dedup key expires
+
+
+def tick_data_dedup_key(contract_db_id: int) -> str:
+    return f"dedup:get_tick_data:{contract_db_id}"
+
+
+# Celery task enqueuing tick capture for the contracts marked with collect_ticks
+@celery_app.task
+def collect_tick_data() -> None:
+    with get_celery_db() as db:
+        contracts = (
+            db.query(BaseContract).filter(BaseContract.collect_ticks.is_(True)).all()
+        )
+
+        for contract in contracts:
+            # Skip contracts whose previous capture is still queued or running
+            lock_token = cache.acquire_lock(
+                tick_data_dedup_key(contract.id), TICK_DATA_DEDUP_TTL
+            )
+            if lock_token is None:
+                continue
+
+            get_tick_data.delay(
+                contract.id,
+                contract.contract_type,
+                contract.symbol,
+                contract.exchange,
+                contract.currency,
+                getattr(contract, "conId", None),
+                lock_token,
+            )
+
+
+# Celery task capturing the ticks of a contract since its latest stored one
+@celery_app.task
+def get_tick_data(
+    contract_db_id: int,
+    contract_type: str,
+    symbol: str,
+    exchange: str,
+    currency: str,
+    conId: Optional[int] = None,
+    dedup_token: Optional[str] = None,
+) -> None:
+    try:
+        contract = contracts_service.create_ib_contract(
+            contract_type, symbol, exchange, currency, conId
+        )
+        if not contract:
+            return
+
+        with ibapi_service.connect_to_ib(
+            routing_key=contract_db_id, contract_type=contract_type
+        ) as ib:
+            with get_celery_db() as db:
+                for tick_type in ticks_service.TICK_TYPES:
+                    copied = ticks_service.add_ticks(
+                        db, ib, contract, contract_db_id, tick_type
+                    )
+                    # Commit per tick type, so each type resumes from its own watermark
+                    db.commit()
+                    print(f"Copied {copied} {tick_type} ticks for {symbol}")
+    except CircuitOpenError as e:
+        # Fail fast, the next run resumes from the latest stored ticks
+        print(f"Skipping ticks for {symbol} ({contract_db_id}): {e}")
+    finally:
+        # Release the claim only if it is still this task's, not a newer run's
+        if dedup_token:
+            cache.release_lock(tick_data_dedup_key(contract_db_id), dedup_token)